@@ -0,0 +1,155 @@
+import warnings
+
+import numpy as np
+
+# 检测器名称，写入告警消息前缀，便于冷却期内去重
+ZSCORE = "zscore"
+EWMA = "ewma"
+RATE = "rate"
+FLATLINE = "flatline"
+
+
+def build_matrix(rows, start_ms, bucket_ms, n_buckets):
+    """
+    将 (窗口开始时间ms, sensor_id, 值) 行转为 序列×时间桶 的矩阵
+
+    缺失的桶为NaN。返回 (sensor_id列表, 矩阵)
+    """
+    if not rows:
+        return [], np.empty((0, n_buckets))
+    ts = np.fromiter((r[0] for r in rows), dtype=np.float64, count=len(rows))
+    values = np.fromiter(
+        (np.nan if r[2] is None else r[2] for r in rows), dtype=np.float64, count=len(rows)
+    )
+    sensor_ids, row_idx = np.unique(
+        np.array([r[1] for r in rows], dtype=object), return_inverse=True
+    )
+    col_idx = ((ts - start_ms) // bucket_ms).astype(np.int64)
+    keep = (col_idx >= 0) & (col_idx < n_buckets)
+
+    matrix = np.full((len(sensor_ids), n_buckets), np.nan)
+    matrix[row_idx[keep], col_idx[keep]] = values[keep]
+    return list(sensor_ids), matrix
+
+
+def last_valid(matrix):
+    """每个序列最后一个有效值及其列下标，没有有效值的序列下标为-1"""
+    valid = ~np.isnan(matrix)
+    has_any = valid.any(axis=1)
+    idx = matrix.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    idx = np.where(has_any, idx, -1)
+    values = np.where(has_any, matrix[np.arange(len(matrix)), np.maximum(idx, 0)], np.nan)
+    return values, idx
+
+
+def zscore(matrix, threshold=3.0, min_points=10):
+    """最后一个值相对于窗口内其余数据的z分数，返回 (z, 是否异常)"""
+    last, idx = last_valid(matrix)
+    history = matrix.copy()
+    rows = np.nonzero(idx >= 0)[0]
+    history[rows, idx[rows]] = np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mean = np.nanmean(history, axis=1)
+        std = np.nanstd(history, axis=1)
+    count = np.sum(~np.isnan(history), axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (last - mean) / std
+    flagged = (count >= min_points) & (std > 0) & (np.abs(z) > threshold)
+    return z, flagged
+
+
+def ewma(matrix, alpha=0.3, threshold=4.0, min_points=10):
+    """
+    指数加权均值/方差，比较最后一个值与之前的EWMA预测
+
+    沿时间轴逐列迭代，每一步对所有序列做向量运算。返回 (偏差倍数, 是否异常)
+    """
+    n, t = matrix.shape
+    mean = np.full(n, np.nan)
+    var = np.zeros(n)
+    count = np.zeros(n, dtype=np.int64)
+    prev_mean = np.full(n, np.nan)
+    prev_var = np.zeros(n)
+    prev_count = np.zeros(n, dtype=np.int64)
+    for j in range(t):
+        x = matrix[:, j]
+        present = ~np.isnan(x)
+        first = present & np.isnan(mean)
+        update = present & ~first
+
+        prev_mean = np.where(present, mean, prev_mean)
+        prev_var = np.where(present, var, prev_var)
+        prev_count = np.where(present, count, prev_count)
+
+        diff = np.where(update, x - mean, 0.0)
+        incr = alpha * diff
+        mean = np.where(first, x, np.where(update, mean + incr, mean))
+        var = np.where(update, (1 - alpha) * (var + diff * incr), var)
+        count = count + present
+
+    last, idx = last_valid(matrix)
+    std = np.sqrt(prev_var)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        deviation = (last - prev_mean) / std
+    flagged = (prev_count >= min_points) & (std > 0) & (np.abs(deviation) > threshold)
+    return deviation, flagged
+
+
+def rate_of_change(matrix, threshold=6.0, min_points=10):
+    """
+    最后一步变化量相对于历史变化量的稳健尺度(MAD)的倍数
+
+    返回 (变化倍数, 是否异常)
+    """
+    diffs = np.diff(matrix, axis=1)
+    last_diff, idx = last_valid(diffs)
+    history = diffs.copy()
+    rows = np.nonzero(idx >= 0)[0]
+    history[rows, idx[rows]] = np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        median = np.nanmedian(history, axis=1)
+        mad = np.nanmedian(np.abs(history - median[:, None]), axis=1) * 1.4826
+    count = np.sum(~np.isnan(history), axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = (last_diff - median) / mad
+    flagged = (count >= min_points) & (mad > 0) & (np.abs(score) > threshold)
+    return score, flagged
+
+
+def flatline(matrix, points=15, tolerance=1e-6):
+    """
+    最近 points 个时间桶全部有数据且几乎不变，视为传感器卡死
+
+    返回 (最近窗口的极差, 是否异常)
+    """
+    if matrix.shape[1] < points:
+        return np.full(len(matrix), np.nan), np.zeros(len(matrix), dtype=bool)
+    recent = matrix[:, -points:]
+    complete = ~np.isnan(recent).any(axis=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        spread = np.nanmax(recent, axis=1) - np.nanmin(recent, axis=1)
+    return spread, complete & (spread <= tolerance)
+
+
+def detect(matrix, config=None):
+    """
+    对所有序列运行全部检测器
+
+    返回列表 [(行下标, 检测器, 最后一个值, 分数)]
+    """
+    config = config or {}
+    last, _ = last_valid(matrix)
+    findings = []
+    detectors = [
+        (ZSCORE, zscore(matrix, config.get("z_threshold", 3.0), config.get("min_points", 10))),
+        (EWMA, ewma(matrix, config.get("ewma_alpha", 0.3), config.get("ewma_threshold", 4.0), config.get("min_points", 10))),
+        (RATE, rate_of_change(matrix, config.get("rate_threshold", 6.0), config.get("min_points", 10))),
+        (FLATLINE, flatline(matrix, config.get("flatline_points", 15), config.get("flatline_tolerance", 1e-6))),
+    ]
+    for name, (score, flagged) in detectors:
+        for row in np.nonzero(flagged)[0]:
+            findings.append((int(row), name, float(last[row]), float(score[row])))
+    return findings
@@ -0,0 +1,350 @@
+"""
+历史数据回放/导入
+
+流式读取 CSV、JSON 数组或 JSON Lines 文件，按与 MQTT 入库相同的规则
+（readings.parse_reading）映射到序列，通过多个并行写入线程以多行、多表
+INSERT 批量写入 TDengine。不做去重、不触发分析任务。
+
+每个文件的进度记录在检查点文件中，中断后重新执行同一命令即可从上次
+确认写入的位置继续。TDengine 对相同 (子表, 时间戳) 的写入是覆盖，
+恢复时重复写入少量数据不会产生重复行。
+"""
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from clients import get_taos_conn
+from config import TDENGINE_DB
+from readings import parse_reading, to_epoch_ms, InvalidReading
+from series_registry import SeriesRegistry
+
+logger = logging.getLogger("backfill")
+
+# 单条INSERT语句的最大长度，低于TDengine默认的1MB上限
+MAX_SQL_BYTES = 900 * 1024
+# 每个文件最多记录的无效行详情
+MAX_REPORTED_ERRORS = 20
+# 写入失败时的重试次数
+WRITE_RETRIES = 3
+
+
+def _iter_json_array(f, chunk_size=1 << 20):
+    """逐个解析顶层JSON数组中的对象，不把整个文件读入内存"""
+    decoder = json.JSONDecoder()
+    buf = ""
+    started = False
+    eof = False
+    while True:
+        if not eof and len(buf) < chunk_size:
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf += chunk
+        buf = buf.lstrip()
+        if not started:
+            if not buf:
+                return
+            if buf[0] != "[":
+                raise ValueError("JSON文件应为数组，或使用 .jsonl 每行一个对象")
+            buf = buf[1:]
+            started = True
+            continue
+        if buf.startswith(","):
+            buf = buf[1:]
+            continue
+        if buf.startswith("]"):
+            return
+        if not buf:
+            if eof:
+                raise ValueError("JSON数组不完整")
+            continue
+        try:
+            obj, end = decoder.raw_decode(buf)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # 对象跨越了读取块，继续读取
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf += chunk
+            continue
+        buf = buf[end:]
+        yield obj
+
+
+def iter_records(path):
+    """
+    按文件扩展名流式读取记录
+
+    .csv 需要表头（sensor_id/metric_type/value/timestamp，可选 topic 列）；
+    .jsonl/.ndjson 每行一个JSON对象；.json 为对象数组。
+    产出 (记录序号, 记录字典或None)；无法解析的行产出 None。
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if ext == ".csv":
+            for index, row in enumerate(csv.DictReader(f)):
+                yield index, {k: v for k, v in row.items() if v not in (None, "")}
+        elif ext in (".jsonl", ".ndjson"):
+            for index, line in enumerate(f):
+                line = line.strip()
+                if not line:
+                    yield index, None
+                    continue
+                try:
+                    yield index, json.loads(line)
+                except json.JSONDecodeError:
+                    yield index, None
+        elif ext == ".json":
+            for index, obj in enumerate(_iter_json_array(f)):
+                yield index, obj
+        else:
+            raise ValueError(f"不支持的文件类型: {path}（支持 .csv .json .jsonl .ndjson）")
+
+
+class Checkpoint:
+    """
+    回放进度：文件 -> 已确认写入的记录数
+
+    文件大小或修改时间变化时视为新文件，从头开始。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._state = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._state = json.load(f)
+
+    @staticmethod
+    def _identity(path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_size, int(stat.st_mtime)
+
+    def position(self, path):
+        key, size, mtime = self._identity(path)
+        entry = self._state.get(key)
+        if entry and entry["size"] == size and entry["mtime"] == mtime:
+            return entry["records"], entry.get("done", False)
+        return 0, False
+
+    def update(self, path, records, done=False):
+        key, size, mtime = self._identity(path)
+        self._state[key] = {"size": size, "mtime": mtime, "records": records, "done": done}
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+
+class BackfillWriter:
+    """
+    并行批量写入
+
+    每个线程持有自己的TDengine连接；一批数据按子表分组后拼成
+    INSERT INTO t1 VALUES (...)(...) t2 VALUES (...) 形式的语句。
+    """
+
+    def __init__(self, workers, registry):
+        self.registry = registry
+        self._local = threading.local()
+        self._conns = []
+        self._lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = get_taos_conn()
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def _statements(self, conn, rows):
+        by_table = defaultdict(list)
+        for sensor_id, metric_type, ts, value in rows:
+            table = self.registry.resolve(conn, sensor_id, metric_type)
+            by_table[table].append(f"({ts}, {value!r})")
+
+        statement = ["INSERT INTO"]
+        size = len(statement[0])
+        for table, values in by_table.items():
+            head = f" {table} VALUES "
+            statement.append(head)
+            size += len(head)
+            for value in values:
+                if size + len(value) > MAX_SQL_BYTES:
+                    yield "".join(statement)
+                    statement = ["INSERT INTO", head]
+                    size = len(statement[0]) + len(head)
+                statement.append(value)
+                size += len(value)
+        if len(statement) > 1:
+            yield "".join(statement)
+
+    def write(self, rows):
+        """写入一批数据，失败时清除子表缓存后重试"""
+        conn = self._conn()
+        for attempt in range(1, WRITE_RETRIES + 1):
+            try:
+                for sql in self._statements(conn, rows):
+                    conn.execute(sql)
+                return len(rows)
+            except Exception as e:
+                if attempt == WRITE_RETRIES:
+                    raise
+                logger.warning(f"批量写入失败 (第{attempt}次): {str(e)}，重试")
+                # 子表可能被外部删除，下次重新建表
+                for sensor_id, metric_type, _, _ in rows:
+                    self.registry.forget(sensor_id, metric_type)
+                time.sleep(attempt)
+
+    def submit(self, rows):
+        return self.pool.submit(self.write, rows)
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        for conn in self._conns:
+            conn.close()
+
+
+class Backfill:
+    """
+    回放一组文件
+
+    参数:
+    workers    - 并行写入线程数
+    batch_rows - 每批写入的行数
+    checkpoint - 检查点文件路径，None 表示不记录进度
+    topic      - 记录中没有 topic 字段时使用的默认主题（如 farm/sensors/dtu001）
+    dry_run    - 只解析不写入，用于检查文件和测量解析速度
+    """
+
+    def __init__(self, workers=4, batch_rows=10000, checkpoint=None, topic=None, dry_run=False):
+        self.workers = workers
+        self.batch_rows = batch_rows
+        self.checkpoint = Checkpoint(checkpoint)
+        self.topic = topic
+        self.dry_run = dry_run
+        self.registry = SeriesRegistry()
+        self.stats = {"read": 0, "written": 0, "invalid": 0, "skipped": 0, "new_series": 0}
+
+    def _on_new_series(self, *args):
+        self.stats["new_series"] += 1
+
+    def run(self, paths):
+        start = time.time()
+        writer = None
+        if not self.dry_run:
+            self.registry.on_new_series = self._on_new_series
+            conn = get_taos_conn()
+            try:
+                self.registry.preload(conn, TDENGINE_DB)
+            finally:
+                conn.close()
+            writer = BackfillWriter(self.workers, self.registry)
+        try:
+            for path in paths:
+                self._run_file(path, writer)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        elapsed = time.time() - start
+        self.stats["seconds"] = round(elapsed, 1)
+        rows = self.stats["read"] if self.dry_run else self.stats["written"]
+        self.stats["rows_per_min"] = round(rows / elapsed * 60) if elapsed else 0
+        if self.stats["new_series"]:
+            # 通知API刷新传感器/指标目录（整个回放只通知一次）
+            try:
+                from cache import bump_version
+
+                bump_version("catalog")
+            except Exception as e:
+                logger.warning(f"刷新目录缓存版本失败: {str(e)}")
+        return self.stats
+
+    def _run_file(self, path, writer):
+        resume_from, done = self.checkpoint.position(path)
+        if done:
+            logger.info(f"{path} 已完成，跳过")
+            return
+        if resume_from:
+            logger.info(f"{path} 从第 {resume_from} 条记录继续")
+            self.stats["skipped"] += resume_from
+
+        # 按提交顺序跟踪每批的完成情况，检查点只前进到连续完成的位置
+        pending = []
+        in_flight = threading.BoundedSemaphore(self.workers * 2)
+        batch = []
+        errors = 0
+        last_report = time.time()
+        end = resume_from
+
+        def flush(batch, end):
+            if self.dry_run or not batch:
+                pending.append((None, end))
+                return
+            in_flight.acquire()
+            future = writer.submit(batch)
+            future.add_done_callback(lambda _: in_flight.release())
+            pending.append((future, end))
+
+        for index, record in iter_records(path):
+            if index < resume_from:
+                continue
+            self.stats["read"] += 1
+            end = index + 1
+            try:
+                if not isinstance(record, dict):
+                    raise InvalidReading("无法解析的行" if record is None else "记录不是JSON对象")
+                sensor_id, metric_type, value, timestamp = parse_reading(
+                    record, record.pop("topic", None) or self.topic
+                )
+                batch.append((sensor_id, metric_type, to_epoch_ms(timestamp), value))
+            except InvalidReading as e:
+                self.stats["invalid"] += 1
+                errors += 1
+                if errors <= MAX_REPORTED_ERRORS:
+                    logger.warning(f"{path} 第 {index + 1} 条记录无效: {str(e)}")
+
+            if len(batch) >= self.batch_rows:
+                flush(batch, end)
+                batch = []
+                self._advance(path, pending)
+                if time.time() - last_report >= 10:
+                    last_report = time.time()
+                    logger.info(
+                        f"{path}: 已读取 {self.stats['read']} 条，已写入 {self.stats['written']} 条"
+                    )
+
+        flush(batch, end)
+        for future, _ in pending:
+            if future is not None:
+                future.result()
+        self._advance(path, pending)
+        self.checkpoint.update(path, end, done=True)
+        if errors > MAX_REPORTED_ERRORS:
+            logger.warning(f"{path} 共 {errors} 条无效记录（只显示前 {MAX_REPORTED_ERRORS} 条）")
+        logger.info(f"{path} 回放完成")
+
+    def _advance(self, path, pending):
+        """移除已完成的批次并保存检查点；写入失败时抛出异常，检查点停在失败批次之前"""
+        position = None
+        while pending:
+            future, end = pending[0]
+            if future is not None:
+                if not future.done():
+                    break
+                self.stats["written"] += future.result()
+            pending.pop(0)
+            position = end
+        if position is not None:
+            self.checkpoint.update(path, position)
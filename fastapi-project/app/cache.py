@@ -0,0 +1,192 @@
+import json
+import logging
+import threading
+import time
+
+import os
+
+import redis
+
+from config import redis_url
+from resilience import is_backend_failure
+
+logger = logging.getLogger("shared-cache")
+
+# 多个API worker通过Redis共享缓存和版本号；未配置Redis时退化为进程内缓存
+KEY_PREFIX = "farm"
+# 最近一次成功加载的数据保留时间(秒)，后端不可用时作为过期数据返回
+STALE_CACHE_TTL = int(os.environ.get("STALE_CACHE_TTL", str(24 * 3600)))
+
+_redis_url = redis_url
+_redis = None
+_local = {}
+_local_versions = {}
+_local_stale = {}
+_lock = threading.Lock()
+
+
+def init_cache(url):
+    """设置Redis地址（默认使用 config.redis_url），连接在第一次使用时建立"""
+    global _redis_url, _redis
+    _redis_url = url
+    _redis = None
+
+
+def get_redis():
+    global _redis
+    if _redis is None and _redis_url:
+        _redis = redis.Redis.from_url(
+            _redis_url, socket_timeout=0.5, socket_connect_timeout=0.5
+        )
+    return _redis
+
+
+def _version_key(namespace):
+    return f"{KEY_PREFIX}:ver:{namespace}"
+
+
+def _mtime_key(namespace):
+    return f"{KEY_PREFIX}:mtime:{namespace}"
+
+
+def get_versions(*namespaces):
+    """读取一组命名空间的版本号"""
+    r = get_redis()
+    if r is None:
+        with _lock:
+            return [_local_versions.get(ns, (0, 0))[0] for ns in namespaces]
+    values = r.mget([_version_key(ns) for ns in namespaces])
+    return [int(v) if v else 0 for v in values]
+
+
+def get_version_state(*namespaces):
+    """
+    读取一组命名空间的版本号和最后修改时间
+
+    返回 (版本号列表, 最后修改时间戳)，从未修改过时修改时间为0
+    """
+    r = get_redis()
+    if r is None:
+        with _lock:
+            states = [_local_versions.get(ns, (0, 0)) for ns in namespaces]
+        return [v for v, _ in states], max((m for _, m in states), default=0)
+    values = r.mget(
+        [_version_key(ns) for ns in namespaces] + [_mtime_key(ns) for ns in namespaces]
+    )
+    versions = [int(v) if v else 0 for v in values[: len(namespaces)]]
+    mtimes = [float(v) if v else 0 for v in values[len(namespaces) :]]
+    return versions, max(mtimes, default=0)
+
+
+def bump_version(namespace):
+    """使某个命名空间下的所有缓存失效，所有worker立即可见"""
+    now = time.time()
+    r = get_redis()
+    if r is None:
+        with _lock:
+            version = _local_versions.get(namespace, (0, 0))[0] + 1
+            _local_versions[namespace] = (version, now)
+            return version
+    pipe = r.pipeline()
+    pipe.incr(_version_key(namespace))
+    pipe.set(_mtime_key(namespace), now)
+    version, _ = pipe.execute()
+    return version
+
+
+def try_bump_version(namespace):
+    """
+    数据写入成功后调用的 bump_version：Redis不可用时只记录日志，不影响写入结果，
+    缓存最多在 ttl 秒后自然过期。返回新版本号，失败时返回 None
+    """
+    try:
+        return bump_version(namespace)
+    except redis.RedisError as e:
+        logger.warning(f"更新缓存版本失败 {namespace}: {str(e)}")
+        return None
+
+
+def cached(namespaces, key, ttl, loader):
+    """
+    读取共享缓存，未命中时调用 loader 并写回
+
+    缓存键包含各命名空间的当前版本号，bump_version 之后旧数据自然失效。
+    Redis不可用时直接调用 loader，避免各worker使用不一致的本地数据。
+
+    返回 (数据, 是否命中缓存)
+    """
+    try:
+        versions = get_versions(*namespaces)
+    except redis.RedisError as e:
+        logger.warning(f"读取缓存版本失败，跳过缓存: {str(e)}")
+        return loader(), False
+
+    full_key = f"{KEY_PREFIX}:cache:{key}:{'.'.join(str(v) for v in versions)}"
+    r = get_redis()
+
+    if r is None:
+        with _lock:
+            entry = _local.get(full_key)
+            if entry and entry[0] > time.time():
+                return entry[1], True
+        value = loader()
+        with _lock:
+            now = time.time()
+            if len(_local) > 1024:
+                for k in [k for k, e in _local.items() if e[0] <= now]:
+                    del _local[k]
+            _local[full_key] = (now + ttl, value)
+            _local_stale[key] = (now + STALE_CACHE_TTL, value)
+        return value, False
+
+    try:
+        raw = r.get(full_key)
+        if raw is not None:
+            return json.loads(raw), True
+    except redis.RedisError as e:
+        logger.warning(f"读取缓存失败: {str(e)}")
+        return loader(), False
+
+    value = loader()
+    try:
+        raw = json.dumps(value, default=str)
+        pipe = r.pipeline()
+        pipe.setex(full_key, ttl, raw)
+        pipe.setex(f"{KEY_PREFIX}:stale:{key}", STALE_CACHE_TTL, raw)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"写入缓存失败: {str(e)}")
+    return value, False
+
+
+def _load_stale(key):
+    r = get_redis()
+    if r is None:
+        with _lock:
+            entry = _local_stale.get(key)
+        return entry[1] if entry and entry[0] > time.time() else None
+    raw = r.get(f"{KEY_PREFIX}:stale:{key}")
+    return json.loads(raw) if raw is not None else None
+
+
+def cached_or_stale(namespaces, key, ttl, loader):
+    """
+    同 cached，但后端不可用（熔断打开、连接或查询失败）时返回最近一次
+    成功加载的数据，保留 STALE_CACHE_TTL 秒；没有可用的旧数据时抛出原异常。
+
+    返回 (数据, 是否为过期数据)
+    """
+    try:
+        value, _ = cached(namespaces, key, ttl, loader)
+        return value, False
+    except Exception as e:
+        if not is_backend_failure(e):
+            raise
+        try:
+            value = _load_stale(key)
+        except redis.RedisError:
+            value = None
+        if value is None:
+            raise
+        logger.warning(f"后端不可用，返回过期数据 {key}: {str(e)}")
+        return value, True
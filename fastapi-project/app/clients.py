@@ -0,0 +1,108 @@
+"""
+数据库和消息队列客户端
+
+驱动在第一次使用时才导入，只用到其中一部分的进程（如只写TDengine的
+入库进程）不需要加载其他驱动。
+"""
+import threading
+
+from config import (
+    TDENGINE_HOST,
+    TDENGINE_PORT,
+    TDENGINE_USER,
+    TDENGINE_PASS,
+    TDENGINE_DB,
+    MYSQL_HOST,
+    MYSQL_PORT,
+    MYSQL_USER,
+    MYSQL_PASS,
+    MYSQL_DB,
+    MYSQL_CONNECT_TIMEOUT,
+    MYSQL_READ_TIMEOUT,
+    SQLALCHEMY_DATABASE_URL,
+    redis_url,
+)
+from tracing import traced_taos
+import resilience
+
+_celery = None
+_engine = None
+_lock = threading.Lock()
+
+
+def get_taos_conn(database=TDENGINE_DB, **options):
+    """
+    创建TDengine连接；database=None 时不选择数据库（用于建库）
+
+    连接和之后的 query/execute 都经过 resilience.tdengine 的熔断和并发限制，
+    熔断打开时直接抛出 BackendUnavailable。
+    """
+    import taos
+
+    params = dict(
+        host=TDENGINE_HOST,
+        port=TDENGINE_PORT,
+        user=TDENGINE_USER,
+        password=TDENGINE_PASS,
+        **options,
+    )
+    if database:
+        params["database"] = database
+    with resilience.tdengine.call():
+        conn = taos.connect(**params)
+    return traced_taos(resilience.GuardedConnection(conn, resilience.tdengine))
+
+
+def get_mysql_conn():
+    """
+    创建MySQL连接，查询结果为字典
+
+    建立连接和之后游标的 execute/executemany、commit 都经过 resilience.mysql
+    的熔断和并发限制，慢查询和查询失败同样计入熔断。
+    """
+    import pymysql
+
+    with resilience.mysql.call():
+        conn = pymysql.connect(
+            host=MYSQL_HOST,
+            port=MYSQL_PORT,
+            user=MYSQL_USER,
+            password=MYSQL_PASS,
+            database=MYSQL_DB,
+            charset="utf8mb4",
+            cursorclass=pymysql.cursors.DictCursor,
+            connect_timeout=MYSQL_CONNECT_TIMEOUT,
+            read_timeout=MYSQL_READ_TIMEOUT,
+            write_timeout=MYSQL_READ_TIMEOUT,
+        )
+    return resilience.GuardedMySQLConnection(conn, resilience.mysql)
+
+
+def get_engine():
+    """SQLAlchemy引擎（只在API进程中用于建表）"""
+    global _engine
+    with _lock:
+        if _engine is None:
+            from sqlalchemy import create_engine
+
+            _engine = create_engine(
+                SQLALCHEMY_DATABASE_URL,
+                pool_pre_ping=True,
+                connect_args={
+                    "connect_timeout": MYSQL_CONNECT_TIMEOUT,
+                    "read_timeout": MYSQL_READ_TIMEOUT,
+                    "write_timeout": MYSQL_READ_TIMEOUT,
+                },
+            )
+        return _engine
+
+
+def get_celery():
+    """只用于发送任务的Celery客户端（worker使用 tasks.celery_app）"""
+    global _celery
+    with _lock:
+        if _celery is None:
+            from celery import Celery
+
+            _celery = Celery("tasks", broker=redis_url)
+        return _celery
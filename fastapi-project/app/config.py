@@ -0,0 +1,36 @@
+"""
+服务配置（只依赖标准库）
+
+API、MQTT入库进程、Celery worker 和管理命令共用这里的配置，
+各进程按需从 clients 创建连接，不需要导入 main。
+"""
+import os
+
+# TDengine连接配置
+TDENGINE_HOST = os.environ.get("TDENGINE_HOST", "localhost")
+TDENGINE_PORT = int(os.environ.get("TDENGINE_PORT", "6030"))
+TDENGINE_USER = os.environ.get("TDENGINE_USER", "root")
+TDENGINE_PASS = os.environ.get("TDENGINE_PASS", "taosdata")
+TDENGINE_DB = os.environ.get("TDENGINE_DB", "farm_db")
+
+# MySQL连接配置
+MYSQL_HOST = os.environ.get("MYSQL_HOST", "localhost")
+MYSQL_PORT = int(os.environ.get("MYSQL_PORT", "3306"))
+MYSQL_USER = os.environ.get("MYSQL_USER", "root")
+MYSQL_PASS = os.environ.get("MYSQL_PASS", "password")
+MYSQL_DB = os.environ.get("MYSQL_DB", "farm_info")
+
+# 连接和读写超时(秒)，MySQL变慢时请求失败而不是一直等待
+MYSQL_CONNECT_TIMEOUT = int(os.environ.get("MYSQL_CONNECT_TIMEOUT", "3"))
+MYSQL_READ_TIMEOUT = int(os.environ.get("MYSQL_READ_TIMEOUT", "30"))
+
+SQLALCHEMY_DATABASE_URL = (
+    f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASS}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
+)
+
+REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
+REDIS_PORT = os.environ.get("REDIS_PORT", "6379")
+REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD", "")
+
+# Redis URL格式：redis://[:password@]host[:port][/database]
+redis_url = f"redis://:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}/0"
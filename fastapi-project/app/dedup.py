@@ -0,0 +1,138 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# 判定结果
+NEW = "new"
+DUPLICATE = "duplicate"
+LATE = "late"
+TOO_LATE = "too_late"
+
+LATE_POLICIES = ("accept", "store", "drop")
+
+
+class IngestDeduplicator:
+    """
+    入库前去重与乱序处理
+
+    QoS 1 下同一条消息可能被重复投递。带时间戳的消息以
+    (sensor_id, metric_type, timestamp) 的8字节哈希去重。不带时间戳的消息
+    无法区分重复投递和数值相同的新读数，只对Broker重发的消息(DUP标志)去重：
+    以 (会话, 报文ID, sensor_id, metric_type, 原始负载) 的哈希匹配
+    no_ts_window 秒内收到的原消息，未标记重发的消息一律入库。
+    已见过的哈希保存在按LRU淘汰的有界表中，内存占用与 max_entries 成正比。
+
+    每个序列另外记录已接收的最大时间戳，用于识别迟到/乱序的数据：
+    - 落后超过 late_tolerance_ms 的数据直接丢弃 (TOO_LATE)
+    - 其余乱序数据按 late_policy 处理：
+      accept 正常入库并分析；store 只入库不分析；drop 丢弃
+
+    参数:
+    max_entries - 去重表最多保存的哈希数量
+    no_ts_window - 不带时间戳的消息匹配重发的时间窗口(秒)
+    late_policy - 乱序数据的处理策略
+    late_tolerance_ms - 允许的最大乱序时间(毫秒)，0表示不限制
+    """
+
+    def __init__(
+        self,
+        max_entries=100000,
+        no_ts_window=300.0,
+        late_policy="store",
+        late_tolerance_ms=24 * 3600 * 1000,
+    ):
+        if late_policy not in LATE_POLICIES:
+            raise ValueError(f"未知的乱序处理策略: {late_policy}")
+        self.max_entries = max_entries
+        self.no_ts_window = no_ts_window
+        self.late_policy = late_policy
+        self.late_tolerance_ms = late_tolerance_ms
+
+        # 哈希 -> 首次出现时间
+        self._seen = OrderedDict()
+        # (sensor_id, metric_type) -> 已接收的最大时间戳
+        self._latest_ts = {}
+        # MQTT会话序号，报文ID只在同一会话内唯一
+        self._session = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(*parts):
+        h = hashlib.blake2b(digest_size=8)
+        for part in parts:
+            h.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+            h.update(b"\x00")
+        return h.digest()
+
+    def _remember(self, key, now):
+        self._seen[key] = now
+        self._seen.move_to_end(key)
+        if len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+
+    def new_session(self):
+        """MQTT建立了新会话（非持久会话重连），此前的报文ID不再对应重发"""
+        with self._lock:
+            self._session += 1
+
+    def check(
+        self, sensor_id, metric_type, timestamp, payload, mid=None, redelivered=False, now=None
+    ):
+        """
+        判定一条读数是否需要入库
+
+        mid、redelivered 为MQTT报文ID和DUP标志，只用于不带时间戳的消息。
+        返回 (判定结果, 去重键)，去重键可在入库失败时传给 forget()
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if timestamp is None:
+                # QoS 0 没有报文ID，也不会重发
+                if not mid:
+                    return NEW, None
+                key = self._digest(self._session, mid, sensor_id, metric_type, payload)
+                seen_at = self._seen.get(key)
+                if redelivered and seen_at is not None and now - seen_at <= self.no_ts_window:
+                    return DUPLICATE, key
+                self._remember(key, now)
+                return NEW, key
+
+            key = self._digest(sensor_id, metric_type, timestamp)
+            if key in self._seen:
+                self._seen.move_to_end(key)
+                return DUPLICATE, key
+
+            try:
+                ts = int(timestamp)
+            except (TypeError, ValueError):
+                # 非数值时间戳(如时间字符串)不参与乱序判断
+                self._remember(key, now)
+                return NEW, key
+
+            series = (sensor_id, metric_type)
+            latest = self._latest_ts.get(series)
+            if latest is None or ts >= latest:
+                self._latest_ts[series] = ts
+                self._remember(key, now)
+                return NEW, key
+
+            if self.late_tolerance_ms and latest - ts > self.late_tolerance_ms:
+                return TOO_LATE, key
+            if self.late_policy == "drop":
+                return TOO_LATE, key
+            self._remember(key, now)
+            return LATE, key
+
+    def forget(self, key):
+        """入库失败时移除去重键，允许后续重试的消息再次入库"""
+        if key is None:
+            return
+        with self._lock:
+            self._seen.pop(key, None)
+
+    def should_analyze(self, decision):
+        return decision == NEW or (decision == LATE and self.late_policy == "accept")
+
+    def __len__(self):
+        return len(self._seen)
@@ -0,0 +1,207 @@
+import ipaddress
+import logging
+import os
+import threading
+import time
+import uuid
+
+import redis
+from fastapi import HTTPException, Request
+
+from cache import get_redis, KEY_PREFIX
+from retention import available_sources
+from series_registry import valid_identifier, MAX_SENSOR_ID_LEN
+
+logger = logging.getLogger("query-governor")
+
+# 各接口的参数上限
+MAX_LATEST_LIMIT = int(os.environ.get("MAX_LATEST_LIMIT", "1000"))
+MAX_AVG_HOURS = int(os.environ.get("MAX_AVG_HOURS", str(24 * 366)))
+MAX_LIST_LIMIT = int(os.environ.get("MAX_LIST_LIMIT", "5000"))
+# /api/latest 的最大回溯时间(小时)，避免在全部历史上排序
+LATEST_LOOKBACK_HOURS = int(os.environ.get("LATEST_LOOKBACK_HOURS", "168"))
+# 单次查询估算扫描行数的上限（序列数 × 小时数 × 每小时行数）
+MAX_QUERY_ROWS = int(os.environ.get("MAX_QUERY_ROWS", "5000000"))
+# 不超过该小时数的聚合查询优先使用原始数据（精确且扫描量小）
+RAW_PREFERRED_HOURS = int(os.environ.get("RAW_PREFERRED_HOURS", "6"))
+# 降采样数据至少要有这么多个窗口覆盖查询范围才使用，边界窗口的误差可以忽略
+ROLLUP_MIN_BUCKETS = int(os.environ.get("ROLLUP_MIN_BUCKETS", "48"))
+# /api/avg 一次最多指定的传感器数
+MAX_AVG_SENSORS = int(os.environ.get("MAX_AVG_SENSORS", "500"))
+# 每个客户端同时执行的查询数上限
+MAX_CLIENT_CONCURRENCY = int(os.environ.get("MAX_CLIENT_CONCURRENCY", "8"))
+# 未释放的并发名额(进程异常退出)多久后失效(秒)
+SLOT_TTL = 60
+
+# 可信反向代理的IP或网段（逗号分隔），只有来自这些地址的请求才按 X-Forwarded-For 识别客户端
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(item.strip(), strict=False)
+    for item in os.environ.get("TRUSTED_PROXIES", "").split(",")
+    if item.strip()
+]
+
+_local_slots = {}
+_local_lock = threading.Lock()
+
+
+def validate_identifier(value, name, max_len=MAX_SENSOR_ID_LEN):
+    """
+    校验拼接到SQL中的标识符，拒绝包含引号等特殊字符的输入
+
+    与入库、传感器建档使用同一规则，能写入的ID都能查询。
+    """
+    if value is not None and not valid_identifier(value, max_len):
+        raise HTTPException(status_code=400, detail=f"无效的{name}: {value}")
+    return value
+
+
+def parse_cursor(value):
+    """
+    解析 /api/latest 的分页游标 "毫秒时间戳:传感器ID"，返回 (ts, sensor_id)
+
+    只有时间戳的旧格式游标返回 (ts, None)。
+    """
+    if value is None:
+        return None, None
+    ts, _, sensor_id = value.partition(":")
+    try:
+        ts = int(ts)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"无效的分页游标: {value}")
+    if not sensor_id:
+        return ts, None
+    return ts, validate_identifier(sensor_id, "分页游标")
+
+
+def estimate_cost(series_count, hours, points_per_hour):
+    """估算查询需要扫描的行数：序列数 × 时间范围(小时) × 每小时行数"""
+    return max(1, series_count) * max(1, hours) * points_per_hour
+
+
+def plan_sources(hours):
+    """
+    按优先顺序排列能覆盖 hours 的数据源
+
+    - 短时间范围(<= RAW_PREFERRED_HOURS)：原始数据优先，其次由细到粗的降采样
+    - 其他：窗口数不少于 ROLLUP_MIN_BUCKETS 的降采样由粗到细，然后原始数据，
+      最后是窗口过粗的降采样；降采样未启用或不覆盖该范围时自然回退到原始数据
+    """
+    sources = available_sources(hours)
+    if hours <= RAW_PREFERRED_HOURS:
+        return sources
+    raw = [s for s in sources if s[0] == "raw"]
+    rollups = [s for s in sources if s[0] != "raw"]
+    fine_enough = [s for s in rollups if hours * s[1] >= ROLLUP_MIN_BUCKETS]
+    too_coarse = [s for s in rollups if hours * s[1] < ROLLUP_MIN_BUCKETS]
+    return sorted(fine_enough, key=lambda s: s[1]) + raw + too_coarse
+
+
+def choose_source(series_count, hours, limit=None, memory_hours=0):
+    """
+    为聚合查询选择数据源
+
+    时间范围在进程内滚动窗口覆盖范围(memory_hours)以内时直接使用内存数据；
+    否则按 plan_sources 的顺序，选择第一个估算行数不超过上限的数据源；
+    都不满足时拒绝查询。返回 (来源名称, 估算行数)
+    """
+    if hours <= memory_hours:
+        return "memory", 0
+    limit = limit or MAX_QUERY_ROWS
+    for source, points_per_hour in plan_sources(hours):
+        cost = estimate_cost(series_count, hours, points_per_hour)
+        if cost <= limit:
+            return source, cost
+    raise HTTPException(
+        status_code=400,
+        detail=(
+            f"查询范围过大（{series_count}个序列 × {hours}小时），"
+            f"请缩小时间范围或指定sensor_id"
+        ),
+    )
+
+
+def _is_trusted_proxy(host):
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def _client_key(request):
+    """
+    识别客户端：直连请求使用对端地址；经过可信代理时从 X-Forwarded-For
+    右侧向左跳过可信代理，取第一个不可信的地址。客户端自己伪造的
+    X-Forwarded-For 不会被采信，无法借此绕过并发限制。
+    """
+    client = request.client.host if request.client else None
+    if client and _is_trusted_proxy(client):
+        forwarded = request.headers.get("x-forwarded-for", "")
+        for hop in reversed([h.strip() for h in forwarded.split(",") if h.strip()]):
+            client = hop
+            if not _is_trusted_proxy(hop):
+                break
+    return client or "unknown"
+
+
+def _acquire(client):
+    """
+    占用一个并发名额，返回 (当前占用数, 释放句柄)
+
+    Redis中每个客户端一个有序集合，每个进行中的查询一个成员，分数为过期时间；
+    进程异常退出未释放的成员 SLOT_TTL 秒后自然失效，计数不会因过期而变成负数。
+    """
+    r = get_redis()
+    if r is not None:
+        key = f"{KEY_PREFIX}:conc:{client}"
+        member = uuid.uuid4().hex
+        now = time.time()
+        try:
+            pipe = r.pipeline()
+            pipe.zremrangebyscore(key, "-inf", now)
+            pipe.zadd(key, {member: now + SLOT_TTL})
+            pipe.zcard(key)
+            pipe.expire(key, SLOT_TTL)
+            _, _, count, _ = pipe.execute()
+            return count, (key, member)
+        except redis.RedisError as e:
+            logger.warning(f"并发计数失败，使用进程内计数: {str(e)}")
+    with _local_lock:
+        _local_slots[client] = _local_slots.get(client, 0) + 1
+        return _local_slots[client], None
+
+
+def _release(client, handle):
+    if handle is not None:
+        key, member = handle
+        try:
+            get_redis().zrem(key, member)
+        except redis.RedisError as e:
+            logger.warning(f"释放并发计数失败: {str(e)}")
+        return
+    with _local_lock:
+        _local_slots[client] = _local_slots.get(client, 1) - 1
+        if _local_slots[client] <= 0:
+            del _local_slots[client]
+
+
+def client_slot(request: Request):
+    """
+    限制每个客户端同时执行的查询数，超出时返回429
+
+    计数保存在Redis中，多个API worker共享同一个上限。同步依赖由FastAPI在
+    线程池中执行，Redis调用不会阻塞事件循环；使用它的接口也应声明为普通
+    def，否则查询在事件循环上串行执行，并发计数永远不会超过1。
+    """
+    client = _client_key(request)
+    count, handle = _acquire(client)
+    if count > MAX_CLIENT_CONCURRENCY:
+        _release(client, handle)
+        raise HTTPException(
+            status_code=429,
+            detail=f"并发查询过多，每个客户端最多同时执行{MAX_CLIENT_CONCURRENCY}个查询",
+        )
+    try:
+        yield
+    finally:
+        _release(client, handle)
@@ -0,0 +1,16 @@
+# gunicorn配置，DEPLOY_MODE=split 时由 run.py 使用
+import os
+
+from prometheus_client import multiprocess
+
+bind = f"0.0.0.0:{os.environ.get('API_PORT', '8003')}"
+workers = int(os.environ.get("API_WORKERS", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+graceful_timeout = 30
+accesslog = "-"
+
+
+def child_exit(server, worker):
+    # 清理已退出worker的Prometheus多进程指标文件
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
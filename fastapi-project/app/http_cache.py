@@ -0,0 +1,94 @@
+import hashlib
+import logging
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+import redis
+from fastapi import HTTPException, Request, Response
+
+from cache import get_version_state
+
+logger = logging.getLogger("http-cache")
+
+# 元数据接口允许客户端直接使用本地副本的时间(秒)，之后需带 If-None-Match 重新验证
+HTTP_CACHE_MAX_AGE = int(os.environ.get("HTTP_CACHE_MAX_AGE", "30"))
+
+
+def make_etag(key, versions, epoch, query=""):
+    """由接口名、缓存版本号、时间片和查询参数生成弱ETag"""
+    raw = f"{key}:{'.'.join(str(v) for v in versions)}:{epoch}:{query}"
+    return 'W/"' + hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest() + '"'
+
+
+def etag_matches(header, etag):
+    """If-None-Match 比较（弱比较，忽略 W/ 前缀）"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tag = etag.removeprefix("W/")
+    return any(item.strip().removeprefix("W/") == tag for item in header.split(","))
+
+
+def not_modified_since(header, last_modified):
+    if not header or not last_modified:
+        return False
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    # HTTP日期精度为秒
+    return int(last_modified) <= since
+
+
+def cache_validators(namespaces, key, ttl, max_age=None):
+    """
+    为元数据接口生成 ETag/Last-Modified/Cache-Control 的依赖
+
+    ETag 由缓存命名空间的版本号决定：修改接口调用 bump_version 后立即变化。
+    版本号之外再加入按 ttl 划分的时间片，与服务端缓存的过期时间一致，
+    未经 bump_version 的变化（如TDengine目录）最多延迟 ttl 秒可见。
+    客户端缓存仍然有效时直接返回304，不查询缓存和数据库。
+    """
+    max_age = HTTP_CACHE_MAX_AGE if max_age is None else max_age
+
+    # 同步依赖在线程池中执行，读取Redis不阻塞事件循环
+    def dependency(request: Request, response: Response):
+        try:
+            versions, mtime = get_version_state(*namespaces)
+        except redis.RedisError as e:
+            logger.warning(f"读取缓存版本失败，跳过条件请求: {str(e)}")
+            response.headers["Cache-Control"] = "no-cache"
+            return
+
+        epoch = int(time.time() // ttl) if ttl else 0
+        # 时间片开始也视为一次修改，保证 If-Modified-Since 与 ETag 一致
+        last_modified = max(mtime, epoch * ttl)
+        headers = {
+            "ETag": make_etag(key, versions, epoch, request.url.query),
+            "Cache-Control": f"private, max-age={max_age}",
+        }
+        if last_modified:
+            headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+
+        if_none_match = request.headers.get("if-none-match")
+        if (if_none_match and etag_matches(if_none_match, headers["ETag"])) or (
+            not if_none_match
+            and not_modified_since(request.headers.get("if-modified-since"), last_modified)
+        ):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
+
+
+def mark_stale(response: Response):
+    """
+    返回过期数据时使用：不允许客户端缓存，并去掉校验头，
+    避免后端恢复后客户端凭旧ETag得到304而继续使用过期数据
+    """
+    response.headers["Cache-Control"] = "no-store"
+    for header in ("ETag", "Last-Modified"):
+        if header in response.headers:
+            del response.headers[header]
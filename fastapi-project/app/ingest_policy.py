@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger("ingest-policy")
+
+RAW = "raw"
+DEADBAND = "deadband"
+WINDOW = "window"
+
+# 默认策略：全部原样存储
+DEFAULT_POLICY = (RAW, None, None, None)
+
+
+def _to_ms(timestamp):
+    """消息时间戳转为毫秒整数，缺失或非数值时使用当前时间"""
+    try:
+        return int(timestamp)
+    except (TypeError, ValueError):
+        return int(time.time() * 1000)
+
+
+class IngestPolicies:
+    """
+    按指标（可按传感器覆盖）配置的入库策略
+
+    - raw: 每条数据都存储
+    - deadband: 与上次存储值相差超过 deadband 才存储；超过 max_silence 秒
+      无变化时仍存储一次，保证曲线和离线检测有数据
+    - window: 按 window_seconds 秒对齐的滚动窗口聚合，每个窗口存储一次
+      avg/min/max/count
+
+    apply() 返回需要写入的记录列表：
+    (RAW, ts_ms, value) 或 (WINDOW, 窗口开始ts_ms, avg, min, max, count)
+    原样存储时 ts_ms 为消息中的原始时间戳（可能为 None，由数据库使用 NOW）；
+    deadband/window 需要数值时间戳，缺失或非数值时使用当前时间。
+
+    参数:
+    loader - 返回策略行的函数，每行包含 metric_type, sensor_id, policy,
+             deadband, max_silence, window_seconds
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        # (metric_type, sensor_id或'') -> (policy, deadband, max_silence, window_seconds)
+        self._policies = {}
+        # deadband状态：key -> [上次存储值, 上次存储ts_ms]
+        self._deadband = {}
+        # window状态：key -> [窗口开始ts_ms, 窗口长度ms, sum, min, max, count]
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        policies = {}
+        for row in self.loader():
+            policies[(row["metric_type"], row["sensor_id"] or "")] = (
+                row["policy"],
+                row["deadband"],
+                row["max_silence"],
+                row["window_seconds"],
+            )
+        with self._lock:
+            self._policies = policies
+        logger.info(f"已加载 {len(policies)} 条入库策略")
+
+    def policy_for(self, sensor_id, metric_type):
+        return (
+            self._policies.get((metric_type, sensor_id))
+            or self._policies.get((metric_type, ""))
+            or DEFAULT_POLICY
+        )
+
+    def apply(self, sensor_id, metric_type, ts_ms, value):
+        policy, deadband, max_silence, window_seconds = self.policy_for(
+            sensor_id, metric_type
+        )
+        if policy == DEADBAND and deadband is not None:
+            return self._apply_deadband(
+                (sensor_id, metric_type), ts_ms, value, deadband, max_silence
+            )
+        if policy == WINDOW and window_seconds:
+            return self._apply_window(
+                (sensor_id, metric_type), ts_ms, value, window_seconds * 1000
+            )
+        return [(RAW, ts_ms, value)]
+
+    def _apply_deadband(self, key, ts_ms, value, deadband, max_silence):
+        ts_ms = _to_ms(ts_ms)
+        with self._lock:
+            state = self._deadband.get(key)
+            if (
+                state is None
+                or abs(value - state[0]) >= deadband
+                or (max_silence and ts_ms - state[1] >= max_silence * 1000)
+            ):
+                self._deadband[key] = [value, ts_ms]
+                return [(RAW, ts_ms, value)]
+        return []
+
+    def _apply_window(self, key, ts_ms, value, window_ms):
+        ts_ms = _to_ms(ts_ms)
+        start = ts_ms - ts_ms % window_ms
+        outputs = []
+        with self._lock:
+            state = self._windows.get(key)
+            if state is not None and (start > state[0] or state[1] != window_ms):
+                outputs.append(self._close(key, state)[1])
+                state = None
+            if state is None:
+                self._windows[key] = [start, window_ms, value, value, value, 1]
+            else:
+                # 迟到的数据并入当前窗口
+                state[2] += value
+                state[3] = min(state[3], value)
+                state[4] = max(state[4], value)
+                state[5] += 1
+        return outputs
+
+    @staticmethod
+    def _close(key, state):
+        start, _, total, low, high, count = state
+        return key, (WINDOW, start, total / count, low, high, count)
+
+    def flush_due(self, now_ms=None, grace_ms=2000):
+        """
+        关闭已经结束的窗口（之后没有新数据到达的序列）
+
+        返回 [((sensor_id, metric_type), 记录)]
+        """
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        closed = []
+        with self._lock:
+            for key, state in list(self._windows.items()):
+                if state[0] + state[1] + grace_ms <= now_ms:
+                    closed.append(self._close(key, state))
+                    del self._windows[key]
+        return closed
+
+    def flush_all(self):
+        """停止时关闭所有窗口"""
+        with self._lock:
+            closed = [self._close(key, state) for key, state in self._windows.items()]
+            self._windows.clear()
+        return closed
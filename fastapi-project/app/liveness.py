@@ -0,0 +1,177 @@
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger("liveness")
+
+
+class LivenessTracker:
+    """
+    传感器在线状态跟踪器
+
+    每个序列(sensor_id, metric_type)在内存中记录最后上报时间，并在最小堆中
+    最多保留一个截止时间。收到数据只更新最后上报时间(O(1))，截止时间到达时
+    若期间有新数据则重新入堆(O(log n))，否则判定为离线。整个过程不需要
+    周期性扫描全部传感器，也不需要查询TDengine。
+
+    参数:
+    get_interval - 返回传感器期望上报间隔(秒)的函数
+    on_offline - 序列离线时的回调 (sensor_id, metric_type, last_value, interval)
+    on_online - 离线序列恢复上报时的回调 (sensor_id, metric_type, value)
+    grace_factor - 超过 间隔*grace_factor 未上报即判定离线
+    refresh - 可选，定期在检测线程中调用（如重新加载传感器元数据）
+    refresh_interval - refresh 的调用间隔(秒)
+    """
+
+    def __init__(
+        self,
+        get_interval,
+        on_offline,
+        on_online,
+        grace_factor=3.0,
+        refresh=None,
+        refresh_interval=300,
+    ):
+        self.get_interval = get_interval
+        self.on_offline = on_offline
+        self.on_online = on_online
+        self.grace_factor = grace_factor
+        self.refresh = refresh
+        self.refresh_interval = refresh_interval
+        self._next_refresh = time.time() + refresh_interval
+
+        # key -> [last_seen, last_value, offline]
+        self._series = {}
+        # (deadline, key)，每个序列最多一个条目
+        self._heap = []
+        self._armed = set()
+        self._recovered = []
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+
+    def _deadline(self, key, last_seen):
+        return last_seen + self.get_interval(key[0]) * self.grace_factor
+
+    def _arm(self, key, last_seen):
+        if key in self._armed:
+            return False
+        deadline = self._deadline(key, last_seen)
+        heapq.heappush(self._heap, (deadline, key))
+        self._armed.add(key)
+        return self._heap[0][1] == key
+
+    def seed(self, sensor_id, metric_type, last_seen=None, last_value=None, offline=False):
+        """启动时预加载序列状态（最后上报时间或已存在的离线告警）"""
+        key = (sensor_id, metric_type)
+        with self._cond:
+            self._series[key] = [last_seen or time.time(), last_value, offline]
+            if not offline:
+                self._arm(key, self._series[key][0])
+            self._cond.notify()
+
+    def touch(self, sensor_id, metric_type, value=None, now=None):
+        """收到一条数据时调用，更新最后上报时间"""
+        key = (sensor_id, metric_type)
+        now = time.time() if now is None else now
+        with self._cond:
+            entry = self._series.get(key)
+            if entry is None:
+                entry = self._series[key] = [now, value, False]
+            else:
+                entry[0] = now
+                entry[1] = value
+                if entry[2]:
+                    entry[2] = False
+                    self._recovered.append((key, value))
+                    self._cond.notify()
+            # 新序列或恢复的序列需要入堆；只有堆顶变化时才唤醒检测线程
+            if self._arm(key, now):
+                self._cond.notify()
+
+    def is_offline(self, sensor_id, metric_type):
+        entry = self._series.get((sensor_id, metric_type))
+        return bool(entry and entry[2])
+
+    def _collect_due(self, now):
+        """弹出所有到期的截止时间，返回新离线的序列"""
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, key = heapq.heappop(self._heap)
+            self._armed.discard(key)
+            entry = self._series.get(key)
+            if entry is None or entry[2]:
+                continue
+            deadline = self._deadline(key, entry[0])
+            if deadline > now:
+                # 期间有新数据，按新的截止时间重新入堆
+                heapq.heappush(self._heap, (deadline, key))
+                self._armed.add(key)
+            else:
+                entry[2] = True
+                expired.append((key, entry[1]))
+        return expired
+
+    def run_due(self, now=None):
+        """处理到期的截止时间和恢复事件（回调在锁外执行）"""
+        now = time.time() if now is None else now
+        with self._cond:
+            expired = self._collect_due(now)
+            recovered, self._recovered = self._recovered, []
+
+        for (sensor_id, metric_type), value in recovered:
+            try:
+                self.on_online(sensor_id, metric_type, value)
+            except Exception as e:
+                logger.exception(f"处理传感器恢复事件出错: {str(e)}")
+
+        for (sensor_id, metric_type), last_value in expired:
+            try:
+                self.on_offline(
+                    sensor_id, metric_type, last_value, self.get_interval(sensor_id)
+                )
+            except Exception as e:
+                logger.exception(f"处理传感器离线事件出错: {str(e)}")
+
+    def _maybe_refresh(self):
+        if self.refresh is None or time.time() < self._next_refresh:
+            return
+        self._next_refresh = time.time() + self.refresh_interval
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning(f"刷新传感器元数据失败: {str(e)}")
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                timeout = 60.0
+                if self.refresh is not None:
+                    timeout = max(0.0, self._next_refresh - time.time())
+                if self._heap:
+                    timeout = min(timeout, max(0.0, self._heap[0][0] - time.time()))
+                if not self._recovered:
+                    self._cond.wait(timeout)
+                if self._stopping:
+                    return
+            self._maybe_refresh()
+            self.run_due()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._loop, name="liveness-monitor", daemon=True
+            )
+            self._thread.start()
+            logger.info("传感器在线状态监测已启动")
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -1,17 +1,42 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from celery import Celery
-import taos
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from prometheus_client import CollectorRegistry, make_asgi_app, multiprocess
+from pydantic import BaseModel, Field, ValidationError
 import time
+import asyncio
 import logging
-import pymysql
-from sqlalchemy import create_engine, text
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import text
+from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 import os
 
+import clients
+import rolling
+from config import TDENGINE_DB
+from cache import cached_or_stale, try_bump_version
+from http_cache import cache_validators, mark_stale
+import resilience
+from resilience import BackendUnavailable
+from tracing import init_tracing, instrument_app
+from retention import rollup_db, ROLLUP_STABLE
+from schema import init_tdengine
+from sensor_import import parse_body, check_identifiers, upsert_sensors
+from series_registry import MAX_METRIC_TYPE_LEN
+from governor import (
+    client_slot,
+    validate_identifier,
+    parse_cursor,
+    choose_source,
+    MAX_LATEST_LIMIT,
+    MAX_AVG_HOURS,
+    MAX_AVG_SENSORS,
+    MAX_LIST_LIMIT,
+    LATEST_LOOKBACK_HOURS,
+)
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -20,12 +45,103 @@ logging.basicConfig(
 )
 logger = logging.getLogger("farm-api")
 
+# 启动配置
+# 是否在API进程中启动MQTT客户端
+START_MQTT_IN_API = os.environ.get("START_MQTT_IN_API", "true").lower() == "true"
+# 后端初始化重试的初始/最大退避时间(秒)
+STARTUP_RETRY_BASE = float(os.environ.get("STARTUP_RETRY_BASE", "0.5"))
+STARTUP_RETRY_MAX_DELAY = float(os.environ.get("STARTUP_RETRY_MAX_DELAY", "30"))
+# 启动阶段最多等待后端就绪的时间(秒)，超时后继续在后台重试
+STARTUP_TIMEOUT = float(os.environ.get("STARTUP_TIMEOUT", "60"))
+
+
+async def retry_with_backoff(name, func, timings):
+    """在线程中执行初始化函数，失败时按指数退避重试直到成功"""
+    start_time = time.time()
+    delay = STARTUP_RETRY_BASE
+    attempt = 1
+    while True:
+        try:
+            await asyncio.to_thread(func)
+            timings[name] = (time.time() - start_time) * 1000
+            logger.info(f"{name} 初始化完成 (第{attempt}次尝试)")
+            return
+        except Exception as e:
+            logger.warning(f"{name} 初始化失败 (第{attempt}次尝试): {str(e)}，{delay:.1f}秒后重试")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, STARTUP_RETRY_MAX_DELAY)
+            attempt += 1
+
+
+async def start_mqtt_after(tdengine_task, timings):
+    """TDengine就绪后启动MQTT客户端"""
+    await tdengine_task
+    from mqtt_handler import start_mqtt_client
+
+    started = {}
+
+    def _start():
+        client = start_mqtt_client()
+        if not client:
+            raise RuntimeError("MQTT客户端启动失败")
+        started["client"] = client
+
+    await retry_with_backoff("mqtt", _start, timings)
+    # 入库与API同进程，/api/avg 可从内存滚动窗口回答短时间范围的查询
+    rolling.windows.start()
+    return started["client"]
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """应用生命周期：并行初始化后端并记录启动耗时"""
+    start_time = time.time()
+    timings = {}
+    tasks = {
+        "tdengine": asyncio.create_task(
+            retry_with_backoff("tdengine", init_tdengine, timings)
+        ),
+        "mysql": asyncio.create_task(retry_with_backoff("mysql", init_mysql, timings)),
+    }
+    if START_MQTT_IN_API:
+        tasks["mqtt"] = asyncio.create_task(
+            start_mqtt_after(tasks["tdengine"], timings)
+        )
+    app.state.startup_tasks = tasks
+
+    done, pending = await asyncio.wait(tasks.values(), timeout=STARTUP_TIMEOUT)
+    breakdown = ", ".join(f"{name}={ms:.0f}ms" for name, ms in timings.items())
+    logger.info(
+        f"启动完成，总耗时 {(time.time() - start_time)*1000:.0f}ms ({breakdown})"
+    )
+    if pending:
+        waiting = [name for name, task in tasks.items() if task in pending]
+        logger.warning(f"以下组件尚未就绪，将在后台继续重试: {waiting}")
+
+    yield
+
+    for task in tasks.values():
+        if not task.done():
+            task.cancel()
+    mqtt_task = tasks.get("mqtt")
+    if mqtt_task and mqtt_task.done() and not mqtt_task.cancelled():
+        if mqtt_task.exception() is None:
+            from mqtt_handler import stop_mqtt_client
+
+            stop_mqtt_client(mqtt_task.result())
+
+
 app = FastAPI(
     title="智能农场数据API",
     description="接收和查询农场传感器数据的API服务",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# 分布式追踪（TRACING_ENABLED=true 时生效）
+init_tracing("farm-api")
+instrument_app(app)
+
 # 允许CORS
 app.add_middleware(
     CORSMiddleware,
@@ -35,36 +151,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# TDengine连接配置
-TDENGINE_HOST = os.environ.get("TDENGINE_HOST", "localhost")
-TDENGINE_USER = os.environ.get("TDENGINE_USER", "root")
-TDENGINE_PASS = os.environ.get("TDENGINE_PASS", "taosdata")
-TDENGINE_DB = os.environ.get("TDENGINE_DB", "farm_db")
-
-# MySQL连接配置
-MYSQL_HOST = os.environ.get("MYSQL_HOST", "localhost")
-MYSQL_PORT = int(os.environ.get("MYSQL_PORT", "3306"))
-MYSQL_USER = os.environ.get("MYSQL_USER", "root")
-MYSQL_PASS = os.environ.get("MYSQL_PASS", "password")
-MYSQL_DB = os.environ.get("MYSQL_DB", "farm_info")
-
-# SQLAlchemy设置
-SQLALCHEMY_DATABASE_URL = (
-    f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASS}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
-)
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
-REDIS_PORT = os.environ.get("REDIS_PORT", "6379")
-REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD", "")
-
-# Redis URL格式：redis://[:password@]host[:port][/database]
-redis_url = f"redis://:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}/0"
-
-# 修改Celery配置使用环境变量
-celery = Celery("tasks", broker=redis_url)
+# 响应压缩：安装了 brotli-asgi 时优先使用Brotli（不支持的客户端回退到gzip）
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))
+try:
+    from brotli_asgi import BrotliMiddleware
+
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_SIZE)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE)
+
+# Prometheus指标（多进程部署时汇总 PROMETHEUS_MULTIPROC_DIR 下所有进程的数据）
+if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    metrics_registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(metrics_registry)
+    app.mount("/metrics", make_asgi_app(registry=metrics_registry))
+else:
+    app.mount("/metrics", make_asgi_app())
+
+# 多worker共享的缓存（传感器/位置元数据、指标类型等），Redis地址见 config.py
+# 元数据缓存时间(秒)，修改接口会主动使缓存失效
+METADATA_CACHE_TTL = int(os.environ.get("METADATA_CACHE_TTL", "300"))
+# TDengine目录(传感器ID、指标类型)缓存时间(秒)
+CATALOG_CACHE_TTL = int(os.environ.get("CATALOG_CACHE_TTL", "30"))
+# 批量导入每次请求的最大行数和每批写入MySQL的行数
+BULK_MAX_ROWS = int(os.environ.get("BULK_MAX_ROWS", "5000"))
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", "500"))
 
 
 # 数据模型
@@ -96,26 +207,60 @@ class SensorInfo(BaseModel):
     description: Optional[str] = Field(None, description="描述信息")
     installation_date: Optional[str] = Field(None, description="安装日期")
     status: str = Field("active", description="状态：active, inactive, maintenance")
+    report_interval: Optional[int] = Field(
+        None, description="期望上报间隔(秒)，用于离线检测"
+    )
+
+
+class SensorThreshold(BaseModel):
+    metric_type: str = Field(..., description="测量类型")
+    min_value: Optional[float] = Field(None, description="告警下限")
+    max_value: Optional[float] = Field(None, description="告警上限")
+    warning_min: Optional[float] = Field(None, description="预警下限")
+    warning_max: Optional[float] = Field(None, description="预警上限")
+
+
+class SensorImport(SensorInfo):
+    thresholds: List[SensorThreshold] = Field(
+        default_factory=list, description="该传感器各指标的阈值"
+    )
+
+
+@app.exception_handler(BackendUnavailable)
+async def backend_unavailable_handler(request: Request, exc: BackendUnavailable):
+    """后端熔断、过载或连接失败时快速返回503，客户端按 Retry-After 重试"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "backend": exc.backend},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def with_stale(response, stale, body):
+    """后端不可用、返回的是缓存中的旧数据时加上 stale 标记"""
+    if stale:
+        mark_stale(response)
+        body["stale"] = True
+    return body
 
 
 # 初始化TDengine连接
 def get_taos_conn():
     try:
-        return taos.connect(
-            host=TDENGINE_HOST,
-            user=TDENGINE_USER,
-            password=TDENGINE_PASS,
-            port=6030,  # 显式指定TDengine端口
-            timezone="Asia/Shanghai",  # 明确时区
+        return clients.get_taos_conn(
+            database=None, timezone="Asia/Shanghai"  # 明确时区
         )
+    except BackendUnavailable:
+        raise
     except Exception as e:
+        # 连接失败同样按后端不可用处理(503)，由 BackendUnavailable 处理器统一响应
         logger.error(f"连接TDengine失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"TDengine连接失败: {str(e)}")
+        raise BackendUnavailable("tdengine", f"连接失败: {str(e)}")
 
 
 # 初始化MySQL连接
 def get_db():
-    db = SessionLocal()
+    db = Session(clients.get_engine(), autoflush=False)
     try:
         yield db
     finally:
@@ -125,51 +270,19 @@ def get_db():
 # 直接使用pymysql连接MySQL的简便方法
 def get_mysql_conn():
     try:
-        return pymysql.connect(
-            host=MYSQL_HOST,
-            port=MYSQL_PORT,
-            user=MYSQL_USER,
-            password=MYSQL_PASS,
-            database=MYSQL_DB,
-            charset="utf8mb4",
-            cursorclass=pymysql.cursors.DictCursor,
-        )
+        return clients.get_mysql_conn()
+    except BackendUnavailable:
+        raise
     except Exception as e:
         logger.error(f"连接MySQL失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"MySQL连接失败: {str(e)}")
-
-
-def init_db():
-    # 初始化TDengine
-    conn = get_taos_conn()
-    try:
-        # 创建数据库
-        conn.execute(f"CREATE DATABASE IF NOT EXISTS {TDENGINE_DB}")
-        conn.execute(f"USE {TDENGINE_DB}")
+        raise BackendUnavailable("mysql", f"连接失败: {str(e)}")
 
-        # 创建超级表（模板）
-        conn.execute(
-            """
-            CREATE STABLE IF NOT EXISTS sensor_data (
-                ts TIMESTAMP,
-                value FLOAT
-            ) TAGS (
-                sensor_id BINARY(50),
-                metric_type BINARY(20)
-            )
-            """
-        )
-        logger.info("TDengine数据库初始化完成")
-    except Exception as e:
-        logger.error(f"初始化TDengine出错: {str(e)}")
-        raise
-    finally:
-        conn.close()
 
-    # 初始化MySQL（可选，如果表已存在则无需创建）
+def init_mysql():
+    # 初始化MySQL（如果表已存在则无需创建）
     try:
         # 使用SQLAlchemy创建表
-        with engine.connect() as connection:
+        with clients.get_engine().connect() as connection:
             # 检查并创建sensors表
             connection.execute(
                 text(
@@ -182,12 +295,28 @@ def init_db():
                     model VARCHAR(100) NOT NULL,
                     description TEXT,
                     installation_date DATE,
-                    status VARCHAR(20) DEFAULT 'active'
+                    status VARCHAR(20) DEFAULT 'active',
+                    report_interval INT NULL
                 )
             """
                 )
             )
 
+            # 旧版本创建的sensors表补充report_interval列
+            has_interval = connection.execute(
+                text(
+                    """
+                SELECT COUNT(*) FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'sensors'
+                AND COLUMN_NAME = 'report_interval'
+            """
+                )
+            ).scalar()
+            if not has_interval:
+                connection.execute(
+                    text("ALTER TABLE sensors ADD COLUMN report_interval INT NULL")
+                )
+
             # 检查并创建locations表
             connection.execute(
                 text(
@@ -203,76 +332,241 @@ def init_db():
                 )
             )
 
+            # 检查并创建入库策略表
+            connection.execute(
+                text(
+                    """
+                CREATE TABLE IF NOT EXISTS ingest_policies (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    metric_type VARCHAR(50) NOT NULL,
+                    sensor_id VARCHAR(50) NOT NULL DEFAULT '',
+                    policy ENUM('raw', 'deadband', 'window') NOT NULL DEFAULT 'raw',
+                    deadband FLOAT NULL,
+                    max_silence INT NULL,
+                    window_seconds INT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                    UNIQUE KEY (metric_type, sensor_id)
+                )
+            """
+                )
+            )
+
+            # 检查并创建每日统计表
+            connection.execute(
+                text(
+                    """
+                CREATE TABLE IF NOT EXISTS daily_sensor_stats (
+                    report_date DATE NOT NULL,
+                    sensor_id VARCHAR(50) NOT NULL,
+                    metric_type VARCHAR(50) NOT NULL,
+                    avg_value DOUBLE,
+                    min_value DOUBLE,
+                    max_value DOUBLE,
+                    sample_count INT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                    PRIMARY KEY (report_date, metric_type, sensor_id)
+                )
+            """
+                )
+            )
+
+            # 检查并创建每日报告进度表
+            connection.execute(
+                text(
+                    """
+                CREATE TABLE IF NOT EXISTS daily_report_runs (
+                    report_date DATE NOT NULL,
+                    metric_type VARCHAR(50) NOT NULL,
+                    status ENUM('running', 'done', 'failed') NOT NULL,
+                    series_count INT DEFAULT 0,
+                    sample_count INT DEFAULT 0,
+                    duration_ms FLOAT,
+                    message TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                    PRIMARY KEY (report_date, metric_type)
+                )
+            """
+                )
+            )
+
             connection.commit()
 
         logger.info("MySQL数据库初始化完成")
     except Exception as e:
         logger.error(f"初始化MySQL出错: {str(e)}")
-        # 不抛出异常，因为这不应该阻止应用启动
+        raise
 
 
-@app.get("/api/avg/{metric_type}")
-async def get_avg_metric(metric_type: str, hours: int = 24, sensor_id: str = None):
-    """查询最近N小时某类型传感器的平均值"""
-    conn = get_taos_conn()
-    start_time = time.time()
+def init_db():
+    init_tdengine()
     try:
-        conn.execute(f"USE {TDENGINE_DB}")
+        init_mysql()
+    except Exception:
+        # 不抛出异常，因为这不应该阻止应用启动
+        pass
 
-        # 构建查询条件
-        where_clause = f"metric_type='{metric_type}'"
-        if sensor_id:
-            where_clause += f" AND sensor_id='{sensor_id}'"
 
+def load_series_count(metric_type):
+    """从TDengine标签目录统计某指标类型的序列数（不扫描数据）"""
+    conn = get_taos_conn()
+    try:
         res = conn.query(
             f"""
-            SELECT AVG(value) as avg_value, MIN(value) as min_value, MAX(value) as max_value 
-            FROM sensor_data 
-            WHERE {where_clause} AND ts > NOW - {hours}h
+            SELECT COUNT(*) FROM information_schema.ins_tags
+            WHERE db_name='{TDENGINE_DB}' AND stable_name='sensor_data'
+            AND tag_name='metric_type' AND tag_value='{metric_type}'
             """
         )
+        rows = res.fetch_all()
+        return rows[0][0] if rows else 0
+    finally:
+        conn.close()
 
-        results = res.fetch_all()
-        if not results or results[0][0] is None:
-            return {
-                "result": None,
-                "count": 0,
-                "time_ms": f"{(time.time() - start_time)*1000:.2f}",
-            }
 
-        return {
-            "result": {
-                "avg": results[0][0],
-                "min": results[0][1],
-                "max": results[0][2],
-                "period": f"{hours}小时",
-            },
-            "count": len(results),
-            "time_ms": f"{(time.time() - start_time)*1000:.2f}",
-        }
+def get_series_count(metric_type):
+    count, _ = cached_or_stale(
+        ["catalog"],
+        f"series_count:{metric_type}",
+        CATALOG_CACHE_TTL,
+        lambda: load_series_count(metric_type),
+    )
+    return count
+
+
+def parse_sensor_ids(sensor_id, sensor_ids):
+    """合并 sensor_id 与 sensor_ids（可重复或逗号分隔），去重并校验"""
+    ids = []
+    for raw in ([sensor_id] if sensor_id else []) + (sensor_ids or []):
+        for item in raw.split(","):
+            item = item.strip()
+            if item and item not in ids:
+                validate_identifier(item, "传感器ID")
+                ids.append(item)
+    if len(ids) > MAX_AVG_SENSORS:
+        raise HTTPException(status_code=400, detail=f"一次最多查询 {MAX_AVG_SENSORS} 个传感器")
+    return ids
+
+
+@app.get("/api/avg/{metric_type}", dependencies=[Depends(client_slot)])
+def get_avg_metric(
+    metric_type: str,
+    hours: int = Query(24, ge=1, le=MAX_AVG_HOURS),
+    sensor_id: str = None,
+    sensor_ids: Optional[List[str]] = Query(None, description="传感器ID列表，可重复或逗号分隔"),
+    breakdown: bool = Query(False, description="按传感器分别返回"),
+):
+    """
+    查询最近N小时某类型传感器的平均值
+
+    不指定传感器时统计该类型的全部传感器。breakdown=true 时 result 为
+    每个传感器的 {sensor_id, avg, min, max, samples} 列表。
+    source 表示回答查询的数据源: memory/raw/rollup_1m/rollup_1h
+    """
+    validate_identifier(metric_type, "指标类型", MAX_METRIC_TYPE_LEN)
+    ids = parse_sensor_ids(sensor_id, sensor_ids)
+    start_time = time.time()
+
+    # 按 序列数 × 时间范围 估算成本，选择内存窗口、原始数据或降采样数据
+    series_count = len(ids) if ids else get_series_count(metric_type)
+    source, _ = choose_source(series_count, hours, memory_hours=rolling.windows.covered_hours())
+
+    if source == "memory":
+        result = rolling.windows.aggregate(metric_type, hours, ids or None, breakdown)
+    else:
+        result = query_avg(metric_type, hours, ids, breakdown, source)
+
+    if result is not None and not breakdown:
+        result["period"] = f"{hours}小时"
+    return {
+        "result": result or ([] if breakdown else None),
+        "count": len(result) if breakdown else (1 if result else 0),
+        "source": source,
+        "time_ms": f"{(time.time() - start_time)*1000:.2f}",
+    }
+
+
+def query_avg(metric_type, hours, ids, breakdown, source):
+    """从原始数据或降采样数据计算均值，返回格式同 RollingWindows.aggregate"""
+    # 构建查询条件
+    where_clause = f"metric_type='{metric_type}' AND ts > NOW - {hours}h"
+    if ids:
+        where_clause += " AND sensor_id IN ({})".format(", ".join(f"'{i}'" for i in ids))
+
+    if source == "raw":
+        table = "sensor_data"
+        columns = "AVG(value), MIN(value), MAX(value), COUNT(value)"
+    else:
+        # 降采样数据按样本数加权求平均
+        table = f"{rollup_db(TDENGINE_DB, source[len('rollup_'):])}.{ROLLUP_STABLE}"
+        columns = "SUM(avg_value * cnt) / SUM(cnt), MIN(min_value), MAX(max_value), SUM(cnt)"
+
+    if breakdown:
+        sql = f"SELECT sensor_id, {columns} FROM {table} WHERE {where_clause} PARTITION BY sensor_id"
+    else:
+        sql = f"SELECT {columns} FROM {table} WHERE {where_clause}"
+
+    conn = get_taos_conn()
+    try:
+        conn.execute(f"USE {TDENGINE_DB}")
+        rows = conn.query(sql).fetch_all()
     finally:
         conn.close()
 
-
-@app.get("/api/latest/{metric_type}")
-async def get_latest_metric(metric_type: str, limit: int = 10, sensor_id: str = None):
-    """获取最新的N条指定类型的传感器数据"""
+    if breakdown:
+        return [
+            {"sensor_id": row[0], "avg": row[1], "min": row[2], "max": row[3], "samples": row[4]}
+            for row in sorted(rows, key=lambda r: r[0])
+            if row[1] is not None
+        ]
+    if not rows or rows[0][0] is None:
+        return None
+    return {"avg": rows[0][0], "min": rows[0][1], "max": rows[0][2], "samples": rows[0][3]}
+
+
+@app.get("/api/latest/{metric_type}", dependencies=[Depends(client_slot)])
+def get_latest_metric(
+    metric_type: str,
+    limit: int = Query(10, ge=1, le=MAX_LATEST_LIMIT),
+    sensor_id: str = None,
+    before: Optional[str] = Query(
+        None, description="分页游标：上一页返回的 next_cursor，只返回排在它之后的数据"
+    ),
+):
+    """获取最新的N条指定类型的传感器数据
+
+    结果按 (ts, sensor_id) 倒序，深度翻页时将上一页返回的 next_cursor
+    作为 before 参数传入；同一时间戳的多个传感器不会因翻页而遗漏。
+    """
+    validate_identifier(metric_type, "指标类型", MAX_METRIC_TYPE_LEN)
+    validate_identifier(sensor_id, "传感器ID")
+    before_ts, before_sensor = parse_cursor(before)
     conn = get_taos_conn()
     start_time = time.time()
     try:
         conn.execute(f"USE {TDENGINE_DB}")
 
-        # 构建查询条件
+        # 构建查询条件，限制回溯时间避免在全部历史上排序
         where_clause = f"metric_type='{metric_type}'"
         if sensor_id:
             where_clause += f" AND sensor_id='{sensor_id}'"
+        if before_ts is not None:
+            if before_sensor is None:
+                where_clause += f" AND ts < {before_ts}"
+            else:
+                where_clause += (
+                    f" AND (ts < {before_ts}"
+                    f" OR (ts = {before_ts} AND sensor_id < '{before_sensor}'))"
+                )
+            where_clause += f" AND ts >= {before_ts - LATEST_LOOKBACK_HOURS * 3600 * 1000}"
+        else:
+            where_clause += f" AND ts > NOW - {LATEST_LOOKBACK_HOURS}h"
 
         res = conn.query(
             f"""
             SELECT ts, value, sensor_id
             FROM sensor_data 
             WHERE {where_clause}
-            ORDER BY ts DESC
+            ORDER BY ts DESC, sensor_id DESC
             LIMIT {limit}
             """
         )
@@ -290,20 +584,22 @@ async def get_latest_metric(metric_type: str, limit: int = 10, sensor_id: str =
                     result[col] = row[i]
             results.append(result)
 
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = f"{round(rows[-1][0].timestamp() * 1000)}:{rows[-1][2]}"
+
         return {
             "result": results,
             "count": len(results),
+            "next_cursor": next_cursor,
             "time_ms": f"{(time.time() - start_time)*1000:.2f}",
         }
     finally:
         conn.close()
 
 
-@app.get("/api/sensors")
-async def get_sensor_list():
-    """获取系统中所有的传感器列表，从MySQL获取详细信息"""
-    start_time = time.time()
-
+def load_sensor_list():
+    """从TDengine获取活跃传感器ID，并从MySQL补充详细信息"""
     # 从TDengine获取活跃传感器ID
     tdengine_conn = get_taos_conn()
     try:
@@ -338,37 +634,59 @@ async def get_sensor_list():
             else:
                 sensors_info = []
 
-            # 如果有活跃传感器但在MySQL中没有记录，则补充基本信息
-            result_dict = {item["id"]: item for item in sensors_info}
-
-            for sensor_id in active_sensor_ids:
-                if sensor_id not in result_dict:
-                    result_dict[sensor_id] = {
-                        "id": sensor_id,
-                        "name": f"未命名传感器 {sensor_id}",
-                        "location": "未指定",
-                        "type": "未知",
-                        "model": "未知",
-                        "status": "active",
-                    }
+        # 如果有活跃传感器但在MySQL中没有记录，则补充基本信息
+        result_dict = {item["id"]: item for item in sensors_info}
+
+        for sensor_id in active_sensor_ids:
+            if sensor_id not in result_dict:
+                result_dict[sensor_id] = {
+                    "id": sensor_id,
+                    "name": f"未命名传感器 {sensor_id}",
+                    "location": "未指定",
+                    "type": "未知",
+                    "model": "未知",
+                    "status": "active",
+                }
+
+        # 转换为列表
+        return list(result_dict.values())
+    finally:
+        mysql_conn.close()
 
-            # 转换为列表
-            final_results = list(result_dict.values())
 
-        return {
-            "result": final_results,
-            "count": len(final_results),
+@app.get(
+    "/api/sensors",
+    dependencies=[
+        Depends(cache_validators(["catalog", "sensors"], "sensor_list", CATALOG_CACHE_TTL)),
+        Depends(client_slot),
+    ],
+)
+def get_sensor_list(
+    response: Response,
+    limit: int = Query(MAX_LIST_LIMIT, ge=1, le=MAX_LIST_LIMIT),
+    offset: int = Query(0, ge=0),
+):
+    """获取系统中所有的传感器列表，从MySQL获取详细信息"""
+    start_time = time.time()
+    final_results, stale = cached_or_stale(
+        ["catalog", "sensors"], "sensor_list", CATALOG_CACHE_TTL, load_sensor_list
+    )
+    page = final_results[offset : offset + limit]
+    return with_stale(
+        response,
+        stale,
+        {
+            "result": page,
+            "count": len(page),
+            "total": len(final_results),
             "time_ms": f"{(time.time() - start_time)*1000:.2f}",
-        }
-    finally:
-        mysql_conn.close()
+        },
+    )
 
 
-@app.get("/api/metrics")
-async def get_metrics_list():
-    """获取系统中所有的指标类型列表"""
+def load_metric_types():
+    """从TDengine获取所有指标类型"""
     conn = get_taos_conn()
-    start_time = time.time()
     try:
         conn.execute(f"USE {TDENGINE_DB}")
         res = conn.query(
@@ -377,20 +695,46 @@ async def get_metrics_list():
             FROM sensor_data
             """
         )
-        metrics = [row[0] for row in res.fetch_all()]
-        return {
-            "result": metrics,
-            "count": len(metrics),
-            "time_ms": f"{(time.time() - start_time)*1000:.2f}",
-        }
+        return [row[0] for row in res.fetch_all()]
     finally:
         conn.close()
 
 
+@app.get(
+    "/api/metrics",
+    dependencies=[
+        Depends(cache_validators(["catalog"], "metric_types", CATALOG_CACHE_TTL)),
+        Depends(client_slot),
+    ],
+)
+def get_metrics_list(
+    response: Response,
+    limit: int = Query(MAX_LIST_LIMIT, ge=1, le=MAX_LIST_LIMIT),
+    offset: int = Query(0, ge=0),
+):
+    """获取系统中所有的指标类型列表"""
+    start_time = time.time()
+    metrics, stale = cached_or_stale(
+        ["catalog"], "metric_types", CATALOG_CACHE_TTL, load_metric_types
+    )
+    page = metrics[offset : offset + limit]
+    return with_stale(
+        response,
+        stale,
+        {
+            "result": page,
+            "count": len(page),
+            "total": len(metrics),
+            "time_ms": f"{(time.time() - start_time)*1000:.2f}",
+        },
+    )
+
+
 # 新增 MySQL 相关API
-@app.get("/api/sensor/{sensor_id}")
-async def get_sensor_info(sensor_id: str):
+@app.get("/api/sensor/{sensor_id}", dependencies=[Depends(client_slot)])
+def get_sensor_info(sensor_id: str):
     """获取指定传感器的详细信息"""
+    validate_identifier(sensor_id, "传感器ID")
     start_time = time.time()
     mysql_conn = get_mysql_conn()
 
@@ -400,7 +744,7 @@ async def get_sensor_info(sensor_id: str):
                 """
                 SELECT id, name, location, type, model, description, 
                        DATE_FORMAT(installation_date, '%Y-%m-%d') as installation_date, 
-                       status
+                       status, report_interval
                 FROM sensors 
                 WHERE id = %s
                 """,
@@ -410,7 +754,15 @@ async def get_sensor_info(sensor_id: str):
 
         # 获取最新的传感器数据（如果有）
         if result:
-            tdengine_conn = get_taos_conn()
+            try:
+                tdengine_conn = get_taos_conn()
+            except BackendUnavailable as e:
+                logger.warning(f"获取传感器{sensor_id}最新数据失败: {str(e)}")
+                result["latest_data"] = []
+                return {
+                    "result": result,
+                    "time_ms": f"{(time.time() - start_time)*1000:.2f}",
+                }
             try:
                 tdengine_conn.execute(f"USE {TDENGINE_DB}")
                 latest_data_res = tdengine_conn.query(
@@ -456,8 +808,9 @@ async def get_sensor_info(sensor_id: str):
 
 
 @app.post("/api/sensor")
-async def create_or_update_sensor(sensor: SensorInfo):
+def create_or_update_sensor(sensor: SensorInfo):
     """创建或更新传感器信息"""
+    validate_identifier(sensor.id, "传感器ID")
     start_time = time.time()
     mysql_conn = get_mysql_conn()
 
@@ -473,7 +826,8 @@ async def create_or_update_sensor(sensor: SensorInfo):
                     """
                     UPDATE sensors 
                     SET name = %s, location = %s, type = %s, model = %s, 
-                        description = %s, installation_date = %s, status = %s
+                        description = %s, installation_date = %s, status = %s,
+                        report_interval = %s
                     WHERE id = %s
                     """,
                     (
@@ -484,6 +838,7 @@ async def create_or_update_sensor(sensor: SensorInfo):
                         sensor.description,
                         sensor.installation_date,
                         sensor.status,
+                        sensor.report_interval,
                         sensor.id,
                     ),
                 )
@@ -493,8 +848,9 @@ async def create_or_update_sensor(sensor: SensorInfo):
                 cursor.execute(
                     """
                     INSERT INTO sensors 
-                    (id, name, location, type, model, description, installation_date, status)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    (id, name, location, type, model, description, installation_date, status,
+                     report_interval)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
                     """,
                     (
                         sensor.id,
@@ -505,18 +861,16 @@ async def create_or_update_sensor(sensor: SensorInfo):
                         sensor.description,
                         sensor.installation_date,
                         sensor.status,
+                        sensor.report_interval,
                     ),
                 )
                 message = "传感器信息已创建"
 
             mysql_conn.commit()
-
-        return {
-            "status": "success",
-            "message": message,
-            "sensor_id": sensor.id,
-            "time_ms": f"{(time.time() - start_time)*1000:.2f}ms",
-        }
+    except BackendUnavailable:
+        # 熔断或过载：由 BackendUnavailable 处理器返回503
+        mysql_conn.rollback()
+        raise
     except Exception as e:
         mysql_conn.rollback()
         logger.error(f"保存传感器信息出错: {str(e)}")
@@ -524,13 +878,90 @@ async def create_or_update_sensor(sensor: SensorInfo):
     finally:
         mysql_conn.close()
 
+    # 通知所有worker传感器信息已变化（已提交，Redis不可用时不影响结果）
+    try_bump_version("sensors")
 
-@app.get("/api/locations")
-async def get_locations():
-    """获取所有位置信息"""
+    return {
+        "status": "success",
+        "message": message,
+        "sensor_id": sensor.id,
+        "time_ms": f"{(time.time() - start_time)*1000:.2f}ms",
+    }
+
+
+@app.post("/api/sensors/bulk")
+async def bulk_upsert_sensors(request: Request):
+    """
+    批量创建或更新传感器信息及阈值
+
+    请求体为JSON数组（Content-Type: application/json）或CSV（text/csv）。
+    每行单独校验并返回结果，出错的行不影响其他行；整批只使缓存失效一次。
+    """
     start_time = time.time()
-    mysql_conn = get_mysql_conn()
+    try:
+        rows = parse_body(await request.body(), request.headers.get("content-type"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(
+            status_code=413, detail=f"单次最多导入{BULK_MAX_ROWS}行，请分批提交"
+        )
+
+    results = []
+    valid = []
+    for row_number, row in enumerate(rows, start=1):
+        try:
+            item = SensorImport.model_validate(row)
+        except ValidationError as e:
+            error = "; ".join(
+                f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+            )
+            sensor_id = row.get("id") if isinstance(row, dict) else None
+            results.append(
+                {"row": row_number, "sensor_id": sensor_id, "status": "error", "error": error}
+            )
+            continue
+        error = check_identifiers(item)
+        if error:
+            results.append(
+                {"row": row_number, "sensor_id": item.id, "status": "error", "error": error}
+            )
+            continue
+        valid.append((row_number, item))
+
+    if valid:
+        mysql_conn = await asyncio.to_thread(get_mysql_conn)
+        try:
+            results += await asyncio.to_thread(
+                upsert_sensors, mysql_conn, valid, BULK_CHUNK_SIZE
+            )
+        finally:
+            mysql_conn.close()
+    results.sort(key=lambda r: r["row"])
+
+    summary = {"created": 0, "updated": 0, "error": 0}
+    for r in results:
+        summary[r["status"]] += 1
+    # 整批只通知一次（已提交，Redis不可用时不影响结果）
+    if summary["created"] or summary["updated"]:
+        await asyncio.to_thread(try_bump_version, "sensors")
 
+    return {
+        "status": (
+            "success"
+            if not summary["error"]
+            else "partial" if summary["created"] or summary["updated"] else "failed"
+        ),
+        "summary": summary,
+        "result": results,
+        "count": len(results),
+        "time_ms": f"{(time.time() - start_time)*1000:.2f}",
+    }
+
+
+def load_locations():
+    """从MySQL获取所有位置信息"""
+    mysql_conn = get_mysql_conn()
     try:
         with mysql_conn.cursor() as cursor:
             cursor.execute(
@@ -540,15 +971,64 @@ async def get_locations():
                 ORDER BY name
                 """
             )
-            locations = cursor.fetchall()
+            return cursor.fetchall()
+    finally:
+        mysql_conn.close()
 
-        return {
+
+@app.get(
+    "/api/locations",
+    dependencies=[
+        Depends(cache_validators(["locations"], "locations", METADATA_CACHE_TTL))
+    ],
+)
+def get_locations(response: Response):
+    """获取所有位置信息"""
+    start_time = time.time()
+    locations, stale = cached_or_stale(
+        ["locations"], "locations", METADATA_CACHE_TTL, load_locations
+    )
+    return with_stale(
+        response,
+        stale,
+        {
             "result": locations,
             "count": len(locations),
             "time_ms": f"{(time.time() - start_time)*1000:.2f}",
-        }
-    finally:
-        mysql_conn.close()
+        },
+    )
+
+
+@app.get("/healthz")
+async def healthz():
+    """存活检查：进程可以响应请求即返回正常"""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """就绪检查：所有后端初始化完成后才返回正常"""
+    components = {}
+    for name, task in getattr(app.state, "startup_tasks", {}).items():
+        if not task.done():
+            components[name] = "starting"
+        elif task.cancelled() or task.exception() is not None:
+            components[name] = "failed"
+        else:
+            components[name] = "ready"
+    ready = bool(components) and all(v == "ready" for v in components.values())
+    # 熔断状态只用于展示，不影响就绪判断（熔断期间仍可返回缓存数据）
+    backends = {
+        backend.name: backend.breaker.state for backend in (resilience.tdengine, resilience.mysql)
+    }
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "components": components,
+            "backends": backends,
+        },
+    )
 
 
 @app.get("/")
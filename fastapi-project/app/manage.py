@@ -0,0 +1,154 @@
+"""
+运维管理命令
+
+用法:
+    python manage.py show-retention
+    python manage.py migrate-retention [--fill-history] [--apply-keep] [--recreate-streams] [--dry-run]
+    python manage.py backfill FILE [FILE ...] [--workers 4] [--batch-rows 10000]
+                              [--checkpoint backfill.checkpoint.json] [--topic T] [--dry-run]
+"""
+import argparse
+import logging
+import sys
+
+from clients import get_taos_conn
+from config import TDENGINE_DB
+from retention import (
+    alter_statements,
+    drop_stream_statements,
+    rollup_statements,
+    rollup_db,
+    ROLLUP_TIERS,
+    RAW_KEEP_DAYS,
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger("manage")
+
+
+def show_retention(args):
+    """显示原始数据库和降采样数据库当前的保留配置"""
+    names = [TDENGINE_DB] + [rollup_db(TDENGINE_DB, tier) for tier in ROLLUP_TIERS]
+    name_list = "', '".join(names)
+    conn = get_taos_conn(database=None)
+    try:
+        res = conn.query(
+            f"""
+            SELECT name, `keep`, `duration`, cachemodel, `comp`
+            FROM information_schema.ins_databases
+            WHERE name IN ('{name_list}')
+            """
+        )
+        for row in res.fetch_all():
+            print(f"{row[0]:<24} keep={row[1]} duration={row[2]} cachemodel={row[3]} comp={row[4]}")
+    finally:
+        conn.close()
+    return 0
+
+
+def migrate_retention(args):
+    """
+    将已有数据库迁移到分层保留配置
+
+    先创建降采样库和流计算（--fill-history 时先处理已有历史数据），
+    再调整原始库的 CACHEMODEL；缩短原始数据的 KEEP 会删除过期数据，
+    需确认降采样已完成后加 --apply-keep 执行。
+
+    --recreate-streams 先删除已有的流计算再按当前选项重建（例如旧版本
+    创建的流不处理迟到数据），配合 --fill-history 重新计算已有的窗口。
+    """
+    statements = []
+    if args.recreate_streams:
+        statements += drop_stream_statements(TDENGINE_DB)
+    statements += rollup_statements(TDENGINE_DB, fill_history=args.fill_history)
+    statements += alter_statements(TDENGINE_DB, apply_keep=args.apply_keep)
+
+    if args.dry_run:
+        for sql in statements:
+            print(" ".join(sql.split()) + ";")
+        return 0
+
+    conn = get_taos_conn(database=None)
+    try:
+        for sql in statements:
+            logger.info(f"执行: {' '.join(sql.split())}")
+            conn.execute(sql)
+    finally:
+        conn.close()
+
+    if not args.apply_keep:
+        logger.info(
+            f"原始数据的 KEEP 未修改；降采样完成后执行 "
+            f"migrate-retention --apply-keep 将其设为 {RAW_KEEP_DAYS} 天"
+        )
+    logger.info("保留配置迁移完成")
+    return 0
+
+
+def backfill(args):
+    """回放历史数据文件，中断后重新执行同一命令从检查点继续"""
+    from backfill import Backfill
+
+    runner = Backfill(
+        workers=args.workers,
+        batch_rows=args.batch_rows,
+        checkpoint=None if args.no_checkpoint else args.checkpoint,
+        topic=args.topic,
+        dry_run=args.dry_run,
+    )
+    stats = runner.run(args.files)
+    logger.info(
+        f"回放完成: 读取 {stats['read']} 条，写入 {stats['written']} 条，"
+        f"无效 {stats['invalid']} 条，跳过(已完成) {stats['skipped']} 条，"
+        f"新序列 {stats['new_series']} 个，耗时 {stats['seconds']}s，"
+        f"{stats['rows_per_min']} 行/分钟"
+    )
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="智能农场数据平台管理命令")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    show = subparsers.add_parser("show-retention", help="显示数据保留配置")
+    show.set_defaults(func=show_retention)
+
+    migrate = subparsers.add_parser("migrate-retention", help="迁移到分层保留配置")
+    migrate.add_argument(
+        "--fill-history", action="store_true", help="降采样流先处理已有的历史数据"
+    )
+    migrate.add_argument(
+        "--apply-keep", action="store_true", help="修改原始数据的KEEP（会删除过期数据）"
+    )
+    migrate.add_argument(
+        "--recreate-streams", action="store_true", help="删除并按当前选项重建降采样流"
+    )
+    migrate.add_argument("--dry-run", action="store_true", help="只打印SQL，不执行")
+    migrate.set_defaults(func=migrate_retention)
+
+    fill = subparsers.add_parser(
+        "backfill", help="导入历史数据文件（CSV/JSON/JSON Lines），不触发分析任务"
+    )
+    fill.add_argument("files", nargs="+", help="数据文件，按扩展名识别格式")
+    fill.add_argument("--workers", type=int, default=4, help="并行写入线程数")
+    fill.add_argument("--batch-rows", type=int, default=10000, help="每批写入的行数")
+    fill.add_argument(
+        "--checkpoint", default="backfill.checkpoint.json", help="检查点文件路径"
+    )
+    fill.add_argument("--no-checkpoint", action="store_true", help="不记录进度")
+    fill.add_argument(
+        "--topic", help="记录中没有topic字段时使用的主题，如 farm/sensors/dtu001"
+    )
+    fill.add_argument("--dry-run", action="store_true", help="只解析和校验，不写入")
+    fill.set_defaults(func=backfill)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# MQTT入库统计
+INGEST_MESSAGES = Counter(
+    "farm_ingest_messages_total",
+    "MQTT消息处理结果计数",
+    ["result"],
+)
+INGEST_DUPLICATES = Counter(
+    "farm_ingest_duplicates_total",
+    "被去重抑制的重复消息数",
+)
+INGEST_LATE = Counter(
+    "farm_ingest_late_total",
+    "乱序/迟到消息数",
+    ["action"],
+)
+INGEST_LATENCY = Histogram(
+    "farm_ingest_seconds",
+    "单条MQTT消息的处理耗时",
+)
+INGEST_POLICY_SUPPRESSED = Counter(
+    "farm_ingest_policy_suppressed_total",
+    "被入库策略(deadband/window)合并、未单独写入的读数",
+    ["policy"],
+)
+
+# 后端熔断与并发限制（多进程部署时取各进程的最大/最小值）
+BACKEND_STATE = Gauge(
+    "farm_backend_breaker_state",
+    "后端熔断器状态: 0关闭 1半开 2打开",
+    ["backend"],
+    multiprocess_mode="max",
+)
+BACKEND_CONCURRENCY_LIMIT = Gauge(
+    "farm_backend_concurrency_limit",
+    "后端当前的自适应并发上限",
+    ["backend"],
+    multiprocess_mode="min",
+)
+BACKEND_REJECTED = Counter(
+    "farm_backend_rejected_total",
+    "因熔断(open)或过载(overload)被直接拒绝的后端调用",
+    ["backend", "reason"],
+)
+INGEST_SPOOLED = Counter(
+    "farm_ingest_spooled_total",
+    "TDengine不可用时写入本地缓冲/从缓冲回放/因缓冲已满丢弃的记录数",
+    ["action"],
+)
@@ -2,11 +2,31 @@ import paho.mqtt.client as mqtt
 import json
 import logging
 import time
-import taos
+import pymysql
 import os
-
-# 引入配置常量
-from main import TDENGINE_HOST, TDENGINE_USER, TDENGINE_PASS, TDENGINE_DB, celery
+import threading
+
+# 引入配置常量（不导入main，入库进程不需要加载FastAPI和SQLAlchemy）
+from config import TDENGINE_DB
+from clients import get_taos_conn, get_mysql_conn, get_celery
+from liveness import LivenessTracker
+from dedup import IngestDeduplicator, DUPLICATE, LATE, TOO_LATE
+from metrics import (
+    INGEST_MESSAGES,
+    INGEST_DUPLICATES,
+    INGEST_LATE,
+    INGEST_LATENCY,
+    INGEST_POLICY_SUPPRESSED,
+)
+from series_registry import SeriesRegistry, escape_tag, safe_table_name
+from ingest_policy import IngestPolicies, RAW, WINDOW
+from tracing import init_tracing, span, set_attributes, inject_headers
+from readings import parse_reading, InvalidReading
+from cache import bump_version
+import rolling
+from resilience import is_backend_failure
+import resilience
+from spool import Spool
 
 # 配置日志
 logging.basicConfig(
@@ -22,22 +42,423 @@ MQTT_PASSWORD = os.environ.get("MQTT_PASSWORD", "secure_password")
 MQTT_BROKER = os.environ.get("MQTT_HOST", "mosquitto")
 MQTT_PORT = int(os.environ.get("MQTT_PORT", "1883"))
 MQTT_TOPIC = "farm/sensors/#"  # 订阅所有传感器数据的主题
-MQTT_CLIENT_ID = f"farm-server-{int(time.time())}"  # 唯一的客户端ID
+MQTT_CLIENT_ID = f"farm-server-{int(time.time())}-{os.getpid()}"  # 唯一的客户端ID
 MQTT_QOS = 1  # QoS等级1，确保消息至少被传递一次
 
+# 离线检测配置
+# 传感器未配置report_interval时使用的默认上报间隔(秒)
+OFFLINE_DEFAULT_INTERVAL = int(os.environ.get("OFFLINE_DEFAULT_INTERVAL", "300"))
+# 超过 上报间隔*倍数 未收到数据即判定离线
+OFFLINE_GRACE_FACTOR = float(os.environ.get("OFFLINE_GRACE_FACTOR", "3"))
+# 重新加载传感器上报间隔的周期(秒)
+OFFLINE_REFRESH_INTERVAL = int(os.environ.get("OFFLINE_REFRESH_INTERVAL", "300"))
+# 启动时只预加载最近N小时内上报过的序列
+OFFLINE_SEED_HOURS = int(os.environ.get("OFFLINE_SEED_HOURS", "24"))
+
+
+# 去重与乱序处理配置
+# 去重表最多保存的消息哈希数量
+DEDUP_MAX_ENTRIES = int(os.environ.get("DEDUP_MAX_ENTRIES", "200000"))
+# 不带时间戳的消息匹配Broker重发的时间窗口(秒)
+DEDUP_NO_TS_WINDOW = float(os.environ.get("DEDUP_NO_TS_WINDOW", "300"))
+# 乱序数据处理策略：accept(入库并分析)、store(只入库)、drop(丢弃)
+LATE_POLICY = os.environ.get("LATE_POLICY", "store")
+# 超过该乱序时间(毫秒)的数据直接丢弃，0表示不限制
+LATE_TOLERANCE_MS = int(os.environ.get("LATE_TOLERANCE_MS", str(24 * 3600 * 1000)))
+
+dedup = IngestDeduplicator(
+    max_entries=DEDUP_MAX_ENTRIES,
+    no_ts_window=DEDUP_NO_TS_WINDOW,
+    late_policy=LATE_POLICY,
+    late_tolerance_ms=LATE_TOLERANCE_MS,
+)
+
+
+# 序列子表注册表，新序列建表后通知API刷新目录缓存
+registry = SeriesRegistry(on_new_series=lambda *args: bump_version("catalog"))
+
+
+def preload_registry():
+    """启动时从TDengine标签目录加载已有的子表；失败时跳过，新序列第一次写入时再建表"""
+    try:
+        conn = get_taos_conn()
+        try:
+            registry.preload(conn, TDENGINE_DB)
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.warning(f"预加载序列子表失败: {str(e)}")
+
+
+# 入库策略配置
+# 重新加载 ingest_policies 表的周期(秒)
+INGEST_POLICY_REFRESH = int(os.environ.get("INGEST_POLICY_REFRESH", "60"))
+# 窗口结束后再等待多久(毫秒)才关闭窗口，容纳轻微乱序的数据
+INGEST_WINDOW_GRACE_MS = int(os.environ.get("INGEST_WINDOW_GRACE_MS", "2000"))
+
+
+def load_ingest_policies():
+    """从MySQL加载入库策略"""
+    mysql_conn = get_mysql_conn()
+    try:
+        with mysql_conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT metric_type, sensor_id, policy, deadband, max_silence, window_seconds
+                FROM ingest_policies
+                """
+            )
+            return cursor.fetchall()
+    finally:
+        mysql_conn.close()
+
+
+policies = IngestPolicies(load_ingest_policies)
+
+
+# 本地缓冲配置：TDengine不可用时写入的记录暂存到本地文件，恢复后回放
+INGEST_SPOOL_DIR = os.environ.get("INGEST_SPOOL_DIR", "spool")
+INGEST_SPOOL_MAX_MB = int(os.environ.get("INGEST_SPOOL_MAX_MB", "512"))
+# 多个入库实例共用缓冲目录时各自设置不同的序号
+INGEST_INDEX = os.environ.get("INGEST_INDEX", "0")
+
+spool = Spool(
+    os.path.join(INGEST_SPOOL_DIR, f"ingest-{INGEST_INDEX}.jsonl"),
+    INGEST_SPOOL_MAX_MB * 1024 * 1024,
+)
+
+
+def spool_outputs(sensor_id, metric_type, records, received_at):
+    """
+    写入本地缓冲；不带时间戳的读数按接收时间保存，回放时不会变成回放时刻
+
+    缓冲已满时返回False
+    """
+    for record in records:
+        if record[0] == RAW and not record[1]:
+            record = (RAW, int(received_at * 1000), record[2])
+        if not spool.append(sensor_id, metric_type, record):
+            return False
+    return True
+
+
+def write_reading(conn, sensor_id, metric_type, ts_value, value):
+    """写入一条读数，子表被外部删除时重新建表后重试一次"""
+    table = registry.resolve(conn, sensor_id, metric_type)
+    try:
+        conn.execute(f"INSERT INTO {table} VALUES ({ts_value}, {value})")
+    except Exception as e:
+        if is_backend_failure(e):
+            raise
+        registry.forget(sensor_id, metric_type)
+        table = registry.resolve(conn, sensor_id, metric_type)
+        conn.execute(f"INSERT INTO {table} VALUES ({ts_value}, {value})")
+
+
+def write_aggregate(conn, sensor_id, metric_type, record):
+    """
+    写入一个已关闭的聚合窗口
+
+    均值写入 sensor_data，现有查询、降采样流和报表无需改动；
+    完整的 avg/min/max/count 写入 sensor_data_agg。
+    """
+    _, start, avg, low, high, count = record
+    write_reading(conn, sensor_id, metric_type, start, avg)
+    table = "a" + safe_table_name(sensor_id, metric_type)[1:]
+    conn.execute(
+        f"INSERT INTO {table} USING sensor_data_agg "
+        f"TAGS ('{escape_tag(sensor_id)}', '{escape_tag(metric_type)}') "
+        f"VALUES ({start}, {avg}, {low}, {high}, {count})"
+    )
+
 
-# 初始化TDengine连接
-def get_taos_conn():
-    return taos.connect(
-        host=TDENGINE_HOST,
-        user=TDENGINE_USER,
-        password=TDENGINE_PASS,
-        database=TDENGINE_DB,
+def write_output(conn, sensor_id, metric_type, record):
+    """
+    按入库策略的输出写入，返回写入 sensor_data 的 (时间戳, 值)
+
+    写入成功后计入进程内滚动窗口，内存数据与 sensor_data 保持一致
+    （API在同一进程时供 /api/avg 回答短时间窗口，未启用时为空操作）。
+    """
+    if record[0] == WINDOW:
+        write_aggregate(conn, sensor_id, metric_type, record)
+        ts, value = record[1], record[2]
+    else:
+        # 拼接到SQL中：时间戳必须是整数毫秒（parse_reading 已规范化，
+        # 缓冲文件中的记录在这里再检查一次），不合法时抛出 ValueError
+        _, ts, value = record
+        write_reading(conn, sensor_id, metric_type, int(ts) if ts else "NOW", float(value))
+    rolling.windows.add(sensor_id, metric_type, ts, value)
+    return ts, value
+
+
+def flush_windows(closed):
+    """写入已关闭的聚合窗口，并为窗口均值触发分析；TDengine不可用时写入本地缓冲"""
+    if not closed:
+        return
+    try:
+        conn = get_taos_conn()
+    except Exception as e:
+        if not is_backend_failure(e):
+            raise
+        logger.warning(f"TDengine不可用，{len(closed)}个聚合窗口写入本地缓冲: {str(e)}")
+        for (sensor_id, metric_type), record in closed:
+            spool_outputs(sensor_id, metric_type, [record], time.time())
+        return
+    try:
+        for (sensor_id, metric_type), record in closed:
+            try:
+                ts, value = write_output(conn, sensor_id, metric_type, record)
+            except Exception as e:
+                if is_backend_failure(e) and spool_outputs(
+                    sensor_id, metric_type, [record], time.time()
+                ):
+                    logger.warning(f"聚合窗口写入本地缓冲: {sensor_id}.{metric_type}: {str(e)}")
+                else:
+                    logger.warning(f"写入聚合窗口失败: {sensor_id}.{metric_type}: {str(e)}")
+                continue
+            get_celery().send_task(
+                "analyze_data",
+                args=[
+                    {
+                        "sensor_id": sensor_id,
+                        "metric_type": metric_type,
+                        "value": value,
+                        "timestamp": ts,
+                    }
+                ],
+                headers=inject_headers(),
+            )
+    finally:
+        conn.close()
+
+
+_policy_stop = threading.Event()
+_policy_thread = None
+
+
+def _policy_loop():
+    """定期关闭到期的聚合窗口，并重新加载入库策略"""
+    last_refresh = time.monotonic()
+    while not _policy_stop.wait(1):
+        try:
+            flush_windows(policies.flush_due(grace_ms=INGEST_WINDOW_GRACE_MS))
+        except Exception as e:
+            logger.warning(f"关闭聚合窗口失败: {str(e)}")
+        if time.monotonic() - last_refresh >= INGEST_POLICY_REFRESH:
+            last_refresh = time.monotonic()
+            try:
+                policies.load()
+            except Exception as e:
+                logger.warning(f"重新加载入库策略失败: {str(e)}")
+
+
+def start_policies():
+    """启动窗口关闭线程；MQTT连接失败重试时会再次调用，已在运行则不重复启动"""
+    global _policy_thread
+    if _policy_thread is not None and _policy_thread.is_alive():
+        return
+    try:
+        policies.load()
+    except Exception as e:
+        logger.warning(f"加载入库策略失败，全部原样存储: {str(e)}")
+    _policy_stop.clear()
+    _policy_thread = threading.Thread(
+        target=_policy_loop, name="ingest-policy", daemon=True
     )
+    _policy_thread.start()
+
+
+_spool_stop = threading.Event()
+_spool_thread = None
+
+
+def replay_spool():
+    """回放本地缓冲；后端再次不可用时停止，反复写入失败的记录由 Spool 隔离"""
+    conn = get_taos_conn()
+
+    def write(sensor_id, metric_type, record):
+        write_output(conn, sensor_id, metric_type, record)
+
+    try:
+        return spool.replay(write)
+    finally:
+        conn.close()
+
+
+def _spool_loop():
+    """TDengine熔断器未打开时回放本地缓冲（回放不触发分析任务）"""
+    while not _spool_stop.wait(5):
+        if not spool.pending() or not resilience.tdengine.available():
+            continue
+        try:
+            replay_spool()
+        except Exception as e:
+            logger.warning(f"回放本地缓冲中断，稍后重试: {str(e)}")
+
+
+def start_spool():
+    global _spool_thread
+    if _spool_thread is not None and _spool_thread.is_alive():
+        return
+    _spool_stop.clear()
+    _spool_thread = threading.Thread(target=_spool_loop, name="ingest-spool", daemon=True)
+    _spool_thread.start()
+
+
+def stop_spool():
+    _spool_stop.set()
+    if _spool_thread is not None:
+        _spool_thread.join(timeout=5)
+
+
+def stop_policies():
+    """停止时写入尚未关闭的窗口，避免丢失最后一个窗口的数据"""
+    _policy_stop.set()
+    if _policy_thread is not None:
+        _policy_thread.join(timeout=5)
+    try:
+        flush_windows(policies.flush_all())
+    except Exception as e:
+        logger.warning(f"写入剩余聚合窗口失败: {str(e)}")
+
+
+# 传感器期望上报间隔，来自MySQL sensors.report_interval
+_report_intervals = {}
+
+
+def get_report_interval(sensor_id):
+    return _report_intervals.get(sensor_id) or OFFLINE_DEFAULT_INTERVAL
+
+
+def load_report_intervals():
+    """从MySQL加载传感器的期望上报间隔"""
+    global _report_intervals
+    mysql_conn = get_mysql_conn()
+    try:
+        with mysql_conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT id, report_interval FROM sensors WHERE report_interval > 0"
+            )
+            _report_intervals = {
+                row["id"]: row["report_interval"] for row in cursor.fetchall()
+            }
+    finally:
+        mysql_conn.close()
+
+
+def raise_offline_alert(sensor_id, metric_type, last_value, interval):
+    """写入离线告警"""
+    logger.warning(f"传感器离线: {sensor_id}.{metric_type}, 期望上报间隔: {interval}s")
+    mysql_conn = get_mysql_conn()
+    try:
+        with mysql_conn.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO alerts
+                (sensor_id, metric_type, value, threshold_value, alert_type, severity, message)
+                VALUES (%s, %s, %s, %s, 'offline', 'warning', %s)
+                """,
+                (
+                    sensor_id,
+                    metric_type,
+                    last_value if last_value is not None else 0,
+                    interval,
+                    f"超过{interval * OFFLINE_GRACE_FACTOR:.0f}秒未收到数据",
+                ),
+            )
+        mysql_conn.commit()
+    except pymysql.err.IntegrityError:
+        # 未在sensors表登记的传感器无法写入告警
+        logger.warning(f"传感器 {sensor_id} 未登记，跳过离线告警")
+    finally:
+        mysql_conn.close()
+
+
+def resolve_offline_alert(sensor_id, metric_type, value):
+    """传感器恢复上报时关闭离线告警"""
+    logger.info(f"传感器恢复上报: {sensor_id}.{metric_type}")
+    mysql_conn = get_mysql_conn()
+    try:
+        with mysql_conn.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE alerts SET status = 'resolved', resolved_at = NOW()
+                WHERE sensor_id = %s AND metric_type = %s
+                AND alert_type = 'offline' AND status != 'resolved'
+                """,
+                (sensor_id, metric_type),
+            )
+        mysql_conn.commit()
+    finally:
+        mysql_conn.close()
+
+
+liveness = LivenessTracker(
+    get_report_interval,
+    raise_offline_alert,
+    resolve_offline_alert,
+    grace_factor=OFFLINE_GRACE_FACTOR,
+    refresh=load_report_intervals,
+    refresh_interval=OFFLINE_REFRESH_INTERVAL,
+)
+
+
+def seed_liveness():
+    """启动时预加载序列状态，只在启动时查询一次"""
+    try:
+        load_report_intervals()
+    except Exception as e:
+        logger.warning(f"加载传感器上报间隔失败: {str(e)}")
+
+    offline = set()
+    try:
+        mysql_conn = get_mysql_conn()
+        try:
+            with mysql_conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT DISTINCT sensor_id, metric_type FROM alerts
+                    WHERE alert_type = 'offline' AND status != 'resolved'
+                    """
+                )
+                for row in cursor.fetchall():
+                    offline.add((row["sensor_id"], row["metric_type"]))
+                    liveness.seed(row["sensor_id"], row["metric_type"], offline=True)
+        finally:
+            mysql_conn.close()
+    except Exception as e:
+        logger.warning(f"加载离线告警失败: {str(e)}")
+
+    try:
+        conn = get_taos_conn()
+        try:
+            res = conn.query(
+                f"""
+                SELECT sensor_id, metric_type, LAST(ts), LAST(value)
+                FROM sensor_data
+                WHERE ts > NOW - {OFFLINE_SEED_HOURS}h
+                PARTITION BY sensor_id, metric_type
+                """
+            )
+            count = 0
+            for sensor_id, metric_type, last_ts, last_value in res.fetch_all():
+                if (sensor_id, metric_type) not in offline:
+                    liveness.seed(sensor_id, metric_type, last_ts.timestamp(), last_value)
+                    count += 1
+        finally:
+            conn.close()
+        logger.info(f"已预加载 {count} 个序列的最后上报时间")
+    except Exception as e:
+        logger.warning(f"预加载序列最后上报时间失败: {str(e)}")
 
 
 # 处理收到的MQTT消息
 def on_message(client, userdata, msg):
+    with span("mqtt.message", {"messaging.destination": msg.topic}):
+        handle_message(msg)
+
+
+def handle_message(msg):
     try:
         start_time = time.time()
 
@@ -52,73 +473,113 @@ def on_message(client, userdata, msg):
             data = json.loads(payload)
         except json.JSONDecodeError:
             logger.error(f"无效的JSON数据: {payload}")
+            INGEST_MESSAGES.labels(result="invalid").inc()
             return
 
-        # 从主题提取传感器ID (可选)
-        # 例如，如果主题是 farm/sensors/dtu001
-        topic_parts = topic.split("/")
-        if len(topic_parts) >= 3:
-            # 使用主题中的传感器ID覆盖或作为默认值
-            mqtt_sensor_id = topic_parts[2]
-            # 如果data中没有sensor_id，使用主题中的
-            if "sensor_id" not in data:
-                data["sensor_id"] = mqtt_sensor_id
-
-        # 验证和提取数据字段
-        sensor_id = data.get("sensor_id")
-        metric_type = data.get("metric_type")
-        value = data.get("value")
-        timestamp = data.get("timestamp")
-
-        # 验证必要字段
-        if not all([sensor_id, metric_type, value is not None]):
-            logger.warning(f"消息缺少必要字段: {data}")
+        # 提取并校验读数（规则见 readings.py，与历史数据回放共用）
+        try:
+            sensor_id, metric_type, value, timestamp = parse_reading(data, topic)
+        except InvalidReading as e:
+            logger.warning(f"{str(e)}: {data}")
+            INGEST_MESSAGES.labels(result="invalid").inc()
             return
 
-        # 确保value是数值
-        try:
-            value = float(value)
-        except (ValueError, TypeError):
-            logger.error(f"无效的数值: {value}")
+        # 去重与乱序判断（QoS 1 下重复投递是正常现象）
+        decision, dedup_key = dedup.check(
+            sensor_id,
+            metric_type,
+            timestamp or None,
+            msg.payload,
+            mid=msg.mid,
+            redelivered=bool(msg.dup),
+        )
+        if decision == DUPLICATE:
+            logger.info(f"忽略重复消息: {sensor_id}.{metric_type} ts={timestamp}")
+            INGEST_DUPLICATES.inc()
+            INGEST_MESSAGES.labels(result="duplicate").inc()
+            return
+        if decision == TOO_LATE:
+            logger.warning(f"丢弃迟到数据: {sensor_id}.{metric_type} ts={timestamp}")
+            INGEST_LATE.labels(action="dropped").inc()
+            INGEST_MESSAGES.labels(result="dropped").inc()
+            return
+        if decision == LATE:
+            INGEST_LATE.labels(action=dedup.late_policy).inc()
+
+        # 设备时间戳到处理开始的耗时，包含设备缓存和Broker投递
+        attributes = {"sensor.id": sensor_id, "sensor.metric": metric_type}
+        if isinstance(timestamp, (int, float)):
+            attributes["ingest.delay_ms"] = start_time * 1000 - timestamp
+        set_attributes(attributes)
+
+        # 入库策略：deadband/window 可能合并掉本条读数，但仍计入离线检测
+        outputs = policies.apply(sensor_id, metric_type, timestamp or None, value)
+        liveness.touch(sensor_id, metric_type, value)
+        if not outputs:
+            INGEST_POLICY_SUPPRESSED.labels(
+                policy=policies.policy_for(sensor_id, metric_type)[0]
+            ).inc()
+            INGEST_MESSAGES.labels(result="aggregated").inc()
             return
 
-        # 保存到TDengine
-        conn = get_taos_conn()
+        # 保存到TDengine；熔断打开或写入失败时转入本地缓冲，恢复后回放
+        stored = []
+        conn = None
         try:
-            # 使用传入的时间戳或当前时间
-            ts_value = f"{timestamp}" if timestamp else "NOW"
-
-            # 插入数据到TDengine
-            sql = f"""
-                INSERT INTO {sensor_id}_{metric_type} 
-                USING sensor_data TAGS ('{sensor_id}', '{metric_type}') 
-                VALUES ({ts_value}, {value})
-            """
-            conn.execute(sql)
+            conn = get_taos_conn()
+            # 插入数据到TDengine（子表由注册表预先创建）
+            with span("ingest.write", {"ingest.records": len(outputs)}):
+                for record in outputs:
+                    stored.append(
+                        (record[0], write_output(conn, sensor_id, metric_type, record))
+                    )
 
             # 处理时间统计
             processing_time = (time.time() - start_time) * 1000
             logger.info(
                 f"数据已存储: {sensor_id}.{metric_type}={value}, 耗时: {processing_time:.2f}ms"
             )
-
-            # 触发异步分析任务
-            celery.send_task(
-                "analyze_data",
-                args=[
-                    {
-                        "sensor_id": sensor_id,
-                        "metric_type": metric_type,
-                        "value": value,
-                        "timestamp": timestamp,
-                    }
-                ],
-            )
+            INGEST_MESSAGES.labels(result="stored").inc()
+            INGEST_LATENCY.observe(processing_time / 1000)
+
+            # 迟到数据按策略决定是否分析
+            if not dedup.should_analyze(decision):
+                return
+
+            # 触发异步分析任务（窗口聚合只分析关闭的窗口均值）
+            with span("celery.send_task", {"celery.task": "analyze_data"}):
+                for kind, (ts, stored_value) in stored:
+                    get_celery().send_task(
+                        "analyze_data",
+                        args=[
+                            {
+                                "sensor_id": sensor_id,
+                                "metric_type": metric_type,
+                                "value": stored_value,
+                                "timestamp": timestamp if kind == RAW else ts,
+                            }
+                        ],
+                        headers=inject_headers(),
+                    )
 
         except Exception as e:
+            remaining = outputs[len(stored) :]
+            if (
+                remaining
+                and is_backend_failure(e)
+                and spool_outputs(sensor_id, metric_type, remaining, start_time)
+            ):
+                logger.warning(
+                    f"TDengine不可用，{sensor_id}.{metric_type} 写入本地缓冲: {str(e)}"
+                )
+                INGEST_MESSAGES.labels(result="spooled").inc()
+                return
             logger.exception(f"保存数据到TDengine失败: {str(e)}")
+            dedup.forget(dedup_key)
+            INGEST_MESSAGES.labels(result="error").inc()
         finally:
-            conn.close()
+            if conn is not None:
+                conn.close()
 
     except Exception as e:
         logger.exception(f"处理MQTT消息时出错: {str(e)}")
@@ -138,6 +599,8 @@ def on_connect(client, userdata, flags, rc):
 
     if rc == 0:
         logger.info(f"已连接到MQTT服务器: {result}")
+        if not flags.get("session present"):
+            dedup.new_session()
         # 订阅主题
         client.subscribe(MQTT_TOPIC, qos=MQTT_QOS)
         logger.info(f"已订阅主题: {MQTT_TOPIC}")
@@ -174,6 +637,12 @@ def create_mqtt_client():
 # 启动MQTT客户端
 def start_mqtt_client():
     try:
+        preload_registry()
+        seed_liveness()
+        liveness.start()
+        start_policies()
+        start_spool()
+
         logger.info(f"正在连接到MQTT服务器 {MQTT_BROKER}:{MQTT_PORT}...")
         client = create_mqtt_client()
 
@@ -196,13 +665,46 @@ def stop_mqtt_client(client):
         client.loop_stop()
         client.disconnect()
         logger.info("MQTT客户端已关闭")
+    liveness.stop()
+    stop_policies()
+    stop_spool()
 
 
-# 当作为独立脚本运行时的入口点
+# 当作为独立脚本运行时的入口点（split部署模式下的入库进程）
 if __name__ == "__main__":
-    client = start_mqtt_client()
+    import signal
+    from schema import init_tdengine
+
+    def handle_sigterm(sig, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+    # 独立进程不经过 main 的初始化，需要自行启用追踪（TRACE_SERVICE_NAME 可覆盖服务名）
+    init_tracing("farm-ingest")
 
+    # 等待TDengine就绪后再开始消费
+    delay = 1
+    while True:
+        try:
+            init_tdengine()
+            break
+        except Exception as e:
+            logger.warning(f"TDengine未就绪: {str(e)}，{delay}秒后重试")
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    client = None
     try:
+        # 启动失败（如MQTT服务器未就绪）时按指数退避重试，与API进程的启动方式一致
+        delay = 1
+        while client is None:
+            client = start_mqtt_client()
+            if client is None:
+                logger.warning(f"MQTT客户端启动失败，{delay}秒后重试")
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
         # 保持程序运行
         while True:
             time.sleep(1)
@@ -0,0 +1,90 @@
+"""
+传感器读数的解析规则
+
+MQTT入库(on_message)和历史数据回放(backfill)共用，保证两条路径
+对同一条数据得到相同的序列和数值。
+"""
+import math
+from datetime import datetime
+
+from series_registry import valid_identifier, MAX_SENSOR_ID_LEN, MAX_METRIC_TYPE_LEN
+
+
+class InvalidReading(ValueError):
+    """读数缺少必要字段或数值无效"""
+
+
+def to_epoch_ms(timestamp):
+    """
+    时间戳转为毫秒整数
+
+    支持毫秒数值（或数字字符串）和 ISO 8601 字符串；不带时区的时间串
+    按本机时区解释。缺失或无效（包括 nan、inf）时抛出 InvalidReading。
+    """
+    if timestamp is None or timestamp == "":
+        raise InvalidReading("缺少时间戳")
+    if isinstance(timestamp, int) and not isinstance(timestamp, bool):
+        return timestamp
+    text = str(timestamp).strip()
+    try:
+        number = float(text)
+    except ValueError:
+        try:
+            return int(datetime.fromisoformat(text).timestamp() * 1000)
+        except (ValueError, OverflowError, OSError):
+            raise InvalidReading(f"无效的时间戳: {timestamp}")
+    if not math.isfinite(number):
+        raise InvalidReading(f"无效的时间戳: {timestamp}")
+    return int(number)
+
+
+def parse_reading(data, topic=None):
+    """
+    从消息字典中提取读数
+
+    - 主题为 farm/sensors/{sensor_id} 且数据中没有 sensor_id 时使用主题中的ID
+    - sensor_id、metric_type、value 必填，value 必须能转为有限的数值（拒绝 nan、inf）
+    - sensor_id、metric_type 不能超过 sensor_data 标签长度（否则无法建表），
+      也不能包含引号等查询接口拒绝的字符，见 series_registry.valid_identifier
+    - timestamp 按 to_epoch_ms 转为毫秒整数（与历史数据回放相同的规则），
+      无法解析时抛出 InvalidReading；消息不带时间戳时返回 None
+
+    返回 (sensor_id, metric_type, value, timestamp)，无效时抛出 InvalidReading
+    """
+    if not isinstance(data, dict):
+        raise InvalidReading("消息不是JSON对象")
+
+    # 从主题提取传感器ID (可选)
+    # 例如，如果主题是 farm/sensors/dtu001
+    if topic:
+        topic_parts = topic.split("/")
+        if len(topic_parts) >= 3 and "sensor_id" not in data:
+            data["sensor_id"] = topic_parts[2]
+
+    sensor_id = data.get("sensor_id")
+    metric_type = data.get("metric_type")
+    value = data.get("value")
+    timestamp = data.get("timestamp")
+
+    # 验证必要字段
+    if not all([sensor_id, metric_type, value is not None]):
+        raise InvalidReading("消息缺少必要字段")
+
+    # 确保value是数值
+    try:
+        value = float(value)
+    except (ValueError, TypeError):
+        raise InvalidReading(f"无效的数值: {value}")
+    if not math.isfinite(value):
+        raise InvalidReading(f"无效的数值: {value}")
+
+    sensor_id, metric_type = str(sensor_id), str(metric_type)
+    if not valid_identifier(sensor_id, MAX_SENSOR_ID_LEN) or not valid_identifier(
+        metric_type, MAX_METRIC_TYPE_LEN
+    ):
+        raise InvalidReading(f"无效的传感器ID或指标类型: {sensor_id}.{metric_type}")
+
+    # 时间戳会拼接到INSERT语句中，只允许转换后的整数
+    timestamp = None if timestamp is None or timestamp == "" else to_epoch_ms(timestamp)
+
+    return sensor_id, metric_type, value, timestamp
@@ -0,0 +1,286 @@
+"""
+后端熔断与自适应并发限制
+
+每个后端(TDengine、MySQL)一个 Backend，连接和每次查询(GuardedConnection、
+GuardedCursor)都经过它：
+- 熔断器：连续失败或慢调用达到阈值后打开，打开期间直接抛出 BackendUnavailable，
+  不再等待连接超时；reset_timeout 秒后放行一个探测调用，成功则恢复。
+- 并发限制(AIMD)：调用成功且不慢时缓慢加大上限，失败或变慢时减半，
+  超过上限的调用立即拒绝，避免请求在变慢的后端前堆积。
+
+只依赖标准库和 prometheus_client，API、入库进程和 Celery worker 共用。
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import BACKEND_STATE, BACKEND_REJECTED, BACKEND_CONCURRENCY_LIMIT
+
+logger = logging.getLogger("resilience")
+
+# 连续失败多少次打开熔断器
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "5"))
+# 熔断器打开后多久(秒)放行探测调用
+BREAKER_RESET_TIMEOUT = float(os.environ.get("BREAKER_RESET_TIMEOUT", "15"))
+# 超过该耗时(毫秒)的调用视为慢调用，计入失败
+BREAKER_SLOW_CALL_MS = float(os.environ.get("BREAKER_SLOW_CALL_MS", "5000"))
+# 每个进程对单个后端的并发调用上限范围
+BACKEND_MIN_CONCURRENCY = int(os.environ.get("BACKEND_MIN_CONCURRENCY", "2"))
+BACKEND_MAX_CONCURRENCY = int(os.environ.get("BACKEND_MAX_CONCURRENCY", "64"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# 表示后端不可用的驱动错误码；SQL错误、约束冲突等是调用方的问题，不计入熔断
+# TDengine (taos_errno & 0xFFFF): 网络不可用、FQDN解析失败、连接断开、RPC超时、
+# 节点未连接/断开、会话数超限、网络错误/繁忙、服务启动中/停止中
+TDENGINE_UNAVAILABLE_CODES = frozenset(
+    {0x000B, 0x0015, 0x0018, 0x0019, 0x0020, 0x0021, 0x0022, 0x0023, 0x0024, 0x0130, 0x0131}
+)
+# MySQL: 连接数过多、服务器关闭中、无法连接、服务器已断开、查询中连接丢失、读取包失败
+MYSQL_UNAVAILABLE_ERRNOS = frozenset({1040, 1053, 2003, 2006, 2013, 2055})
+
+
+class BackendUnavailable(Exception):
+    """后端熔断或过载，调用被直接拒绝"""
+
+    def __init__(self, backend, reason, retry_after=1):
+        super().__init__(f"{backend} 暂不可用 ({reason})")
+        self.backend = backend
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def is_backend_failure(exc):
+    """
+    是否为后端不可用（连接失败、超时、驱动返回的网络/服务错误码）
+
+    只有这类错误计入熔断、触发入库缓冲和返回过期缓存；其余错误（SQL错误、
+    数据过长、约束冲突等）重试也不会成功，按普通错误处理。
+    """
+    if isinstance(exc, (BackendUnavailable, ConnectionError, TimeoutError)):
+        return True
+    module = type(exc).__module__ or ""
+    if module.startswith("taos"):
+        if type(exc).__name__ == "ConnectionError":
+            return True
+        errno = getattr(exc, "errno", None)
+        return isinstance(errno, int) and (errno & 0xFFFF) in TDENGINE_UNAVAILABLE_CODES
+    if module.startswith("pymysql"):
+        return bool(exc.args) and exc.args[0] in MYSQL_UNAVAILABLE_ERRNOS
+    if module.startswith("sqlalchemy"):
+        orig = getattr(exc, "orig", None)
+        return orig is not None and is_backend_failure(orig)
+    return False
+
+
+class CircuitBreaker:
+    """closed -> (连续失败) -> open -> (等待) -> half_open -> (探测成功) -> closed"""
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        BACKEND_STATE.labels(backend=name).set(0)
+
+    def _set_state(self, state):
+        if state != self.state:
+            logger.warning(f"{self.name} 熔断器: {self.state} -> {state}")
+            self.state = state
+            BACKEND_STATE.labels(backend=self.name).set(_STATE_VALUES[state])
+
+    def is_open(self):
+        """打开且未到探测时间"""
+        return self.state == OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def retry_after(self):
+        return max(1, int(self._opened_at + self.reset_timeout - time.monotonic()) + 1)
+
+    def before_call(self):
+        """熔断器打开时抛出 BackendUnavailable；半开状态只放行一个探测调用"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN:
+                if self.is_open():
+                    raise BackendUnavailable(self.name, "open", self.retry_after())
+                self._set_state(HALF_OPEN)
+            if self._probing:
+                raise BackendUnavailable(self.name, "open", 1)
+            self._probing = True
+
+    def on_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._set_state(CLOSED)
+
+    def on_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._probing = False
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def on_cancel(self):
+        """调用未执行（被并发限制拒绝），释放探测名额"""
+        with self._lock:
+            self._probing = False
+
+
+class AdaptiveLimit:
+    """AIMD并发上限：成功 +1/limit，失败或慢调用 ×0.5"""
+
+    def __init__(self, name, minimum, maximum, initial=None):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(initial or maximum // 2 or minimum)
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        BACKEND_CONCURRENCY_LIMIT.labels(backend=name).set(self.limit)
+
+    def try_acquire(self):
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, ok):
+        with self._lock:
+            self.in_flight -= 1
+            if ok:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            else:
+                self.limit = max(self.minimum, self.limit / 2)
+        BACKEND_CONCURRENCY_LIMIT.labels(backend=self.name).set(self.limit)
+
+
+class Backend:
+    def __init__(
+        self,
+        name,
+        failure_threshold=BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=BREAKER_RESET_TIMEOUT,
+        slow_call_ms=BREAKER_SLOW_CALL_MS,
+        min_concurrency=BACKEND_MIN_CONCURRENCY,
+        max_concurrency=BACKEND_MAX_CONCURRENCY,
+    ):
+        self.name = name
+        self.slow_call_ms = slow_call_ms
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.limit = AdaptiveLimit(name, min_concurrency, max_concurrency)
+
+    def available(self):
+        """熔断器未打开（或已到探测时间）"""
+        return not self.breaker.is_open()
+
+    @contextmanager
+    def call(self):
+        """包裹一次后端调用：熔断检查、并发限制、按结果和耗时更新状态"""
+        try:
+            self.breaker.before_call()
+        except BackendUnavailable:
+            BACKEND_REJECTED.labels(backend=self.name, reason="open").inc()
+            raise
+        if not self.limit.try_acquire():
+            self.breaker.on_cancel()
+            BACKEND_REJECTED.labels(backend=self.name, reason="overload").inc()
+            raise BackendUnavailable(self.name, "overload")
+
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_backend_failure(e):
+                self.limit.release(ok=False)
+                self.breaker.on_failure()
+            else:
+                self.limit.release(ok=True)
+                self.breaker.on_success()
+            raise
+        slow = (time.monotonic() - start) * 1000 > self.slow_call_ms
+        self.limit.release(ok=not slow)
+        if slow:
+            self.breaker.on_failure()
+        else:
+            self.breaker.on_success()
+
+
+class GuardedConnection:
+    """TDengine连接的 query/execute 经过 Backend.call()，其余属性直接转发"""
+
+    def __init__(self, conn, backend):
+        self._conn = conn
+        self._backend = backend
+
+    def query(self, sql, *args, **kwargs):
+        with self._backend.call():
+            return self._conn.query(sql, *args, **kwargs)
+
+    def execute(self, sql, *args, **kwargs):
+        with self._backend.call():
+            return self._conn.execute(sql, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class GuardedCursor:
+    """MySQL游标的 execute/executemany 经过 Backend.call()，其余属性直接转发"""
+
+    def __init__(self, cursor, backend):
+        self._cursor = cursor
+        self._backend = backend
+
+    def execute(self, *args, **kwargs):
+        with self._backend.call():
+            return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        with self._backend.call():
+            return self._cursor.executemany(*args, **kwargs)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class GuardedMySQLConnection:
+    """MySQL连接：cursor() 返回 GuardedCursor，commit 经过 Backend.call()"""
+
+    def __init__(self, conn, backend):
+        self._conn = conn
+        self._backend = backend
+
+    def cursor(self, *args, **kwargs):
+        return GuardedCursor(self._conn.cursor(*args, **kwargs), self._backend)
+
+    def commit(self):
+        with self._backend.call():
+            return self._conn.commit()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+tdengine = Backend("tdengine")
+mysql = Backend("mysql")
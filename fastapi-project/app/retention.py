@@ -0,0 +1,124 @@
+import os
+
+# 数据保留分层配置
+# 原始数据：默认保留30天
+RAW_KEEP_DAYS = int(os.environ.get("RAW_KEEP_DAYS", "30"))
+RAW_DURATION_DAYS = int(os.environ.get("RAW_DURATION_DAYS", "10"))
+# 原始数据每个序列每小时的平均点数，用于估算查询行数
+RAW_POINTS_PER_HOUR = int(os.environ.get("RAW_POINTS_PER_HOUR", "360"))
+
+# 数据库选项：CACHEMODEL 'last_row' 让最新值查询直接读缓存
+TDENGINE_CACHEMODEL = os.environ.get("TDENGINE_CACHEMODEL", "last_row")
+TDENGINE_COMP = int(os.environ.get("TDENGINE_COMP", "2"))
+
+# 是否创建降采样流
+ROLLUP_ENABLED = os.environ.get("ROLLUP_ENABLED", "true").lower() == "true"
+
+# 降采样层级：名称 -> (窗口, 每序列每小时行数, 保留天数, DURATION天数)
+ROLLUP_TIERS = {
+    "1m": ("1m", 60, int(os.environ.get("ROLLUP_1M_KEEP_DAYS", "365")), 30),
+    "1h": ("1h", 1, int(os.environ.get("ROLLUP_1H_KEEP_DAYS", "36500")), 365),
+}
+
+ROLLUP_STABLE = "sensor_rollup"
+
+
+def rollup_db(db, tier):
+    return f"{db}_{tier}"
+
+
+def database_options(keep_days, duration_days):
+    return (
+        f"KEEP {keep_days}d DURATION {duration_days}d "
+        f"CACHEMODEL '{TDENGINE_CACHEMODEL}' COMP {TDENGINE_COMP}"
+    )
+
+
+def raw_database_sql(db):
+    return f"CREATE DATABASE IF NOT EXISTS {db} {database_options(RAW_KEEP_DAYS, RAW_DURATION_DAYS)}"
+
+
+def rollup_statements(db, fill_history=False):
+    """
+    创建降采样数据库、超级表和流计算的SQL
+
+    每个层级一个独立数据库（KEEP按数据库生效），由流计算从原始数据
+    按窗口聚合写入。fill_history 为真时流计算会先处理已有的历史数据。
+
+    IGNORE EXPIRED 0 / IGNORE UPDATE 0：窗口关闭后才到达的数据（迟到、
+    历史回放、缓冲回放）和覆盖写入的数据会触发对应窗口重新计算，
+    否则这些数据永远不会进入降采样表。
+    """
+    statements = []
+    for tier, (window, _, keep_days, duration_days) in ROLLUP_TIERS.items():
+        target = rollup_db(db, tier)
+        statements.append(
+            f"CREATE DATABASE IF NOT EXISTS {target} {database_options(keep_days, duration_days)}"
+        )
+        statements.append(
+            f"""
+            CREATE STABLE IF NOT EXISTS {target}.{ROLLUP_STABLE} (
+                ts TIMESTAMP,
+                avg_value DOUBLE,
+                min_value FLOAT,
+                max_value FLOAT,
+                cnt BIGINT
+            ) TAGS (
+                sensor_id BINARY(50),
+                metric_type BINARY(20)
+            )
+            """
+        )
+        statements.append(
+            f"""
+            CREATE STREAM IF NOT EXISTS {db}_rollup_{tier}
+            TRIGGER WINDOW_CLOSE WATERMARK 1m IGNORE EXPIRED 0
+            FILL_HISTORY {1 if fill_history else 0} IGNORE UPDATE 0
+            INTO {target}.{ROLLUP_STABLE}
+            AS SELECT _wstart AS ts, AVG(value) AS avg_value, MIN(value) AS min_value,
+                      MAX(value) AS max_value, COUNT(value) AS cnt
+            FROM {db}.sensor_data
+            PARTITION BY sensor_id, metric_type
+            INTERVAL({window})
+            """
+        )
+    return statements
+
+
+def drop_stream_statements(db):
+    """
+    删除降采样流计算的SQL
+
+    流计算的选项建立后不能修改，CREATE STREAM IF NOT EXISTS 也不会更新
+    已有的流；改变选项时先删除再重建，降采样表中已有的数据保留。
+    """
+    return [f"DROP STREAM IF EXISTS {db}_rollup_{tier}" for tier in ROLLUP_TIERS]
+
+
+def alter_statements(db, apply_keep=False):
+    """
+    调整已有原始数据库的选项
+
+    DURATION、COMP 在建库后不能修改，只能调整 CACHEMODEL 和 KEEP。
+    缩短 KEEP 会立即删除过期数据，因此需要显式指定 apply_keep。
+    """
+    statements = [f"ALTER DATABASE {db} CACHEMODEL '{TDENGINE_CACHEMODEL}'"]
+    if apply_keep:
+        statements.append(f"ALTER DATABASE {db} KEEP {RAW_KEEP_DAYS}d")
+    return statements
+
+
+def available_sources(hours):
+    """
+    返回能覆盖 hours 时间范围的数据源，按精度从高到低排列
+
+    每项为 (来源名称, 每序列每小时行数)
+    """
+    sources = []
+    if hours <= RAW_KEEP_DAYS * 24:
+        sources.append(("raw", RAW_POINTS_PER_HOUR))
+    if ROLLUP_ENABLED:
+        for tier, (_, points_per_hour, keep_days, _) in ROLLUP_TIERS.items():
+            if hours <= keep_days * 24:
+                sources.append((f"rollup_{tier}", points_per_hour))
+    return sources
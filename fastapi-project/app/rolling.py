@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+
+# 入库进程内保留的滚动窗口长度(小时)，0表示不保留
+ROLLING_WINDOW_HOURS = int(os.environ.get("ROLLING_WINDOW_HOURS", "1"))
+# 窗口内的聚合粒度(秒)
+ROLLING_BUCKET_SECONDS = int(os.environ.get("ROLLING_BUCKET_SECONDS", "60"))
+# 每写入多少条数据清理一次过期的桶
+PRUNE_EVERY = 10000
+
+
+class RollingWindows:
+    """
+    按序列保存最近N小时的分时聚合 (sum, min, max, count)
+
+    由MQTT入库进程在接收数据时更新，API与入库运行在同一进程时
+    （single部署模式）可以直接回答短时间窗口的均值查询，不访问TDengine。
+    只有在进程运行时间覆盖了整个查询窗口后才会被使用，见 covered_hours()。
+
+    参数:
+    hours          - 保留的小时数
+    bucket_seconds - 聚合粒度，查询的起止时间按该粒度对齐
+    """
+
+    def __init__(self, hours, bucket_seconds=60):
+        self.hours = hours
+        self.bucket_ms = bucket_seconds * 1000
+        # metric_type -> sensor_id -> {桶开始ts_ms: [sum, min, max, count]}
+        self._series = {}
+        self._lock = threading.Lock()
+        self._started_at = None
+        self._adds = 0
+
+    def start(self, now=None):
+        """开始接收数据，此后满 hours 小时才能完整回答查询"""
+        self._started_at = time.time() if now is None else now
+
+    def covered_hours(self, now=None):
+        """已经完整覆盖的小时数"""
+        if not self.hours or self._started_at is None:
+            return 0
+        now = time.time() if now is None else now
+        return min(self.hours, int((now - self._started_at) // 3600))
+
+    def add(self, sensor_id, metric_type, timestamp, value, now=None):
+        if not self.hours or self._started_at is None:
+            return
+        now_ms = (time.time() if now is None else now) * 1000
+        try:
+            ts_ms = int(timestamp)
+        except (TypeError, ValueError):
+            ts_ms = int(now_ms)
+        if ts_ms < now_ms - self.hours * 3600 * 1000:
+            return
+
+        bucket = ts_ms - ts_ms % self.bucket_ms
+        with self._lock:
+            buckets = self._series.setdefault(metric_type, {}).setdefault(sensor_id, {})
+            entry = buckets.get(bucket)
+            if entry is None:
+                buckets[bucket] = [value, value, value, 1]
+            else:
+                entry[0] += value
+                entry[1] = min(entry[1], value)
+                entry[2] = max(entry[2], value)
+                entry[3] += 1
+            self._adds += 1
+            if self._adds % PRUNE_EVERY == 0:
+                self._prune(now_ms)
+
+    def _prune(self, now_ms):
+        cutoff = now_ms - self.hours * 3600 * 1000 - self.bucket_ms
+        for metric_type, sensors in list(self._series.items()):
+            for sensor_id, buckets in list(sensors.items()):
+                for bucket in [b for b in buckets if b < cutoff]:
+                    del buckets[bucket]
+                if not buckets:
+                    del sensors[sensor_id]
+            if not sensors:
+                del self._series[metric_type]
+
+    def aggregate(self, metric_type, hours, sensor_ids=None, breakdown=False, now=None):
+        """
+        最近 hours 小时的 avg/min/max/样本数
+
+        breakdown 为真时返回 [{sensor_id, avg, min, max, samples}]，
+        否则返回合并结果 {avg, min, max, samples}；没有数据时返回 None 或空列表。
+        """
+        now_ms = (time.time() if now is None else now) * 1000
+        cutoff = now_ms - hours * 3600 * 1000
+        per_sensor = {}
+        with self._lock:
+            sensors = self._series.get(metric_type, {})
+            ids = sensors.keys() if sensor_ids is None else [s for s in sensor_ids if s in sensors]
+            for sensor_id in ids:
+                total, low, high, count = 0.0, None, None, 0
+                for bucket, (s, lo, hi, n) in sensors[sensor_id].items():
+                    if bucket + self.bucket_ms <= cutoff:
+                        continue
+                    total += s
+                    low = lo if low is None else min(low, lo)
+                    high = hi if high is None else max(high, hi)
+                    count += n
+                if count:
+                    per_sensor[sensor_id] = (total, low, high, count)
+
+        if breakdown:
+            return [
+                {
+                    "sensor_id": sensor_id,
+                    "avg": total / count,
+                    "min": low,
+                    "max": high,
+                    "samples": count,
+                }
+                for sensor_id, (total, low, high, count) in sorted(per_sensor.items())
+            ]
+        if not per_sensor:
+            return None
+        total = sum(v[0] for v in per_sensor.values())
+        count = sum(v[3] for v in per_sensor.values())
+        return {
+            "avg": total / count,
+            "min": min(v[1] for v in per_sensor.values()),
+            "max": max(v[2] for v in per_sensor.values()),
+            "samples": count,
+        }
+
+
+# 进程内共享的实例：入库时写入，/api/avg 读取
+windows = RollingWindows(ROLLING_WINDOW_HOURS, ROLLING_BUCKET_SECONDS)
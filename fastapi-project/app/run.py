@@ -2,10 +2,9 @@ import asyncio
 import uvicorn
 import logging
 import signal
+import shutil
 import sys
 import os
-from mqtt_handler import start_mqtt_client, stop_mqtt_client
-from main import init_db
 
 # 配置日志
 logging.basicConfig(
@@ -15,9 +14,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger("app-runner")
 
+# 部署拓扑
+# single: 单进程，uvicorn单worker，MQTT客户端运行在API进程中
+# split: API由gunicorn启动多个uvicorn worker，MQTT入库运行在独立进程中
+DEPLOY_MODE = os.environ.get("DEPLOY_MODE", "single")
+PROMETHEUS_MULTIPROC_DIR = os.environ.get(
+    "PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc"
+)
+
 # 全局变量用于控制优雅关闭
 shutdown_event = asyncio.Event()
-mqtt_client = None
 
 
 # 处理终止信号
@@ -32,79 +38,86 @@ signal.signal(signal.SIGINT, handle_shutdown_signal)
 signal.signal(signal.SIGTERM, handle_shutdown_signal)
 
 
-async def start_fastapi():
-    """启动FastAPI服务器"""
-    config = uvicorn.Config(
-        "main:app", host="0.0.0.0", port=8003, reload=False, log_level="info"
-    )
-    server = uvicorn.Server(config)
+def prepare_multiproc_dir():
+    """清空Prometheus多进程目录，所有子进程的指标写入同一目录"""
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = PROMETHEUS_MULTIPROC_DIR
+
+
+async def run_split():
+    """split模式：启动独立的MQTT入库进程和多worker的API服务"""
+    prepare_multiproc_dir()
+    env = dict(os.environ, START_MQTT_IN_API="false")
+
+    # 只启动一个入库进程：去重、离线检测和窗口聚合的状态都在进程内存中，
+    # 多个进程分摊同一主题会产生误报和不完整的窗口（普通订阅下每条消息还会被重复写入）
+    if os.environ.get("INGEST_PROCESSES", "1") != "1":
+        logger.warning("INGEST_PROCESSES 已不再支持，只启动一个MQTT入库进程")
+    logger.info("正在启动MQTT入库进程...")
+    processes = [
+        await asyncio.create_subprocess_exec(
+            sys.executable,
+            "mqtt_handler.py",
+            env=dict(env, TRACE_SERVICE_NAME="farm-ingest"),
+        )
+    ]
 
-    # 在uvicorn中设置shutdown_event
-    server.should_exit = shutdown_event.is_set
+    logger.info(f"正在启动API服务 (workers={os.environ.get('API_WORKERS', '4')})...")
+    processes.append(
+        await asyncio.create_subprocess_exec(
+            "gunicorn", "main:app", "-c", "gunicorn.conf.py", env=env
+        )
+    )
 
-    await server.serve()
+    # 任一子进程退出或收到关闭信号时，关闭所有子进程
+    waiters = [asyncio.create_task(p.wait()) for p in processes]
+    waiters.append(asyncio.create_task(shutdown_event.wait()))
+    await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
 
+    logger.info("正在关闭服务...")
+    for p in processes:
+        if p.returncode is None:
+            p.terminate()
+    await asyncio.gather(*(p.wait() for p in processes))
+    for task in waiters:
+        task.cancel()
 
-async def shutdown_monitor():
-    """监控shutdown_event并等待关闭信号"""
-    await shutdown_event.wait()
-    return True
+    logger.info("所有服务已关闭")
+    # 未收到关闭信号说明有子进程意外退出
+    return 0 if shutdown_event.is_set() else 1
 
 
 async def main():
-    """主函数：启动所有服务"""
-    global mqtt_client
+    """主函数：按 DEPLOY_MODE 启动服务
 
+    数据库初始化和MQTT客户端在 main.lifespan 中并行启动，
+    就绪状态可通过 /readyz 查询。
+    """
     try:
-        logger.info("正在启动智能农场数据服务...")
-        # 手动初始化数据库
-        logger.info("手动初始化数据库...")
-        try:
-            init_db()  # 直接调用初始化函数
-            logger.info("数据库初始化成功!")
-        except Exception as e:
-            logger.error(f"数据库初始化失败: {str(e)}")
-            # 不退出程序，继续尝试启动其他服务
-        # 启动MQTT客户端
-        mqtt_client = start_mqtt_client()
-        if not mqtt_client:
-            logger.error("MQTT客户端启动失败，退出程序")
-            return 1
-
-        # 创建任务来运行FastAPI
-        fastapi_task = asyncio.create_task(start_fastapi())
-        shutdown_task = asyncio.create_task(shutdown_monitor())
-
-        # 等待任一任务完成或收到关闭信号
-        done, pending = await asyncio.wait(
-            [fastapi_task, shutdown_task],
-            return_when=asyncio.FIRST_COMPLETED,
-        )
+        logger.info(f"正在启动智能农场数据服务 (DEPLOY_MODE={DEPLOY_MODE})...")
+        if DEPLOY_MODE == "split":
+            return await run_split()
 
-        logger.info("正在关闭服务...")
+        config = uvicorn.Config(
+            "main:app", host="0.0.0.0", port=8003, reload=False, log_level="info"
+        )
+        server = uvicorn.Server(config)
 
-        # 取消所有未完成的任务
-        for task in pending:
-            if not task.done():
-                task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    pass
+        async def shutdown_monitor():
+            """监控shutdown_event并通知uvicorn退出"""
+            await shutdown_event.wait()
+            server.should_exit = True
 
-        # 关闭MQTT客户端
-        stop_mqtt_client(mqtt_client)
+        monitor_task = asyncio.create_task(shutdown_monitor())
+        await server.serve()
+        monitor_task.cancel()
 
         logger.info("所有服务已关闭")
         return 0
 
     except Exception as e:
         logger.exception(f"运行服务时出错: {str(e)}")
-
-        # 确保MQTT客户端关闭
-        if mqtt_client:
-            stop_mqtt_client(mqtt_client)
-
         return 1
 
 
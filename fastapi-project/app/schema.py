@@ -0,0 +1,62 @@
+"""
+TDengine库表结构初始化
+
+API进程启动时和独立的入库进程都会调用 init_tdengine，
+所有语句均为 IF NOT EXISTS，可以重复执行。
+"""
+import logging
+
+from clients import get_taos_conn
+from config import TDENGINE_DB
+from retention import raw_database_sql, rollup_statements, ROLLUP_ENABLED
+
+logger = logging.getLogger("tdengine-schema")
+
+
+def init_tdengine():
+    # 初始化TDengine（数据库可能尚未创建，连接时不指定数据库）
+    conn = get_taos_conn(database=None)
+    try:
+        # 创建数据库（保留时间、缓存模式等选项见 retention.py）
+        conn.execute(raw_database_sql(TDENGINE_DB))
+        conn.execute(f"USE {TDENGINE_DB}")
+
+        # 创建超级表（模板）
+        conn.execute(
+            """
+            CREATE STABLE IF NOT EXISTS sensor_data (
+                ts TIMESTAMP,
+                value FLOAT
+            ) TAGS (
+                sensor_id BINARY(50),
+                metric_type BINARY(20)
+            )
+            """
+        )
+
+        # 窗口聚合入库策略的聚合结果表
+        conn.execute(
+            """
+            CREATE STABLE IF NOT EXISTS sensor_data_agg (
+                ts TIMESTAMP,
+                avg_value DOUBLE,
+                min_value FLOAT,
+                max_value FLOAT,
+                cnt INT
+            ) TAGS (
+                sensor_id BINARY(50),
+                metric_type BINARY(20)
+            )
+            """
+        )
+
+        # 创建降采样数据库和流计算
+        if ROLLUP_ENABLED:
+            for sql in rollup_statements(TDENGINE_DB):
+                conn.execute(sql)
+        logger.info("TDengine数据库初始化完成")
+    except Exception as e:
+        logger.error(f"初始化TDengine出错: {str(e)}")
+        raise
+    finally:
+        conn.close()
@@ -0,0 +1,164 @@
+"""
+传感器元数据批量导入
+
+请求体为JSON数组（或 {"sensors": [...]}）或CSV。CSV每行一个传感器，
+可选的 metric_type/min_value/max_value/warning_min/warning_max 列为该传感器
+一个指标的阈值，同一传感器的多个指标阈值写成多行。
+"""
+import csv
+import io
+import json
+import logging
+
+from series_registry import valid_identifier, MAX_SENSOR_ID_LEN, MAX_METRIC_TYPE_LEN
+
+logger = logging.getLogger("sensor-import")
+
+SENSOR_COLUMNS = (
+    "id",
+    "name",
+    "location",
+    "type",
+    "model",
+    "description",
+    "installation_date",
+    "status",
+    "report_interval",
+)
+THRESHOLD_COLUMNS = ("min_value", "max_value", "warning_min", "warning_max")
+
+UPSERT_SENSOR_SQL = f"""
+    INSERT INTO sensors ({", ".join(SENSOR_COLUMNS)})
+    VALUES ({", ".join(["%s"] * len(SENSOR_COLUMNS))})
+    ON DUPLICATE KEY UPDATE
+    {", ".join(f"{c} = VALUES({c})" for c in SENSOR_COLUMNS[1:])}
+"""
+
+UPSERT_THRESHOLD_SQL = f"""
+    INSERT INTO sensor_thresholds (sensor_id, metric_type, {", ".join(THRESHOLD_COLUMNS)})
+    VALUES (%s, %s, {", ".join(["%s"] * len(THRESHOLD_COLUMNS))})
+    ON DUPLICATE KEY UPDATE
+    {", ".join(f"{c} = VALUES({c})" for c in THRESHOLD_COLUMNS)}
+"""
+
+
+def parse_body(body, content_type):
+    """
+    将请求体解析为行字典列表
+
+    CSV中的空单元格视为未填写；带 metric_type 的行转为 thresholds 列表。
+    格式错误时抛出 ValueError。
+    """
+    if "csv" in (content_type or ""):
+        try:
+            reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+        except UnicodeDecodeError:
+            raise ValueError("CSV必须为UTF-8编码")
+        if not reader.fieldnames or "id" not in reader.fieldnames:
+            raise ValueError("CSV缺少表头或id列")
+        rows = []
+        for record in reader:
+            row = {
+                k.strip(): v.strip()
+                for k, v in record.items()
+                if k and v is not None and v.strip() != ""
+            }
+            metric_type = row.pop("metric_type", None)
+            threshold = {c: row.pop(c) for c in THRESHOLD_COLUMNS if c in row}
+            if metric_type:
+                row["thresholds"] = [dict(threshold, metric_type=metric_type)]
+            rows.append(row)
+        return rows
+
+    try:
+        data = json.loads(body)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"无效的JSON: {str(e)}")
+    if isinstance(data, dict):
+        data = data.get("sensors")
+    if not isinstance(data, list):
+        raise ValueError("请求体应为传感器数组或 {\"sensors\": [...]}")
+    return data
+
+
+def check_identifiers(item):
+    """返回标识符校验错误，没有错误时返回None"""
+    if not valid_identifier(item.id, MAX_SENSOR_ID_LEN):
+        return f"无效的传感器ID: {item.id}"
+    for threshold in item.thresholds:
+        if not valid_identifier(threshold.metric_type, MAX_METRIC_TYPE_LEN):
+            return f"无效的指标类型: {threshold.metric_type}"
+    return None
+
+
+def _sensor_params(item):
+    return tuple(getattr(item, c) for c in SENSOR_COLUMNS)
+
+
+def _threshold_params(item):
+    return [
+        (item.id, t.metric_type) + tuple(getattr(t, c) for c in THRESHOLD_COLUMNS)
+        for t in item.thresholds
+    ]
+
+
+def _write_chunk(cursor, chunk):
+    sensors = [_sensor_params(item) for _, item in chunk]
+    thresholds = [p for _, item in chunk for p in _threshold_params(item)]
+    cursor.executemany(UPSERT_SENSOR_SQL, sensors)
+    if thresholds:
+        cursor.executemany(UPSERT_THRESHOLD_SQL, thresholds)
+
+
+def upsert_sensors(conn, items, chunk_size=500):
+    """
+    批量写入传感器和阈值
+
+    items 为 [(行号, 已校验的导入行)]。每个分块一次查询已有ID、
+    一次 executemany 写入传感器、一次 executemany 写入阈值并提交；
+    分块写入失败时回滚并逐行重试，定位出错的行，其余行照常写入。
+
+    返回每行的结果 {"row", "sensor_id", "status", "thresholds"[, "error"]}，
+    status 为 created/updated/error。
+    """
+    results = {}
+    seen = set()
+    with conn.cursor() as cursor:
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start : start + chunk_size]
+            ids = list({item.id for _, item in chunk} - seen)
+            existing = set()
+            if ids:
+                cursor.execute(
+                    f"SELECT id FROM sensors WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                    ids,
+                )
+                existing = {row["id"] for row in cursor.fetchall()}
+
+            for row, item in chunk:
+                status = "updated" if item.id in existing or item.id in seen else "created"
+                seen.add(item.id)
+                results[row] = {
+                    "row": row,
+                    "sensor_id": item.id,
+                    "status": status,
+                    "thresholds": len(item.thresholds),
+                }
+
+            try:
+                _write_chunk(cursor, chunk)
+                conn.commit()
+                continue
+            except Exception as e:
+                conn.rollback()
+                logger.warning(f"批量写入失败，逐行重试: {str(e)}")
+
+            for row, item in chunk:
+                try:
+                    _write_chunk(cursor, [(row, item)])
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    results[row]["status"] = "error"
+                    results[row]["error"] = str(e)
+    return [results[row] for row, _ in items]
@@ -0,0 +1,120 @@
+import hashlib
+import logging
+import re
+import threading
+
+logger = logging.getLogger("series-registry")
+
+# 与 sensor_data 超级表的标签长度一致
+MAX_SENSOR_ID_LEN = 50
+MAX_METRIC_TYPE_LEN = 20
+
+_UNSAFE_CHARS = re.compile(r"[^a-z0-9_]")
+# 传感器ID、指标类型中不允许的字符：引号、反斜杠、反引号和控制字符。
+# 标识符会拼接到查询SQL中；其余字符（包括空格、中文）入库、建档和查询都接受
+_FORBIDDEN_CHARS = re.compile(r"['\"\\`\x00-\x1f\x7f]")
+
+
+def valid_identifier(value, max_len):
+    """传感器ID、指标类型是否可以入库和查询：非空、不超过标签长度、不含特殊字符"""
+    return 0 < len(value) <= max_len and not _FORBIDDEN_CHARS.search(value)
+
+
+def escape_tag(value):
+    """转义标签值中的反斜杠和单引号"""
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+
+def safe_table_name(sensor_id, metric_type):
+    """
+    生成安全且稳定的子表名
+
+    非字母数字字符替换为下划线并转为小写，再附加原始值的哈希，
+    保证 "a-b"/"a.b"、大小写不同的ID不会映射到同一张表。
+    """
+    base = _UNSAFE_CHARS.sub("_", f"{sensor_id}_{metric_type}".lower())[:150]
+    digest = hashlib.blake2b(
+        f"{sensor_id}\x00{metric_type}".encode("utf-8"), digest_size=4
+    ).hexdigest()
+    return f"s_{base}_{digest}"
+
+
+class SeriesRegistry:
+    """
+    序列注册表：(sensor_id, metric_type) -> 子表名
+
+    启动时从TDengine标签目录预加载已有子表（包括旧版本以
+    {sensor_id}_{metric_type} 命名的表），新序列只在第一次出现时
+    建表一次，之后写入只需 INSERT INTO 子表名 VALUES (...)。
+
+    参数:
+    on_new_series - 新建子表后的回调 (sensor_id, metric_type, table)
+    """
+
+    def __init__(self, on_new_series=None):
+        self.on_new_series = on_new_series
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tables)
+
+    def preload(self, conn, db):
+        """从 information_schema.ins_tags 加载已有子表与标签的对应关系"""
+        res = conn.query(
+            f"""
+            SELECT table_name, tag_name, tag_value
+            FROM information_schema.ins_tags
+            WHERE db_name='{db}' AND stable_name='sensor_data'
+            """
+        )
+        tags = {}
+        for table, tag_name, tag_value in res.fetch_all():
+            tags.setdefault(table, {})[tag_name] = tag_value
+
+        tables = {}
+        for table, values in tags.items():
+            sensor_id = values.get("sensor_id")
+            metric_type = values.get("metric_type")
+            if sensor_id and metric_type:
+                tables[(sensor_id, metric_type)] = table
+
+        with self._lock:
+            self._tables.update(tables)
+        logger.info(f"已预加载 {len(tables)} 个序列的子表")
+        return len(tables)
+
+    def get(self, sensor_id, metric_type):
+        return self._tables.get((sensor_id, metric_type))
+
+    def resolve(self, conn, sensor_id, metric_type):
+        """返回序列的子表名，不存在时建表"""
+        key = (sensor_id, metric_type)
+        table = self._tables.get(key)
+        if table is not None:
+            return table
+
+        if len(sensor_id) > MAX_SENSOR_ID_LEN or len(metric_type) > MAX_METRIC_TYPE_LEN:
+            raise ValueError(f"传感器ID或指标类型过长: {sensor_id}.{metric_type}")
+
+        table = safe_table_name(sensor_id, metric_type)
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} USING sensor_data "
+            f"TAGS ('{escape_tag(sensor_id)}', '{escape_tag(metric_type)}')"
+        )
+        with self._lock:
+            created = key not in self._tables
+            self._tables.setdefault(key, table)
+        if created:
+            logger.info(f"新序列: {sensor_id}.{metric_type} -> {table}")
+            if self.on_new_series:
+                try:
+                    self.on_new_series(sensor_id, metric_type, table)
+                except Exception as e:
+                    logger.warning(f"新序列回调出错: {str(e)}")
+        return self._tables[key]
+
+    def forget(self, sensor_id, metric_type):
+        """子表被外部删除时移除缓存，下次写入时重新建表"""
+        with self._lock:
+            self._tables.pop((sensor_id, metric_type), None)
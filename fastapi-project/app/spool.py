@@ -0,0 +1,124 @@
+"""
+入库本地缓冲
+
+TDengine熔断打开或写入失败时，入库进程把待写入的记录追加到本地 JSON Lines
+文件，后端恢复后由后台线程按顺序回放。回放前先把文件改名，回放期间新的记录
+写入新文件；回放因后端再次不可用而中断时，同一进程内从中断处继续，进程重启后
+从头重放。TDengine 对相同 (子表, 时间戳) 的写入是覆盖，重复回放不会产生重复行。
+
+非后端故障导致写入失败的记录重试 SPOOL_MAX_ATTEMPTS 次后移入隔离文件
+（{path}.quarantine），不会阻塞后面的记录。
+"""
+import json
+import logging
+import os
+import threading
+
+from metrics import INGEST_SPOOLED
+from resilience import is_backend_failure
+
+logger = logging.getLogger("ingest-spool")
+
+# 同一条记录因非后端故障写入失败的最大次数，超过后移入隔离文件
+SPOOL_MAX_ATTEMPTS = 3
+
+
+class Spool:
+    """
+    参数:
+    path         - 缓冲文件路径
+    max_bytes    - 缓冲文件上限，超出后丢弃新记录
+    retryable    - 判断写入异常是否为后端故障（停止回放、稍后重试）
+    max_attempts - 其他异常的重试次数，之后隔离该记录
+    """
+
+    def __init__(
+        self, path, max_bytes, retryable=is_backend_failure, max_attempts=SPOOL_MAX_ATTEMPTS
+    ):
+        self.path = path
+        self.replay_path = f"{path}.replaying"
+        self.quarantine_path = f"{path}.quarantine"
+        self.max_bytes = max_bytes
+        self.retryable = retryable
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        # 当前回放文件中已处理的行数，以及处理位置上记录的失败次数
+        self._position = 0
+        self._attempts = 0
+
+    def append(self, sensor_id, metric_type, record):
+        """追加一条入库策略输出的记录，缓冲已满时返回False"""
+        line = json.dumps([sensor_id, metric_type, *record]) + "\n"
+        with self._lock:
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                size = 0
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if size + len(line) > self.max_bytes:
+                INGEST_SPOOLED.labels(action="dropped").inc()
+                return False
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+        INGEST_SPOOLED.labels(action="spooled").inc()
+        return True
+
+    def pending(self):
+        return os.path.exists(self.replay_path) or (
+            os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        )
+
+    def _quarantine(self, line, error):
+        logger.error(f"缓冲记录多次写入失败，移入隔离文件: {line.strip()}: {error}")
+        with open(self.quarantine_path, "a", encoding="utf-8") as f:
+            f.write(line if line.endswith("\n") else line + "\n")
+        INGEST_SPOOLED.labels(action="quarantined").inc()
+
+    def replay(self, write):
+        """
+        按写入顺序回放，调用 write(sensor_id, metric_type, record)
+
+        write 抛出后端故障时停止并重新抛出，下次从该记录继续；其他异常
+        重试 max_attempts 次后隔离该记录并继续。返回本次回放的记录数。
+        """
+        with self._replay_lock:
+            with self._lock:
+                if not os.path.exists(self.replay_path):
+                    if not os.path.exists(self.path):
+                        return 0
+                    os.replace(self.path, self.replay_path)
+                    self._position = 0
+                    self._attempts = 0
+
+            replayed = 0
+            with open(self.replay_path, "r", encoding="utf-8") as f:
+                for index, line in enumerate(f):
+                    if index < self._position:
+                        continue
+                    try:
+                        sensor_id, metric_type, *record = json.loads(line)
+                    except (json.JSONDecodeError, ValueError):
+                        # 进程在写入途中退出留下的半行
+                        logger.warning(f"跳过损坏的缓冲记录: {line.strip()}")
+                        self._position = index + 1
+                        continue
+                    try:
+                        write(sensor_id, metric_type, tuple(record))
+                    except Exception as e:
+                        if self.retryable(e):
+                            raise
+                        self._attempts += 1
+                        if self._attempts < self.max_attempts:
+                            raise
+                        self._quarantine(line, e)
+                    else:
+                        replayed += 1
+                        INGEST_SPOOLED.labels(action="replayed").inc()
+                    self._position = index + 1
+                    self._attempts = 0
+
+            os.remove(self.replay_path)
+            self._position = 0
+            logger.info(f"本地缓冲回放完成，共 {replayed} 条")
+            return replayed
@@ -1,10 +1,17 @@
-from celery import Celery
-import taos
+from celery import Celery, chord, group
+from celery.schedules import crontab
+from celery.signals import worker_process_init
 import logging
 import time
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import os
 
+import anomaly
+import resilience
+from config import redis_url
+from clients import get_taos_conn, get_mysql_conn
+from tracing import init_tracing, traced_task
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -13,20 +20,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger("celery-tasks")
 
-# 修改为从环境变量获取
-TDENGINE_HOST = os.environ.get("TDENGINE_HOST", "localhost")
-TDENGINE_USER = os.environ.get("TDENGINE_USER", "root")
-TDENGINE_PASS = os.environ.get("TDENGINE_PASS", "taosdata")
-TDENGINE_DB = os.environ.get("TDENGINE_DB", "farm_db")
+# 每日报告配置
+DAILY_REPORT_HOUR = int(os.environ.get("DAILY_REPORT_HOUR", "0"))
+DAILY_REPORT_MINUTE = int(os.environ.get("DAILY_REPORT_MINUTE", "10"))
+# 单个指标统计任务的运行时间预算（秒），超出后任务被中止并标记为失败
+DAILY_REPORT_SOFT_LIMIT = int(os.environ.get("DAILY_REPORT_SOFT_LIMIT", "300"))
+# 写入MySQL时每批的行数
+DAILY_REPORT_CHUNK_SIZE = int(os.environ.get("DAILY_REPORT_CHUNK_SIZE", "1000"))
+# 全场汇总行使用的传感器ID
+REPORT_ALL_SENSORS = "__all__"
+
+# 向量化异常检测配置
+# 调度周期(秒)
+ANOMALY_INTERVAL = float(os.environ.get("ANOMALY_INTERVAL", "300"))
+# 每次检测读取的时间窗口(分钟)和聚合粒度(秒)
+ANOMALY_WINDOW_MINUTES = int(os.environ.get("ANOMALY_WINDOW_MINUTES", "60"))
+ANOMALY_BUCKET_SECONDS = int(os.environ.get("ANOMALY_BUCKET_SECONDS", "60"))
+# 同一序列同一检测器的告警冷却时间(分钟)
+ANOMALY_COOLDOWN_MINUTES = int(os.environ.get("ANOMALY_COOLDOWN_MINUTES", "30"))
+ANOMALY_CONFIG = {
+    "min_points": int(os.environ.get("ANOMALY_MIN_POINTS", "10")),
+    "z_threshold": float(os.environ.get("ANOMALY_Z_THRESHOLD", "3.5")),
+    "ewma_alpha": float(os.environ.get("ANOMALY_EWMA_ALPHA", "0.3")),
+    "ewma_threshold": float(os.environ.get("ANOMALY_EWMA_THRESHOLD", "4")),
+    "rate_threshold": float(os.environ.get("ANOMALY_RATE_THRESHOLD", "6")),
+    "flatline_points": int(os.environ.get("ANOMALY_FLATLINE_POINTS", "15")),
+    "flatline_tolerance": float(os.environ.get("ANOMALY_FLATLINE_TOLERANCE", "1e-6")),
+}
 
-REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
-REDIS_PORT = os.environ.get("REDIS_PORT", "6379")
-REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD", "")
-# Redis URL格式：redis://[:password@]host[:port][/database]
-redis_url = f"redis://:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}/0"
+# 报告统计、异常检测等批量查询本来就比API查询慢，worker进程使用单独的慢调用阈值(毫秒)，
+# 避免正常的批量查询打开熔断器；worker的熔断状态与API进程互不影响
+WORKER_SLOW_CALL_MS = float(os.environ.get("WORKER_SLOW_CALL_MS", "120000"))
+for _backend in (resilience.tdengine, resilience.mysql):
+    _backend.slow_call_ms = WORKER_SLOW_CALL_MS
 
-# 修改Celery配置使用环境变量
-celery_app = Celery("tasks", broker=redis_url)
+# 修改Celery配置使用环境变量（chord需要结果后端）
+celery_app = Celery("tasks", broker=redis_url, backend=redis_url)
 
 # 配置Celery
 celery_app.conf.update(
@@ -35,22 +64,42 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="Asia/Shanghai",
     enable_utc=False,
+    result_expires=24 * 3600,
 )
 
+# Celery Beat定时任务
+celery_app.conf.beat_schedule = {
+    "daily-report": {
+        "task": "daily_report",
+        "schedule": crontab(hour=DAILY_REPORT_HOUR, minute=DAILY_REPORT_MINUTE),
+    },
+    "detect-anomalies": {
+        "task": "detect_anomalies",
+        "schedule": ANOMALY_INTERVAL,
+        "options": {"expires": ANOMALY_INTERVAL},
+    },
+}
 
-# 初始化TDengine连接
-def get_taos_conn():
-    # 确保这里使用的是环境变量中的值
-    return taos.connect(
-        host=TDENGINE_HOST,
-        user=TDENGINE_USER,
-        password=TDENGINE_PASS,
-        database=TDENGINE_DB,
-    )
+
+@worker_process_init.connect
+def init_worker_tracing(**kwargs):
+    # 导出线程不能跨fork使用，在每个worker子进程中初始化
+    init_tracing("farm-celery")
+
+
+def list_metric_types():
+    """从TDengine标签中获取所有指标类型"""
+    conn = get_taos_conn()
+    try:
+        res = conn.query("SELECT DISTINCT metric_type FROM sensor_data")
+        return [row[0] for row in res.fetch_all() if row[0]]
+    finally:
+        conn.close()
 
 
-@celery_app.task(name="analyze_data")
-def analyze_data(data):
+@celery_app.task(name="analyze_data", bind=True)
+@traced_task
+def analyze_data(self, data):
     """
     分析传感器数据的异步任务
 
@@ -69,35 +118,14 @@ def analyze_data(data):
             logger.warning(f"数据不完整，跳过分析: {data}")
             return {"status": "skipped", "reason": "incomplete_data"}
 
-        # 连接数据库
-        conn = get_taos_conn()
-
-        # 基于不同的指标类型执行不同的分析
+        # 基于不同的指标类型执行不同的阈值检查
+        # 趋势类检测（相对均值的偏离等）由周期性的 detect_anomalies 任务批量完成
         if metric_type == "temperature":
             # 分析温度数据
             if value > 35:
                 logger.warning(f"检测到高温告警! 传感器: {sensor_id}, 值: {value}°C")
                 # 这里可以添加告警逻辑，如发送通知等
 
-            # 查询该传感器过去1小时的平均温度
-            result = conn.query(
-                f"""
-                SELECT AVG(value) as avg_temp FROM sensor_data 
-                WHERE sensor_id='{sensor_id}' AND metric_type='temperature'
-                AND ts > NOW - 1h
-            """
-            )
-            rows = result.fetch_all()
-            if rows and rows[0][0] is not None:
-                avg_temp = rows[0][0]
-                logger.info(f"传感器 {sensor_id} 过去1小时平均温度: {avg_temp:.2f}°C")
-
-                # 检测温度变化趋势
-                if value > avg_temp * 1.2:
-                    logger.warning(
-                        f"传感器 {sensor_id} 温度上升显著，当前: {value}°C, 平均: {avg_temp:.2f}°C"
-                    )
-
         elif metric_type == "humidity":
             # 分析湿度数据
             if value > 90:
@@ -112,7 +140,6 @@ def analyze_data(data):
 
         # 可以添加更多指标类型的分析...
 
-        conn.close()
         processing_time = (time.time() - start_time) * 1000
 
         logger.info(
@@ -130,43 +157,424 @@ def analyze_data(data):
 
 
 # 添加更多Celery任务...
+def _report_day_range(report_date):
+    """返回报告日期对应的 [开始, 结束) 时间字符串"""
+    day = date.fromisoformat(report_date)
+    start = datetime.combine(day, datetime.min.time())
+    end = start + timedelta(days=1)
+    return start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _set_report_run(cursor, report_date, metric_type, status, **fields):
+    """记录某天某指标的统计进度"""
+    cursor.execute(
+        """
+        INSERT INTO daily_report_runs
+        (report_date, metric_type, status, series_count, sample_count, duration_ms, message)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            status = VALUES(status),
+            series_count = VALUES(series_count),
+            sample_count = VALUES(sample_count),
+            duration_ms = VALUES(duration_ms),
+            message = VALUES(message)
+        """,
+        (
+            report_date,
+            metric_type,
+            status,
+            fields.get("series_count", 0),
+            fields.get("sample_count", 0),
+            fields.get("duration_ms"),
+            fields.get("message"),
+        ),
+    )
+
+
+def _load_metric_summary(cursor, report_date, metric_type):
+    """读取已完成指标的全场汇总行"""
+    cursor.execute(
+        """
+        SELECT avg_value, min_value, max_value, sample_count
+        FROM daily_sensor_stats
+        WHERE report_date = %s AND metric_type = %s AND sensor_id = %s
+        """,
+        (report_date, metric_type, REPORT_ALL_SENSORS),
+    )
+    return cursor.fetchone()
+
+
 @celery_app.task(name="daily_report")
-def generate_daily_report():
-    """生成每日报告的任务，可以通过Celery Beat定时调度"""
+def generate_daily_report(report_date=None, force=False):
+    """
+    生成每日报告的任务，由Celery Beat每天定时调度
+
+    按指标类型拆分为并行的子任务(chord)，全部完成后由回调汇总。
+    已完成的指标会被直接复用，重复执行同一天只计算未完成的部分。
+
+    参数:
+    report_date - 报告日期(YYYY-MM-DD)，默认为昨天
+    force - 是否忽略已完成的结果重新计算
+    """
     try:
-        logger.info("开始生成每日报告...")
+        if report_date is None:
+            report_date = (date.today() - timedelta(days=1)).isoformat()
+        logger.info(f"开始生成每日报告: {report_date}")
+
+        metric_types = list_metric_types()
+        if not metric_types:
+            logger.info(f"{report_date} 没有可统计的指标")
+            return {"status": "success", "report_date": report_date, "metrics": []}
+
+        header = [
+            daily_report_metric.s(report_date, metric_type, force)
+            for metric_type in metric_types
+        ]
+        result = chord(header)(daily_report_finalize.s(report_date))
+
+        return {
+            "status": "scheduled",
+            "report_date": report_date,
+            "metrics": metric_types,
+            "chord_id": result.id,
+        }
 
+    except Exception as e:
+        logger.exception(f"生成每日报告出错: {str(e)}")
+        return {"status": "error", "message": str(e)}
+
+
+@celery_app.task(
+    name="daily_report_metric", soft_time_limit=DAILY_REPORT_SOFT_LIMIT, bind=True
+)
+@traced_task
+def daily_report_metric(self, report_date, metric_type, force=False):
+    """
+    统计某一天某个指标下所有传感器的AVG/MIN/MAX/COUNT
+
+    使用一次 PARTITION BY sensor_id 查询得到全部序列的结果，
+    并分批写入MySQL的 daily_sensor_stats 表。
+
+    参数:
+    report_date - 报告日期(YYYY-MM-DD)
+    metric_type - 指标类型
+    force - 是否忽略已完成的结果重新计算
+    """
+    start_time = time.time()
+    mysql_conn = get_mysql_conn()
+    try:
+        with mysql_conn.cursor() as cursor:
+            if not force:
+                cursor.execute(
+                    """
+                    SELECT status, series_count, sample_count FROM daily_report_runs
+                    WHERE report_date = %s AND metric_type = %s
+                    """,
+                    (report_date, metric_type),
+                )
+                run = cursor.fetchone()
+                if run and run["status"] == "done":
+                    logger.info(f"复用已完成的统计: {report_date} {metric_type}")
+                    summary = _load_metric_summary(cursor, report_date, metric_type)
+                    return {
+                        "metric_type": metric_type,
+                        "status": "reused",
+                        "series_count": run["series_count"],
+                        "summary": summary,
+                    }
+
+            _set_report_run(cursor, report_date, metric_type, "running")
+            mysql_conn.commit()
+
+        day_start, day_end = _report_day_range(report_date)
         conn = get_taos_conn()
+        try:
+            res = conn.query(
+                f"""
+                SELECT sensor_id, AVG(value), MIN(value), MAX(value), COUNT(value)
+                FROM sensor_data
+                WHERE metric_type='{metric_type}'
+                AND ts >= '{day_start}' AND ts < '{day_end}'
+                PARTITION BY sensor_id
+                """
+            )
+            rows = [row for row in res.fetch_all() if row[4]]
+        finally:
+            conn.close()
 
-        # 查询昨天的温度统计
-        temp_result = conn.query(
-            """
-            SELECT 
-                AVG(value) as avg_temp,
-                MAX(value) as max_temp,
-                MIN(value) as min_temp
-            FROM sensor_data 
-            WHERE metric_type='temperature'
-            AND ts >= CURDATE() - 1d
-            AND ts < CURDATE()
-        """
+        # 全场汇总（按样本数加权平均）
+        total_count = sum(row[4] for row in rows)
+        summary = None
+        if total_count:
+            summary = {
+                "avg_value": sum(row[1] * row[4] for row in rows) / total_count,
+                "min_value": min(row[2] for row in rows),
+                "max_value": max(row[3] for row in rows),
+                "sample_count": total_count,
+            }
+
+        stats = [
+            (report_date, row[0], metric_type, row[1], row[2], row[3], row[4])
+            for row in rows
+        ]
+        if summary:
+            stats.append(
+                (
+                    report_date,
+                    REPORT_ALL_SENSORS,
+                    metric_type,
+                    summary["avg_value"],
+                    summary["min_value"],
+                    summary["max_value"],
+                    summary["sample_count"],
+                )
+            )
+
+        with mysql_conn.cursor() as cursor:
+            for i in range(0, len(stats), DAILY_REPORT_CHUNK_SIZE):
+                cursor.executemany(
+                    """
+                    INSERT INTO daily_sensor_stats
+                    (report_date, sensor_id, metric_type, avg_value, min_value, max_value, sample_count)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        avg_value = VALUES(avg_value),
+                        min_value = VALUES(min_value),
+                        max_value = VALUES(max_value),
+                        sample_count = VALUES(sample_count)
+                    """,
+                    stats[i : i + DAILY_REPORT_CHUNK_SIZE],
+                )
+            duration_ms = (time.time() - start_time) * 1000
+            _set_report_run(
+                cursor,
+                report_date,
+                metric_type,
+                "done",
+                series_count=len(rows),
+                sample_count=total_count,
+                duration_ms=duration_ms,
+            )
+            mysql_conn.commit()
+
+        logger.info(
+            f"指标统计完成: {report_date} {metric_type}, "
+            f"序列数: {len(rows)}, 耗时: {duration_ms:.2f}ms"
         )
+        return {
+            "metric_type": metric_type,
+            "status": "done",
+            "series_count": len(rows),
+            "summary": summary,
+        }
+
+    except Exception as e:
+        mysql_conn.rollback()
+        logger.exception(f"指标统计出错: {report_date} {metric_type}: {str(e)}")
+        try:
+            with mysql_conn.cursor() as cursor:
+                _set_report_run(
+                    cursor,
+                    report_date,
+                    metric_type,
+                    "failed",
+                    duration_ms=(time.time() - start_time) * 1000,
+                    message=str(e),
+                )
+                mysql_conn.commit()
+        except Exception:
+            logger.exception("记录统计失败状态出错")
+        return {"metric_type": metric_type, "status": "error", "message": str(e)}
+    finally:
+        mysql_conn.close()
 
-        rows = temp_result.fetch_all()
-        if rows and rows[0][0] is not None:
-            avg_temp = rows[0][0]
-            max_temp = rows[0][1]
-            min_temp = rows[0][2]
 
+@celery_app.task(name="daily_report_finalize")
+def daily_report_finalize(results, report_date):
+    """汇总各指标的统计结果并输出日志"""
+    failed = [r["metric_type"] for r in results if r.get("status") == "error"]
+    for r in results:
+        summary = r.get("summary")
+        if summary:
             logger.info(
-                f"昨日温度统计: 平均={avg_temp:.2f}°C, 最高={max_temp:.2f}°C, 最低={min_temp:.2f}°C"
+                f"{report_date} {r['metric_type']} 统计: "
+                f"平均={summary['avg_value']:.2f}, 最高={summary['max_value']:.2f}, "
+                f"最低={summary['min_value']:.2f}, 样本数={summary['sample_count']}"
             )
 
-        # 可以添加更多统计逻辑...
+    if failed:
+        logger.warning(f"{report_date} 每日报告部分指标失败: {failed}")
+    else:
+        logger.info(f"{report_date} 每日报告生成完成")
 
-        conn.close()
-        return {"status": "success", "report_date": datetime.now().strftime("%Y-%m-%d")}
+    return {
+        "status": "partial" if failed else "success",
+        "report_date": report_date,
+        "metrics": [r["metric_type"] for r in results],
+        "failed": failed,
+    }
 
+
+@celery_app.task(name="detect_anomalies")
+def detect_anomalies():
+    """按指标类型并行执行向量化异常检测，由Celery Beat周期调度"""
+    try:
+        metric_types = list_metric_types()
+        group(detect_anomalies_metric.s(m) for m in metric_types).apply_async(
+            expires=ANOMALY_INTERVAL
+        )
+        return {"status": "scheduled", "metrics": metric_types}
     except Exception as e:
-        logger.exception(f"生成每日报告出错: {str(e)}")
+        logger.exception(f"调度异常检测出错: {str(e)}")
         return {"status": "error", "message": str(e)}
+
+
+def _alert_type(detector, score):
+    if detector == anomaly.FLATLINE:
+        return "other"
+    return "high" if score > 0 else "low"
+
+
+def _detector_threshold(detector):
+    return {
+        anomaly.ZSCORE: ANOMALY_CONFIG["z_threshold"],
+        anomaly.EWMA: ANOMALY_CONFIG["ewma_threshold"],
+        anomaly.RATE: ANOMALY_CONFIG["rate_threshold"],
+        anomaly.FLATLINE: ANOMALY_CONFIG["flatline_tolerance"],
+    }[detector]
+
+
+def fetch_anomaly_window(conn, metric_type, start_ms, end_ms):
+    """
+    一次查询取出 [start_ms, end_ms) 内该指标全部序列的分桶均值
+
+    返回 [(窗口开始时间ms, sensor_id, 均值)]，供 anomaly.build_matrix 使用
+    """
+    res = conn.query(
+        f"""
+        SELECT _wstart, sensor_id, AVG(value)
+        FROM sensor_data
+        WHERE metric_type='{metric_type}'
+        AND ts >= {start_ms} AND ts < {end_ms}
+        PARTITION BY sensor_id
+        INTERVAL({ANOMALY_BUCKET_SECONDS}s)
+        """
+    )
+    return [(row[0].timestamp() * 1000, row[1], row[2]) for row in res.fetch_all()]
+
+
+@celery_app.task(name="detect_anomalies_metric", bind=True)
+@traced_task
+def detect_anomalies_metric(self, metric_type):
+    """
+    对某个指标类型的所有序列执行异常检测
+
+    一次 PARTITION BY sensor_id INTERVAL 查询取出时间窗口内全部序列的数据，
+    组成 序列×时间桶 矩阵后用NumPy同时运行 z分数、EWMA、变化率和
+    卡死(flatline) 检测，结果批量写入 alerts 表。
+
+    参数:
+    metric_type - 指标类型
+    """
+    start_time = time.time()
+    bucket_ms = ANOMALY_BUCKET_SECONDS * 1000
+    n_buckets = ANOMALY_WINDOW_MINUTES * 60 // ANOMALY_BUCKET_SECONDS
+    # 以完整的时间桶为边界，排除当前未结束的桶
+    end_ms = int(time.time() * 1000) // bucket_ms * bucket_ms
+    start_ms = end_ms - n_buckets * bucket_ms
+
+    try:
+        conn = get_taos_conn()
+        try:
+            rows = fetch_anomaly_window(conn, metric_type, start_ms, end_ms)
+        finally:
+            conn.close()
+        query_ms = (time.time() - start_time) * 1000
+
+        sensor_ids, matrix = anomaly.build_matrix(rows, start_ms, bucket_ms, n_buckets)
+        detect_start = time.time()
+        findings = anomaly.detect(matrix, ANOMALY_CONFIG)
+        detect_ms = (time.time() - detect_start) * 1000
+
+        alerts = 0
+        if findings:
+            alerts = _store_anomalies(metric_type, sensor_ids, findings)
+
+        duration_ms = (time.time() - start_time) * 1000
+        series_per_s = len(sensor_ids) / (detect_ms / 1000) if detect_ms else None
+        logger.info(
+            f"异常检测完成: {metric_type}, 序列数: {len(sensor_ids)}, "
+            f"异常: {len(findings)}, 新告警: {alerts}, 查询: {query_ms:.2f}ms, "
+            f"检测: {detect_ms:.2f}ms, 总耗时: {duration_ms:.2f}ms"
+        )
+        return {
+            "status": "success",
+            "metric_type": metric_type,
+            "series": len(sensor_ids),
+            "findings": len(findings),
+            "alerts": alerts,
+            "duration_ms": duration_ms,
+            "series_per_s": series_per_s,
+        }
+
+    except Exception as e:
+        logger.exception(f"异常检测出错: {metric_type}: {str(e)}")
+        return {"status": "error", "metric_type": metric_type, "message": str(e)}
+
+
+def _store_anomalies(metric_type, sensor_ids, findings):
+    """批量写入告警，跳过冷却期内已告警的序列和未登记的传感器"""
+    candidates = sorted({sensor_ids[row] for row, _, _, _ in findings})
+    mysql_conn = get_mysql_conn()
+    try:
+        with mysql_conn.cursor() as cursor:
+            # alerts.sensor_id 外键引用 sensors 表
+            placeholders = ", ".join(["%s"] * len(candidates))
+            cursor.execute(
+                f"SELECT id FROM sensors WHERE id IN ({placeholders})", candidates
+            )
+            registered = {row["id"] for row in cursor.fetchall()}
+
+            cursor.execute(
+                """
+                SELECT sensor_id, message FROM alerts
+                WHERE metric_type = %s AND status = 'active'
+                AND created_at > NOW() - INTERVAL %s MINUTE
+                AND message LIKE '[%%'
+                """,
+                (metric_type, ANOMALY_COOLDOWN_MINUTES),
+            )
+            recent = {
+                (row["sensor_id"], row["message"][1 : row["message"].find("]")])
+                for row in cursor.fetchall()
+            }
+
+            values = []
+            for row, detector, value, score in findings:
+                sensor_id = sensor_ids[row]
+                if sensor_id not in registered or (sensor_id, detector) in recent:
+                    continue
+                values.append(
+                    (
+                        sensor_id,
+                        metric_type,
+                        value,
+                        _detector_threshold(detector),
+                        _alert_type(detector, score),
+                        f"[{detector}] 检测到异常，当前值: {value:.3f}，分数: {score:.2f}",
+                    )
+                )
+
+            if values:
+                cursor.executemany(
+                    """
+                    INSERT INTO alerts
+                    (sensor_id, metric_type, value, threshold_value, alert_type, severity, message)
+                    VALUES (%s, %s, %s, %s, %s, 'warning', %s)
+                    """,
+                    values,
+                )
+            mysql_conn.commit()
+            return len(values)
+    finally:
+        mysql_conn.close()
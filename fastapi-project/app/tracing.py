@@ -0,0 +1,176 @@
+import functools
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("tracing")
+
+# 分布式追踪配置（OpenTelemetry，导出到OTLP，如Jaeger）
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "false").lower() == "true"
+# 根span的采样比例，下游(Celery任务、数据库查询)跟随上游的采样决定
+TRACE_SAMPLE_RATIO = float(os.environ.get("TRACE_SAMPLE_RATIO", "0.05"))
+OTLP_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "http://jaeger:4317")
+# span中记录的SQL最大长度
+TRACE_STATEMENT_MAX_LEN = 500
+
+# 入队时间，Celery任务据此计算排队耗时
+ENQUEUED_AT_HEADER = "x-enqueued-at"
+
+# 追踪启用后才导入 opentelemetry，未启用的进程不增加启动开销
+trace = None
+propagate = None
+SpanKind = None
+_tracer = None
+
+
+def init_tracing(service_name):
+    """
+    初始化追踪，每个进程调用一次
+
+    未启用或未安装 opentelemetry 时所有 span 都是空操作。
+    TRACE_SERVICE_NAME 可覆盖服务名（split模式下区分API和入库进程）。
+    """
+    global _tracer, trace, propagate, SpanKind
+    if _tracer is not None or not TRACING_ENABLED:
+        return
+    try:
+        from opentelemetry import propagate, trace
+        from opentelemetry.trace import SpanKind
+    except ImportError:
+        logger.warning("未安装opentelemetry，追踪未启用")
+        return
+
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    service_name = os.environ.get("TRACE_SERVICE_NAME", service_name)
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(TRACE_SAMPLE_RATIO)),
+    )
+    provider.add_span_processor(
+        BatchSpanProcessor(OTLPSpanExporter(endpoint=OTLP_ENDPOINT, insecure=True))
+    )
+    trace.set_tracer_provider(provider)
+
+    # MySQL查询（pymysql及基于它的SQLAlchemy连接）自动生成span
+    try:
+        from opentelemetry.instrumentation.pymysql import PyMySQLInstrumentor
+
+        PyMySQLInstrumentor().instrument()
+    except ImportError:
+        logger.info("未安装opentelemetry-instrumentation-pymysql，MySQL查询不生成span")
+
+    _tracer = trace.get_tracer("farm")
+    logger.info(
+        f"追踪已启用: service={service_name}, 采样比例={TRACE_SAMPLE_RATIO}, 导出到 {OTLP_ENDPOINT}"
+    )
+
+
+def instrument_app(app):
+    """为FastAPI应用的每个请求生成span"""
+    if _tracer is None:
+        return
+    try:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+        FastAPIInstrumentor.instrument_app(app, excluded_urls="healthz,readyz,metrics")
+    except ImportError:
+        logger.info("未安装opentelemetry-instrumentation-fastapi，HTTP请求不生成span")
+
+
+@contextmanager
+def span(name, attributes=None):
+    """创建子span；追踪未启用时为空操作"""
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+def set_attributes(attributes):
+    """为当前span补充属性"""
+    if _tracer is not None:
+        trace.get_current_span().set_attributes(attributes)
+
+
+def inject_headers():
+    """当前追踪上下文转为消息头，用于 celery.send_task(headers=...)"""
+    if _tracer is None:
+        return None
+    headers = {ENQUEUED_AT_HEADER: time.time()}
+    propagate.inject(headers)
+    return headers
+
+
+@contextmanager
+def task_span(task, name, attributes=None):
+    """
+    在Celery任务中恢复上游的追踪上下文并创建span
+
+    任务需要 bind=True，追踪头通过 task.request.get() 读取。
+    """
+    if _tracer is None:
+        yield None
+        return
+    carrier = {}
+    for key in ("traceparent", "tracestate"):
+        value = task.request.get(key)
+        if value:
+            carrier[key] = value
+    attributes = dict(attributes or {}, **{"celery.task": task.name})
+    enqueued_at = task.request.get(ENQUEUED_AT_HEADER)
+    if enqueued_at:
+        attributes["celery.queue_ms"] = (time.time() - float(enqueued_at)) * 1000
+    with _tracer.start_as_current_span(
+        name,
+        context=propagate.extract(carrier),
+        kind=SpanKind.CONSUMER,
+        attributes=attributes,
+    ) as current:
+        yield current
+
+
+def traced_task(func):
+    """Celery任务装饰器（与 bind=True 一起使用），整个任务作为一个span"""
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with task_span(self, self.name):
+            return func(self, *args, **kwargs)
+
+    return wrapper
+
+
+class TracedConnection:
+    """为TDengine连接的 query/execute 生成span，其余属性直接转发"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def _attributes(self, sql):
+        return {
+            "db.system": "tdengine",
+            "db.statement": " ".join(sql.split())[:TRACE_STATEMENT_MAX_LEN],
+        }
+
+    def query(self, sql, *args, **kwargs):
+        with span("tdengine.query", self._attributes(sql)):
+            return self._conn.query(sql, *args, **kwargs)
+
+    def execute(self, sql, *args, **kwargs):
+        with span("tdengine.execute", self._attributes(sql)):
+            return self._conn.execute(sql, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def traced_taos(conn):
+    """追踪启用时包装TDengine连接"""
+    return conn if _tracer is None else TracedConnection(conn)
@@ -0,0 +1,161 @@
+"""
+向量化异常检测的吞吐压测
+
+默认模式（纯CPU，不需要数据库）：生成带随机游走、缺失值和注入异常的合成数据，
+只测量 anomaly.detect 的 series/sec，不包含从TDengine取数的耗时。
+
+指定 --metric-type 时连接配置的TDengine做端到端测量：Worker使用的单次
+PARTITION BY 查询、build_matrix 和 detect 分别计时，并对 --per-sensor-sample
+个传感器逐个查询同一时间窗口，按序列数外推逐传感器查询的总耗时作为对比。
+
+用法:
+    python bench/anomaly_bench.py --series 50000 --buckets 60
+    python bench/anomaly_bench.py --metric-type temperature --per-sensor-sample 100
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "app"))
+
+import anomaly  # noqa: E402
+from common import write_results  # noqa: E402
+
+
+def synthetic_matrix(n_series, n_buckets, missing, seed):
+    rng = np.random.default_rng(seed)
+    base = rng.uniform(10, 40, (n_series, 1))
+    walk = rng.normal(0, 0.05, (n_series, n_buckets)).cumsum(axis=1)
+    matrix = base + walk + rng.normal(0, 0.3, (n_series, n_buckets))
+    matrix[rng.random((n_series, n_buckets)) < missing] = np.nan
+
+    # 注入1%的尖峰和0.5%的卡死序列
+    spikes = rng.choice(n_series, n_series // 100, replace=False)
+    matrix[spikes, -1] += rng.choice([-1, 1], len(spikes)) * 20
+    stuck = rng.choice(n_series, n_series // 200, replace=False)
+    matrix[stuck, -20:] = matrix[stuck, -21:-20]
+    return matrix
+
+
+def best_of(repeat, func):
+    """重复执行 func，返回 (最短耗时秒, 最后一次的结果)"""
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def end_to_end(args):
+    """对真实数据测量取数+检测，并与逐传感器查询对比"""
+    import tasks
+    from clients import get_taos_conn
+    from series_registry import escape_tag
+
+    bucket_ms = tasks.ANOMALY_BUCKET_SECONDS * 1000
+    n_buckets = tasks.ANOMALY_WINDOW_MINUTES * 60 // tasks.ANOMALY_BUCKET_SECONDS
+    end_ms = int(time.time() * 1000) // bucket_ms * bucket_ms
+    start_ms = end_ms - n_buckets * bucket_ms
+
+    conn = get_taos_conn()
+    try:
+        fetch_s, rows = best_of(
+            args.repeat, lambda: tasks.fetch_anomaly_window(conn, args.metric_type, start_ms, end_ms)
+        )
+        build_s, (sensor_ids, matrix) = best_of(
+            args.repeat, lambda: anomaly.build_matrix(rows, start_ms, bucket_ms, n_buckets)
+        )
+        detect_s, findings = best_of(args.repeat, lambda: anomaly.detect(matrix, tasks.ANOMALY_CONFIG))
+
+        sample = sensor_ids[: args.per_sensor_sample]
+
+        def per_sensor():
+            for sensor_id in sample:
+                conn.query(
+                    f"""
+                    SELECT _wstart, AVG(value) FROM sensor_data
+                    WHERE metric_type='{args.metric_type}' AND sensor_id='{escape_tag(sensor_id)}'
+                    AND ts >= {start_ms} AND ts < {end_ms}
+                    INTERVAL({tasks.ANOMALY_BUCKET_SECONDS}s)
+                    """
+                ).fetch_all()
+
+        per_sensor_s = best_of(1, per_sensor)[0] if sample else 0.0
+    finally:
+        conn.close()
+
+    series = len(sensor_ids)
+    total_s = fetch_s + build_s + detect_s
+    per_sensor_total = per_sensor_s / len(sample) * series if sample else None
+    return {
+        "scope": "TDengine取数 + build_matrix + detect",
+        "series": series,
+        "rows": len(rows),
+        "fetch_s": round(fetch_s, 4),
+        "build_s": round(build_s, 4),
+        "detect_s": round(detect_s, 4),
+        "total_s": round(total_s, 4),
+        "series_per_s": round(series / total_s, 1) if total_s else None,
+        "findings": len(findings),
+        "per_sensor_sample": len(sample),
+        "per_sensor_fetch_s_estimated": round(per_sensor_total, 4) if sample else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量化异常检测吞吐压测")
+    parser.add_argument("--series", type=int, default=50000)
+    parser.add_argument("--buckets", type=int, default=60)
+    parser.add_argument("--missing", type=float, default=0.05, help="缺失数据比例")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果JSON文件路径，默认写入 bench_results/")
+    parser.add_argument("--metric-type", help="对TDengine中该指标的真实数据做端到端测量")
+    parser.add_argument(
+        "--per-sensor-sample", type=int, default=100, help="逐传感器查询对比的抽样数"
+    )
+    args = parser.parse_args()
+
+    if args.metric_type:
+        results = {"config": vars(args), "end_to_end": end_to_end(args)}
+        output = write_results(results, args.output)
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        print(f"结果已写入 {output}")
+        return
+
+    matrix = synthetic_matrix(args.series, args.buckets, args.missing, args.seed)
+    anomaly.detect(matrix)  # 预热
+
+    timings = []
+    findings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        findings = anomaly.detect(matrix)
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    results = {
+        "config": vars(args),
+        "anomaly": {
+            "scope": "只含 detect，不含TDengine取数",
+            "best_s": round(best, 4),
+            "mean_s": round(sum(timings) / len(timings), 4),
+            "series_per_s": round(args.series / best, 1),
+            "findings": len(findings),
+        },
+        "meta": {"numpy": np.__version__},
+    }
+    output = write_results(results, args.output)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    print(f"结果已写入 {output}")
+
+
+if __name__ == "__main__":
+    main()
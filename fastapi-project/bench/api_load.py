@@ -0,0 +1,178 @@
+import http.client
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+from common import summarize_latencies
+
+# 压测的接口，{metric}/{sensor} 在运行时替换为模拟数据中的值
+DEFAULT_ENDPOINTS = [
+    "/api/latest/{metric}?limit=10",
+    "/api/avg/{metric}?hours=1",
+    "/api/sensors",
+    "/api/sensor/{sensor}",
+]
+
+
+class ApiLoad:
+    """并发客户端压测API，每个线程使用一个保持连接的HTTP连接"""
+
+    def __init__(self, args, sensors):
+        self.args = args
+        self.sensors = sensors
+        self.endpoints = args.endpoints or DEFAULT_ENDPOINTS
+        self.latencies = {ep: [] for ep in self.endpoints}
+        self.errors = {ep: 0 for ep in self.endpoints}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._started = None
+        self._elapsed = None
+
+    def _render(self, template, rng):
+        sensor = rng.choice(self.sensors)
+        return template.format(
+            metric=urllib.parse.quote(sensor.metric_type),
+            sensor=urllib.parse.quote(sensor.sensor_id),
+        )
+
+    def _worker(self, index):
+        rng = random.Random(self.args.seed + index)
+        conn = http.client.HTTPConnection(self.args.api_host, self.args.api_port, timeout=30)
+        i = index
+        while not self._stop.is_set():
+            template = self.endpoints[i % len(self.endpoints)]
+            i += 1
+            path = self._render(template, rng)
+            start = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                resp = conn.getresponse()
+                resp.read()
+                ok = resp.status < 400 or resp.status == 404
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection(
+                    self.args.api_host, self.args.api_port, timeout=30
+                )
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                if ok:
+                    self.latencies[template].append(elapsed_ms)
+                else:
+                    self.errors[template] += 1
+        conn.close()
+
+    def start(self):
+        self._started = time.perf_counter()
+        for i in range(self.args.api_concurrency):
+            thread = threading.Thread(target=self._worker, args=(i,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=35)
+        self._elapsed = time.perf_counter() - self._started
+
+    def results(self):
+        report = {}
+        for ep in self.endpoints:
+            samples = self.latencies[ep]
+            stats = summarize_latencies(samples)
+            stats["errors"] = self.errors[ep]
+            stats["rps"] = round(len(samples) / self._elapsed, 2) if self._elapsed else None
+            report[ep] = stats
+        return report
+
+
+class LagProbe:
+    """
+    端到端延迟探针
+
+    周期性发布一条带序号的读数，然后轮询 /api/latest 直到该读数可查询，
+    记录从发布到可查询的时间。超时的探测按超时时间计入延迟样本（实际延迟
+    至少这么长），否则事件循环阻塞等严重卡顿会从分位数中消失。
+
+    探针的读数和轮询请求不计入吞吐和API延迟统计（见 run_bench 的行数统计）。
+    """
+
+    def __init__(self, args, client):
+        self.args = args
+        self.client = client
+        self.sensor_id = f"{args.sensor_prefix}probe"
+        self.metric_type = "bench_probe"
+        self.lags = []
+        self.timeouts = 0
+        self.published = 0
+        self.requests = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _visible(self, conn, seq):
+        self.requests += 1
+        conn.request(
+            "GET",
+            f"/api/latest/{self.metric_type}?limit=1&sensor_id={self.sensor_id}",
+        )
+        resp = conn.getresponse()
+        body = resp.read()
+        if resp.status != 200:
+            return False
+        rows = json.loads(body).get("result") or []
+        return bool(rows) and rows[0].get("value") is not None and rows[0]["value"] >= seq
+
+    def _loop(self):
+        conn = http.client.HTTPConnection(self.args.api_host, self.args.api_port, timeout=10)
+        seq = 0
+        while not self._stop.wait(self.args.probe_interval):
+            seq += 1
+            payload = {
+                "sensor_id": self.sensor_id,
+                "metric_type": self.metric_type,
+                "value": seq,
+                "timestamp": int(time.time() * 1000),
+            }
+            published = time.perf_counter()
+            self.client.publish(
+                f"farm/sensors/{self.sensor_id}", json.dumps(payload), qos=1
+            )
+            self.published += 1
+            deadline = published + self.args.probe_timeout
+            while time.perf_counter() < deadline and not self._stop.is_set():
+                try:
+                    if self._visible(conn, seq):
+                        self.lags.append((time.perf_counter() - published) * 1000)
+                        break
+                except (OSError, http.client.HTTPException, ValueError):
+                    conn.close()
+                    conn = http.client.HTTPConnection(
+                        self.args.api_host, self.args.api_port, timeout=10
+                    )
+                time.sleep(0.02)
+            else:
+                # 压测结束时中断的探测不计入
+                if not self._stop.is_set():
+                    self.timeouts += 1
+                    self.lags.append(self.args.probe_timeout * 1000)
+        conn.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.args.probe_timeout + 5)
+
+    def results(self):
+        stats = summarize_latencies(self.lags)
+        stats["timeouts"] = self.timeouts
+        stats["published"] = self.published
+        stats["requests"] = self.requests
+        return stats
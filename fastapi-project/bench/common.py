@@ -0,0 +1,91 @@
+import base64
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+import urllib.request
+
+
+def percentiles(samples, points=(50, 90, 95, 99)):
+    """计算延迟分位数（毫秒），使用最近秩法"""
+    if not samples:
+        return {f"p{p}": None for p in points}
+    ordered = sorted(samples)
+    result = {}
+    for p in points:
+        rank = max(1, math.ceil(p / 100 * len(ordered)))
+        result[f"p{p}"] = round(ordered[rank - 1], 3)
+    return result
+
+
+def summarize_latencies(samples):
+    stats = {
+        "count": len(samples),
+        "mean": round(sum(samples) / len(samples), 3) if samples else None,
+        "max": round(max(samples), 3) if samples else None,
+    }
+    stats.update(percentiles(samples))
+    return stats
+
+
+def git_revision():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except Exception:
+        return None
+
+
+def write_results(results, output=None):
+    """写出JSON结果，默认文件名包含时间和git版本，便于跨提交对比"""
+    results.setdefault("meta", {}).update(
+        {
+            "git_revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "host": platform.node(),
+        }
+    )
+    if output is None:
+        os.makedirs("bench_results", exist_ok=True)
+        output = os.path.join(
+            "bench_results",
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{results['meta']['git_revision'] or 'nogit'}.json",
+        )
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return output
+
+
+class TDengineRest:
+    """通过TDengine REST接口(6041)执行SQL，压测机无需安装原生客户端"""
+
+    def __init__(self, host, port=6041, user="root", password="taosdata", db="farm_db"):
+        self.url = f"http://{host}:{port}/rest/sql/{db}"
+        token = base64.b64encode(f"{user}:{password}".encode()).decode()
+        self.headers = {"Authorization": f"Basic {token}"}
+
+    def query(self, sql):
+        req = urllib.request.Request(
+            self.url, data=sql.encode("utf-8"), headers=self.headers, method="POST"
+        )
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            body = json.loads(resp.read())
+        if body.get("code", 0) != 0:
+            raise RuntimeError(body.get("desc", "TDengine REST查询失败"))
+        return body.get("data", [])
+
+    def count_rows(self, sensor_prefix, exclude=None):
+        """统计模拟传感器写入的行数，exclude 为不计入的传感器ID（延迟探针）"""
+        where = f"sensor_id LIKE '{sensor_prefix}%'"
+        if exclude:
+            where += f" AND sensor_id != '{exclude}'"
+        rows = self.query(f"SELECT COUNT(*) FROM sensor_data WHERE {where}")
+        return rows[0][0] if rows else 0
@@ -0,0 +1,42 @@
+"""
+对比两次压测结果，用于检查不同提交之间的性能回归
+
+用法:
+    python bench/compare.py bench_results/base.json bench_results/new.json
+"""
+import json
+import sys
+
+
+def flatten(data, prefix=""):
+    items = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            items.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            items[name] = value
+    return items
+
+
+def main(base_path, new_path):
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"基准: {base.get('meta', {}).get('git_revision')}  对比: {new.get('meta', {}).get('git_revision')}")
+    base_items = flatten({k: v for k, v in base.items() if k not in ("config", "meta")})
+    new_items = flatten({k: v for k, v in new.items() if k not in ("config", "meta")})
+    for name in sorted(base_items.keys() & new_items.keys()):
+        old, cur = base_items[name], new_items[name]
+        change = f"{(cur - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"{name:60s} {old:>12} {cur:>12} {change:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(2)
+    sys.exit(main(sys.argv[1], sys.argv[2]))
@@ -0,0 +1,117 @@
+import json
+import random
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+# 各指标的典型取值范围与随机游走步长
+METRIC_PROFILES = {
+    "temperature": (10.0, 40.0, 0.2),
+    "humidity": (20.0, 95.0, 0.5),
+    "soil_moisture": (15.0, 75.0, 0.3),
+    "light": (0.0, 100000.0, 500.0),
+    "ph": (5.0, 8.0, 0.02),
+}
+
+
+class SimulatedSensor:
+    """带随机游走的模拟传感器"""
+
+    def __init__(self, sensor_id, metric_type, rng):
+        self.sensor_id = sensor_id
+        self.metric_type = metric_type
+        low, high, self.step = METRIC_PROFILES[metric_type]
+        self.low, self.high = low, high
+        self.value = rng.uniform(low, high)
+        self.rng = rng
+
+    def next_payload(self):
+        self.value += self.rng.gauss(0, self.step)
+        self.value = min(max(self.value, self.low), self.high)
+        return {
+            "sensor_id": self.sensor_id,
+            "metric_type": self.metric_type,
+            "value": round(self.value, 3),
+            "timestamp": int(time.time() * 1000),
+        }
+
+
+def make_client(args, suffix):
+    client = mqtt.Client(client_id=f"bench-{suffix}-{int(time.time())}")
+    if args.mqtt_username:
+        client.username_pw_set(args.mqtt_username, args.mqtt_password)
+    client.connect(args.mqtt_host, args.mqtt_port, keepalive=60)
+    client.loop_start()
+    return client
+
+
+class LoadGenerator:
+    """
+    模拟N个传感器以固定间隔向 farm/sensors/{id} 发布数据
+
+    传感器平均分配到多个MQTT连接上，每个连接一个发布线程。
+    随机种子固定，保证每次运行的负载一致。
+    """
+
+    def __init__(self, args):
+        self.args = args
+        rng = random.Random(args.seed)
+        metrics = list(METRIC_PROFILES)
+        self.sensors = [
+            SimulatedSensor(f"{args.sensor_prefix}{i:05d}", metrics[i % len(metrics)], rng)
+            for i in range(args.sensors)
+        ]
+        self.sent = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._clients = []
+
+    def _publish_loop(self, client, sensors):
+        # 每个线程内的消息均匀分布在一个上报周期内
+        spacing = self.args.interval / max(1, len(sensors))
+        next_at = time.time()
+        while not self._stop.is_set():
+            for sensor in sensors:
+                if self._stop.is_set():
+                    break
+                payload = json.dumps(sensor.next_payload())
+                info = client.publish(
+                    f"farm/sensors/{sensor.sensor_id}", payload, qos=self.args.qos
+                )
+                with self._lock:
+                    if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                        self.sent += 1
+                    else:
+                        self.errors += 1
+                next_at += spacing
+                delay = next_at - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def start(self):
+        groups = [self.sensors[i :: self.args.publishers] for i in range(self.args.publishers)]
+        for i, group in enumerate(groups):
+            if not group:
+                continue
+            client = make_client(self.args, f"pub{i}")
+            self._clients.append(client)
+            thread = threading.Thread(
+                target=self._publish_loop, args=(client, group), daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        for client in self._clients:
+            client.loop_stop()
+            client.disconnect()
+
+    @property
+    def target_rate(self):
+        return len(self.sensors) / self.args.interval
@@ -0,0 +1,144 @@
+"""
+整条数据链路的压测入口
+
+模拟N个传感器通过MQTT发布数据，同时用并发客户端压测API，输出：
+- 入库速率 (rows/s)
+- 从发布到可查询的端到端延迟
+- 各接口的延迟分位数
+
+用法（先 docker-compose up -d 启动依赖服务）:
+    python bench/run_bench.py --sensors 500 --interval 1 --duration 60
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api_load import ApiLoad, LagProbe  # noqa: E402
+from common import TDengineRest, write_results  # noqa: E402
+from loadgen import LoadGenerator, make_client  # noqa: E402
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger("bench")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="智能农场数据链路压测")
+    parser.add_argument("--sensors", type=int, default=200, help="模拟传感器数量")
+    parser.add_argument("--interval", type=float, default=1.0, help="每个传感器的上报间隔(秒)")
+    parser.add_argument("--publishers", type=int, default=4, help="发布数据的MQTT连接数")
+    parser.add_argument("--qos", type=int, default=1, choices=[0, 1, 2])
+    parser.add_argument("--duration", type=float, default=60, help="压测时长(秒)")
+    parser.add_argument("--warmup", type=float, default=5, help="预热时长(秒)，不计入统计")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--sensor-prefix", default="bench", help="模拟传感器ID前缀")
+
+    parser.add_argument("--mqtt-host", default=os.environ.get("MQTT_HOST", "localhost"))
+    parser.add_argument("--mqtt-port", type=int, default=int(os.environ.get("MQTT_PORT", "1883")))
+    parser.add_argument("--mqtt-username", default=os.environ.get("MQTT_USERNAME", "farm_user"))
+    parser.add_argument("--mqtt-password", default=os.environ.get("MQTT_PASSWORD", "870803"))
+
+    parser.add_argument("--api-host", default="localhost")
+    parser.add_argument("--api-port", type=int, default=8003)
+    parser.add_argument("--api-concurrency", type=int, default=8, help="并发API客户端数")
+    parser.add_argument(
+        "--endpoint",
+        dest="endpoints",
+        action="append",
+        help="压测的接口模板，可多次指定，如 /api/latest/{metric}?limit=10",
+    )
+    parser.add_argument("--no-api", action="store_true", help="只压测入库")
+
+    parser.add_argument("--probe-interval", type=float, default=1.0, help="延迟探针发布间隔(秒)")
+    parser.add_argument("--probe-timeout", type=float, default=10.0, help="单次探测超时(秒)")
+
+    parser.add_argument("--tdengine-host", default="localhost")
+    parser.add_argument("--tdengine-port", type=int, default=6041, help="TDengine REST端口")
+    parser.add_argument("--tdengine-user", default="root")
+    parser.add_argument("--tdengine-pass", default="taosdata")
+    parser.add_argument("--tdengine-db", default="farm_db")
+
+    parser.add_argument("--output", help="结果JSON文件路径，默认写入 bench_results/")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tdengine = TDengineRest(
+        args.tdengine_host,
+        args.tdengine_port,
+        args.tdengine_user,
+        args.tdengine_pass,
+        args.tdengine_db,
+    )
+
+    loadgen = LoadGenerator(args)
+    logger.info(
+        f"启动负载: {args.sensors}个传感器, 目标 {loadgen.target_rate:.1f} msg/s"
+    )
+    loadgen.start()
+    time.sleep(args.warmup)
+
+    probe_client = make_client(args, "probe")
+    probe = LagProbe(args, probe_client)
+
+    # 延迟探针的读数与模拟传感器同前缀，不计入吞吐
+    rows_before = tdengine.count_rows(args.sensor_prefix, exclude=probe.sensor_id)
+    sent_before = loadgen.sent
+    started = time.perf_counter()
+
+    probe.start()
+    api = None
+    if not args.no_api:
+        api = ApiLoad(args, loadgen.sensors)
+        api.start()
+
+    time.sleep(args.duration)
+
+    if api:
+        api.stop()
+    probe.stop()
+    elapsed = time.perf_counter() - started
+    sent = loadgen.sent - sent_before
+    loadgen.stop()
+    probe_client.loop_stop()
+    probe_client.disconnect()
+
+    # 等待队列中的消息落库后再统计
+    time.sleep(2)
+    rows = tdengine.count_rows(args.sensor_prefix, exclude=probe.sensor_id) - rows_before
+
+    results = {
+        "config": {
+            k: v
+            for k, v in vars(args).items()
+            if k not in ("mqtt_password", "tdengine_pass", "output")
+        },
+        "ingest": {
+            "duration_s": round(elapsed, 3),
+            "target_rate": round(loadgen.target_rate, 2),
+            "published": sent,
+            "publish_rate": round(sent / elapsed, 2),
+            "publish_errors": loadgen.errors,
+            "rows": rows,
+            "rows_per_s": round(rows / elapsed, 2),
+        },
+        "e2e_lag_ms": probe.results(),
+        "api": api.results() if api else {},
+    }
+    output = write_results(results, args.output)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    logger.info(f"结果已写入 {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
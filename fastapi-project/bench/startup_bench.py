@@ -0,0 +1,123 @@
+"""
+各进程入口模块的冷启动耗时和内存对比
+
+在全新的Python子进程中导入 API(main)、MQTT入库(mqtt_handler)、
+Celery worker(tasks) 的入口模块，记录导入耗时、峰值RSS和加载的模块数。
+导入时不会连接数据库，只需安装 requirements.txt 中的依赖。
+
+指定 --baseline 时会从git中取出该版本的 app/ 目录做同样的测量，便于对比。
+
+用法:
+    python bench/startup_bench.py --repeat 10
+    python bench/startup_bench.py --baseline HEAD~1
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from common import write_results  # noqa: E402
+
+APP_DIR = os.path.join(HERE, "..", "app")
+
+TARGETS = {
+    "api": "main",
+    "ingest": "mqtt_handler",
+    "worker": "tasks",
+}
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"import_ms": elapsed * 1000, "rss_mb": rss_kb / 1024, "modules": len(sys.modules)}}))
+"""
+
+
+def measure(app_dir, module, repeat):
+    """在新进程中导入模块 repeat 次，返回每次的测量结果"""
+    env = dict(os.environ, TRACING_ENABLED="false", PYTHONDONTWRITEBYTECODE="1")
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module)],
+            cwd=app_dir,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if out.returncode != 0:
+            raise RuntimeError(f"导入 {module} 失败:\n{out.stderr.strip()}")
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return runs
+
+
+def summarize(runs):
+    import_ms = sorted(r["import_ms"] for r in runs)
+    return {
+        "import_ms_median": round(import_ms[len(import_ms) // 2], 1),
+        "import_ms_min": round(import_ms[0], 1),
+        "rss_mb": round(max(r["rss_mb"] for r in runs), 1),
+        "modules": runs[-1]["modules"],
+    }
+
+
+def measure_tree(app_dir, repeat):
+    return {name: summarize(measure(app_dir, module, repeat)) for name, module in TARGETS.items()}
+
+
+def extract_baseline(ref, target_dir):
+    """从git中取出指定版本的 app/ 目录"""
+    repo_root = subprocess.check_output(
+        ["git", "rev-parse", "--show-toplevel"], cwd=HERE, text=True
+    ).strip()
+    prefix = os.path.relpath(os.path.abspath(APP_DIR), repo_root)
+    archive = os.path.join(target_dir, "app.tar")
+    subprocess.check_call(
+        ["git", "archive", "--format=tar", "-o", archive, ref, prefix], cwd=repo_root
+    )
+    with tarfile.open(archive) as tar:
+        tar.extractall(target_dir)
+    return os.path.join(target_dir, prefix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="入口模块冷启动耗时与内存对比")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", help="对比的git版本，如 HEAD~1")
+    parser.add_argument("--output", help="结果JSON文件路径，默认写入 bench_results/")
+    args = parser.parse_args()
+
+    results = {"config": vars(args), "current": measure_tree(APP_DIR, args.repeat)}
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as tmp:
+            results["baseline"] = measure_tree(extract_baseline(args.baseline, tmp), args.repeat)
+        results["delta"] = {
+            name: {
+                "import_ms": round(
+                    results["current"][name]["import_ms_median"]
+                    - results["baseline"][name]["import_ms_median"],
+                    1,
+                ),
+                "rss_mb": round(
+                    results["current"][name]["rss_mb"] - results["baseline"][name]["rss_mb"], 1
+                ),
+            }
+            for name in TARGETS
+        }
+
+    output = write_results(results, args.output)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    print(f"结果已写入 {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,7 +12,8 @@ CREATE TABLE IF NOT EXISTS sensors (
     model VARCHAR(100) NOT NULL,
     description TEXT,
     installation_date DATE,
-    status VARCHAR(20) DEFAULT 'active'
+    status VARCHAR(20) DEFAULT 'active',
+    report_interval INT NULL COMMENT '期望上报间隔(秒)，用于离线检测'
 );
 
 -- 位置表
@@ -39,6 +40,21 @@ CREATE TABLE IF NOT EXISTS sensor_thresholds (
     UNIQUE KEY (sensor_id, metric_type)
 );
 
+-- 入库策略表：按指标类型配置，sensor_id为空表示该指标的所有传感器
+-- raw: 全部存储；deadband: 变化超过deadband才存储，max_silence秒内至少存储一次；
+-- window: 每window_seconds秒存储一次 avg/min/max/count
+CREATE TABLE IF NOT EXISTS ingest_policies (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    metric_type VARCHAR(50) NOT NULL,
+    sensor_id VARCHAR(50) NOT NULL DEFAULT '',
+    policy ENUM('raw', 'deadband', 'window') NOT NULL DEFAULT 'raw',
+    deadband FLOAT NULL,
+    max_silence INT NULL,
+    window_seconds INT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY (metric_type, sensor_id)
+);
+
 -- 告警记录表
 CREATE TABLE IF NOT EXISTS alerts (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -55,6 +71,32 @@ CREATE TABLE IF NOT EXISTS alerts (
     FOREIGN KEY (sensor_id) REFERENCES sensors(id)
 );
 
+-- 每日统计表（每个传感器/指标一行，sensor_id='__all__' 为全场汇总）
+CREATE TABLE IF NOT EXISTS daily_sensor_stats (
+    report_date DATE NOT NULL,
+    sensor_id VARCHAR(50) NOT NULL,
+    metric_type VARCHAR(50) NOT NULL,
+    avg_value DOUBLE,
+    min_value DOUBLE,
+    max_value DOUBLE,
+    sample_count INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (report_date, metric_type, sensor_id)
+);
+
+-- 每日报告执行进度表（用于增量执行，已完成的指标不再重复计算）
+CREATE TABLE IF NOT EXISTS daily_report_runs (
+    report_date DATE NOT NULL,
+    metric_type VARCHAR(50) NOT NULL,
+    status ENUM('running', 'done', 'failed') NOT NULL,
+    series_count INT DEFAULT 0,
+    sample_count INT DEFAULT 0,
+    duration_ms FLOAT,
+    message TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (report_date, metric_type)
+);
+
 -- 用户表
 CREATE TABLE IF NOT EXISTS users (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -2,26 +2,18 @@
 
 echo "正在应用环境变量配置..."
 # 替换配置文件中的环境变量
-sed -i "s/localhost/${TDENGINE_HOST:-localhost}/g" main.py
-sed -i "s/\"redis:\/\/localhost:6379\/0\"/\"redis:\/\/${REDIS_HOST:-localhost}:${REDIS_PORT:-6379}\/0\"/g" main.py
+# 连接配置统一在 config.py 中
+sed -i "/TDENGINE_HOST/s/localhost/${TDENGINE_HOST:-localhost}/" config.py
+sed -i "s/\"redis:\/\/localhost:6379\/0\"/\"redis:\/\/${REDIS_HOST:-localhost}:${REDIS_PORT:-6379}\/0\"/g" config.py
 sed -i "s/MQTT_BROKER = \"mosquitto\"/MQTT_BROKER = \"${MQTT_HOST:-mosquitto}\"/g" mqtt_handler.py
 sed -i "s/MQTT_PORT = 1883/MQTT_PORT = ${MQTT_PORT:-1883}/g" mqtt_handler.py
 
 # 添加MySQL环境变量替换
-sed -i "s/MYSQL_HOST = \"localhost\"/MYSQL_HOST = \"${MYSQL_HOST:-localhost}\"/g" main.py
-sed -i "s/MYSQL_PORT = 3306/MYSQL_PORT = ${MYSQL_PORT:-3306}/g" main.py
-sed -i "s/MYSQL_USER = \"root\"/MYSQL_USER = \"${MYSQL_USER:-root}\"/g" main.py
-sed -i "s/MYSQL_PASS = \"password\"/MYSQL_PASS = \"${MYSQL_PASS:-farmpassword}\"/g" main.py
-sed -i "s/MYSQL_DB = \"farm_info\"/MYSQL_DB = \"${MYSQL_DB:-farm_info}\"/g" main.py
-
-# 同样修改tasks.py中的MySQL配置
-if [ -f "tasks.py" ]; then
-    sed -i "s/MYSQL_HOST = \"localhost\"/MYSQL_HOST = \"${MYSQL_HOST:-localhost}\"/g" tasks.py
-    sed -i "s/MYSQL_PORT = 3306/MYSQL_PORT = ${MYSQL_PORT:-3306}/g" tasks.py
-    sed -i "s/MYSQL_USER = \"root\"/MYSQL_USER = \"${MYSQL_USER:-root}\"/g" tasks.py
-    sed -i "s/MYSQL_PASS = \"password\"/MYSQL_PASS = \"${MYSQL_PASS:-farmpassword}\"/g" tasks.py
-    sed -i "s/MYSQL_DB = \"farm_info\"/MYSQL_DB = \"${MYSQL_DB:-farm_info}\"/g" tasks.py
-fi
+sed -i "s/MYSQL_HOST = \"localhost\"/MYSQL_HOST = \"${MYSQL_HOST:-localhost}\"/g" config.py
+sed -i "s/MYSQL_PORT = 3306/MYSQL_PORT = ${MYSQL_PORT:-3306}/g" config.py
+sed -i "s/MYSQL_USER = \"root\"/MYSQL_USER = \"${MYSQL_USER:-root}\"/g" config.py
+sed -i "s/MYSQL_PASS = \"password\"/MYSQL_PASS = \"${MYSQL_PASS:-farmpassword}\"/g" config.py
+sed -i "s/MYSQL_DB = \"farm_info\"/MYSQL_DB = \"${MYSQL_DB:-farm_info}\"/g" config.py
 
 # MQTT环境变量
 sed -i "s/MQTT_BROKER = \"mosquitto\"/MQTT_BROKER = \"${MQTT_HOST:-mosquitto}\"/g" mqtt_handler.py
@@ -35,6 +27,10 @@ echo "正在启动 Celery worker..."
 # 在后台启动 Celery worker
 celery -A tasks worker --loglevel=info &
 
+echo "正在启动 Celery beat..."
+# 在后台启动 Celery beat（定时生成每日报告）
+celery -A tasks beat --loglevel=info --schedule=/tmp/celerybeat-schedule &
+
 echo "正在启动 FastAPI 应用和 MQTT 客户端..."
 # 启动FastAPI应用和MQTT客户端
 exec python run.py
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 应用模块以 app/ 为工作目录互相导入（import config、from readings import ...）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
@@ -0,0 +1,71 @@
+import numpy as np
+
+import anomaly
+from anomaly import build_matrix, last_valid, zscore, ewma, rate_of_change, flatline, detect
+
+
+def noisy(n=60, seed=0):
+    return 20 + np.random.default_rng(seed).normal(0, 0.5, n)
+
+
+def test_build_matrix():
+    rows = [(0, "b", 1.0), (60_000, "a", 2.0), (120_000, "b", None), (600_000, "a", 9.0)]
+    ids, matrix = build_matrix(rows, 0, 60_000, 3)
+    assert ids == ["a", "b"]
+    np.testing.assert_array_equal(matrix[0], [np.nan, 2.0, np.nan])
+    np.testing.assert_array_equal(matrix[1], [1.0, np.nan, np.nan])
+    assert build_matrix([], 0, 60_000, 3)[1].shape == (0, 3)
+
+
+def test_last_valid():
+    values, idx = last_valid(np.array([[1.0, 2.0, np.nan], [np.nan] * 3]))
+    assert idx.tolist() == [1, -1]
+    assert values[0] == 2.0 and np.isnan(values[1])
+
+
+def test_zscore_flags_spike_only():
+    normal = noisy()
+    spike = noisy()
+    spike[-1] = 30
+    _, flagged = zscore(np.vstack([normal, spike]))
+    assert flagged.tolist() == [False, True]
+
+
+def test_zscore_needs_min_points():
+    short = np.array([[20.0, 20.1, 19.9, 40.0]])
+    assert not zscore(short, min_points=10)[1][0]
+
+
+def test_ewma_ignores_gaps_and_flags_jump():
+    series = noisy()
+    series[10:20] = np.nan
+    series[-1] = 28
+    deviation, flagged = ewma(series[None, :])
+    assert flagged[0] and deviation[0] > 0
+
+
+def test_rate_of_change():
+    series = noisy()
+    steady = series.copy()
+    series[-1] = series[-2] - 10
+    score, flagged = rate_of_change(np.vstack([steady, series]))
+    assert flagged.tolist() == [False, True]
+    assert score[1] < 0
+
+
+def test_flatline():
+    stuck = noisy()
+    stuck[-15:] = 21.5
+    gap = stuck.copy()
+    gap[-3] = np.nan
+    _, flagged = flatline(np.vstack([noisy(), stuck, gap]))
+    assert flagged.tolist() == [False, True, False]
+    assert not flatline(np.full((1, 5), 1.0))[1][0]
+
+
+def test_detect():
+    spike = noisy()
+    spike[-1] = 40
+    findings = detect(np.vstack([noisy(seed=1), spike]))
+    assert {name for row, name, _, _ in findings} >= {anomaly.ZSCORE, anomaly.EWMA, anomaly.RATE}
+    assert all(row == 1 and value == 40 for row, _, value, _ in findings)
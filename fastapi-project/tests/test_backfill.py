@@ -0,0 +1,41 @@
+from datetime import datetime
+
+import pytest
+
+from backfill import Backfill, to_epoch_ms
+from readings import InvalidReading
+
+
+def test_to_epoch_ms():
+    assert to_epoch_ms(1700000000123) == 1700000000123
+    assert to_epoch_ms("1700000000123") == 1700000000123
+    assert to_epoch_ms(1.7e12) == 1700000000000
+    assert to_epoch_ms("2024-05-01T00:00:00+00:00") == 1714521600000
+    assert to_epoch_ms("2024-05-01 08:00:00") == int(datetime(2024, 5, 1, 8).timestamp() * 1000)
+
+
+@pytest.mark.parametrize("timestamp", [None, "", "inf", "-inf", "nan", float("inf"), "yesterday", True])
+def test_to_epoch_ms_rejects_invalid(timestamp):
+    with pytest.raises(InvalidReading):
+        to_epoch_ms(timestamp)
+
+
+def test_non_object_lines_counted_invalid(tmp_path):
+    path = tmp_path / "data.jsonl"
+    path.write_text(
+        "\n".join(
+            [
+                '{"sensor_id": "s1", "metric_type": "temp", "value": 20, "timestamp": 1700000000000}',
+                "[1, 2]",
+                '"x"',
+                "5",
+                "not json",
+                '{"sensor_id": "s1", "metric_type": "temp", "value": 21, "timestamp": "inf"}',
+            ]
+        )
+        + "\n",
+        encoding="utf-8",
+    )
+    stats = Backfill(workers=1, checkpoint=None, dry_run=True).run([str(path)])
+    assert stats["read"] == 6
+    assert stats["invalid"] == 5
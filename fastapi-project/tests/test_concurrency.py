@@ -0,0 +1,97 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import governor
+import main
+
+
+class SlowCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        # pymysql 是阻塞调用
+        time.sleep(0.3)
+
+    def fetchone(self):
+        return None
+
+
+class SlowConnection:
+    def cursor(self):
+        return SlowCursor()
+
+    def close(self):
+        pass
+
+
+async def get(path, client="198.51.100.1"):
+    """直接调用ASGI应用，返回 (状态码, 响应体, 耗时秒)"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"test")],
+        "client": (client, 50000),
+        "server": ("test", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    start = time.perf_counter()
+    await main.app(scope, receive, send)
+    elapsed = time.perf_counter() - start
+    status = next(m["status"] for m in messages if m["type"] == "http.response.start")
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+    return status, json.loads(body or b"null"), elapsed
+
+
+@pytest.fixture
+def slow_mysql(monkeypatch):
+    monkeypatch.setattr(main, "get_mysql_conn", lambda: SlowConnection())
+    monkeypatch.setattr(governor, "get_redis", lambda: None)
+    monkeypatch.setattr(governor, "MAX_CLIENT_CONCURRENCY", 2)
+
+
+def test_client_slot_rejects_concurrent_queries(slow_mysql):
+    async def run():
+        return await asyncio.gather(*(get("/api/sensor/s1") for _ in range(6)))
+
+    statuses = sorted(status for status, _, _ in asyncio.run(run()))
+    # 查询在线程池中并发执行，超过每客户端上限的请求被拒绝
+    assert statuses.count(404) == 2
+    assert statuses.count(429) == 4
+    assert governor._local_slots == {}
+
+
+def test_slow_query_does_not_block_event_loop(slow_mysql):
+    async def run():
+        start = time.perf_counter()
+        query = asyncio.create_task(get("/api/sensor/s1"))
+        await asyncio.sleep(0.05)
+        status, _, _ = await get("/healthz")
+        answered = time.perf_counter() - start
+        await query
+        return status, answered
+
+    status, answered = asyncio.run(run())
+    assert status == 200
+    # 查询需要0.3秒，健康检查不应等它结束
+    assert answered < 0.2
@@ -0,0 +1,62 @@
+import pytest
+
+from dedup import IngestDeduplicator, NEW, DUPLICATE, LATE, TOO_LATE
+
+
+@pytest.fixture
+def dedup():
+    return IngestDeduplicator(max_entries=100, no_ts_window=300, late_tolerance_ms=60_000)
+
+
+def test_timestamped_duplicate(dedup):
+    assert dedup.check("s", "temp", 1000, b"a")[0] == NEW
+    assert dedup.check("s", "temp", 1000, b"b")[0] == DUPLICATE
+    assert dedup.check("s", "humidity", 1000, b"a")[0] == NEW
+
+
+def test_repeated_reading_without_timestamp_is_kept(dedup):
+    # 传感器连续上报相同数值，每条都是新消息
+    for mid in (1, 2, 3):
+        assert dedup.check("s", "temp", None, b'{"value": 20}', mid=mid, now=0)[0] == NEW
+    # QoS 0 没有报文ID
+    assert dedup.check("s", "temp", None, b'{"value": 20}', mid=0, now=0) == (NEW, None)
+    # 报文ID被复用但没有DUP标志，同样是新消息
+    assert dedup.check("s", "temp", None, b'{"value": 20}', mid=1, now=1)[0] == NEW
+
+
+def test_redelivery_without_timestamp(dedup):
+    payload = b'{"value": 20}'
+    assert dedup.check("s", "temp", None, payload, mid=7, now=0)[0] == NEW
+    assert dedup.check("s", "temp", None, payload, mid=7, redelivered=True, now=10)[0] == DUPLICATE
+    # 超出窗口的重发按新消息处理
+    assert dedup.check("s", "temp", None, payload, mid=7, redelivered=True, now=400)[0] == NEW
+
+
+def test_new_session_resets_message_ids(dedup):
+    payload = b'{"value": 20}'
+    dedup.check("s", "temp", None, payload, mid=7, now=0)
+    dedup.new_session()
+    assert dedup.check("s", "temp", None, payload, mid=7, redelivered=True, now=1)[0] == NEW
+
+
+def test_forget_allows_retry(dedup):
+    decision, key = dedup.check("s", "temp", 1000, b"a")
+    dedup.forget(key)
+    assert dedup.check("s", "temp", 1000, b"a")[0] == NEW
+    dedup.forget(None)
+
+
+def test_late_and_too_late(dedup):
+    assert dedup.check("s", "temp", 100_000, b"")[0] == NEW
+    assert dedup.check("s", "temp", 90_000, b"")[0] == LATE
+    assert dedup.check("s", "temp", 10_000, b"")[0] == TOO_LATE
+    assert not dedup.should_analyze(LATE)
+
+
+def test_lru_bound():
+    small = IngestDeduplicator(max_entries=2)
+    for ts in (1, 2, 3):
+        small.check("s", "temp", ts, b"")
+    assert len(small) == 2
+    # 最早的键已被淘汰
+    assert small.check("s", "temp", 1, b"")[0] != DUPLICATE
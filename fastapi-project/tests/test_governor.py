@@ -0,0 +1,149 @@
+import ipaddress
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import governor
+import retention
+from governor import choose_source, estimate_cost, plan_sources
+
+
+@pytest.fixture(autouse=True)
+def defaults(monkeypatch):
+    monkeypatch.setattr(governor, "RAW_PREFERRED_HOURS", 6)
+    monkeypatch.setattr(governor, "ROLLUP_MIN_BUCKETS", 48)
+    monkeypatch.setattr(governor, "MAX_QUERY_ROWS", 5_000_000)
+    monkeypatch.setattr(retention, "ROLLUP_ENABLED", True)
+    monkeypatch.setattr(retention, "RAW_KEEP_DAYS", 30)
+    monkeypatch.setattr(retention, "RAW_POINTS_PER_HOUR", 360)
+
+
+def names(hours):
+    return [name for name, _ in plan_sources(hours)]
+
+
+def test_estimate_cost():
+    assert estimate_cost(10, 24, 60) == 14400
+    assert estimate_cost(0, 0, 360) == 360
+
+
+def test_short_window_prefers_raw():
+    assert names(1) == ["raw", "rollup_1m", "rollup_1h"]
+    assert choose_source(100, 6)[0] == "raw"
+
+
+def test_long_window_prefers_coarsest_fine_enough_rollup():
+    # 24小时只有24个1小时窗口，使用1分钟降采样
+    assert names(24) == ["rollup_1m", "raw", "rollup_1h"]
+    assert names(24 * 7) == ["rollup_1h", "rollup_1m", "raw"]
+    # 即使原始数据在成本上限以内，也不扫描原始数据
+    assert choose_source(1, 24 * 7) == ("rollup_1h", 168)
+
+
+def test_beyond_raw_retention_uses_rollups_only():
+    assert "raw" not in names(24 * 60)
+    assert choose_source(1, 24 * 60)[0] == "rollup_1h"
+
+
+def test_falls_back_to_raw_when_rollups_disabled(monkeypatch):
+    monkeypatch.setattr(retention, "ROLLUP_ENABLED", False)
+    assert choose_source(1, 24 * 7)[0] == "raw"
+
+
+def test_falls_back_to_finer_source_when_over_limit(monkeypatch):
+    monkeypatch.setattr(governor, "MAX_QUERY_ROWS", 100)
+    # 24小时: 1分钟降采样 1440行超限，原始数据更多，只剩1小时降采样
+    assert choose_source(1, 24) == ("rollup_1h", 24)
+    with pytest.raises(HTTPException) as info:
+        choose_source(1000, 24)
+    assert info.value.status_code == 400
+
+
+def test_memory_window_wins_when_covered():
+    assert choose_source(1000, 1, memory_hours=1) == ("memory", 0)
+    assert choose_source(1, 2, memory_hours=1)[0] == "raw"
+
+
+def request(host, forwarded=None):
+    headers = {} if forwarded is None else {"x-forwarded-for": forwarded}
+    return SimpleNamespace(client=SimpleNamespace(host=host), headers=headers)
+
+
+def test_client_key_ignores_forwarded_for_from_untrusted_peer(monkeypatch):
+    monkeypatch.setattr(governor, "TRUSTED_PROXIES", [])
+    assert governor._client_key(request("203.0.113.5", "1.2.3.4")) == "203.0.113.5"
+
+
+def test_client_key_uses_forwarded_for_behind_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(governor, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/8")])
+    # 客户端伪造的第一项被忽略，取可信代理追加的最右侧不可信地址
+    assert governor._client_key(request("10.0.0.2", "1.2.3.4, 198.51.100.7, 10.0.0.9")) == (
+        "198.51.100.7"
+    )
+    assert governor._client_key(request("10.0.0.2")) == "10.0.0.2"
+
+
+class FakeRedis:
+    """并发计数用到的有序集合命令"""
+
+    def __init__(self):
+        self.sets = {}
+
+    def pipeline(self):
+        redis, results = self, []
+
+        class Pipeline:
+            def __getattr__(self, name):
+                return lambda *args: results.append(getattr(redis, name)(*args))
+
+            def execute(self):
+                return results
+
+        return Pipeline()
+
+    def zremrangebyscore(self, key, low, high):
+        members = self.sets.get(key, {})
+        for member in [m for m, score in members.items() if score <= high]:
+            del members[member]
+
+    def zadd(self, key, mapping):
+        self.sets.setdefault(key, {}).update(mapping)
+
+    def zcard(self, key):
+        return len(self.sets.get(key, {}))
+
+    def zrem(self, key, member):
+        self.sets.get(key, {}).pop(member, None)
+
+    def expire(self, key, seconds):
+        pass
+
+
+def test_slots_expire_without_going_negative(monkeypatch):
+    fake = FakeRedis()
+    clock = [1000.0]
+    monkeypatch.setattr(governor, "get_redis", lambda: fake)
+    monkeypatch.setattr(governor.time, "time", lambda: clock[0])
+
+    first = governor._acquire("c")
+    assert first[0] == 1
+    assert governor._acquire("c")[0] == 2
+
+    # 名额过期后释放不会让计数变成负数，新的查询重新从1计数
+    clock[0] += governor.SLOT_TTL + 1
+    governor._release("c", first[1])
+    handle = governor._acquire("c")[1]
+    assert fake.zcard(handle[0]) == 1
+    governor._release("c", handle)
+    assert fake.zcard(handle[0]) == 0
+
+
+def test_parse_cursor():
+    assert governor.parse_cursor(None) == (None, None)
+    assert governor.parse_cursor("1700000000000") == (1700000000000, None)
+    assert governor.parse_cursor("1700000000000:gh-01:a") == (1700000000000, "gh-01:a")
+    with pytest.raises(HTTPException):
+        governor.parse_cursor("yesterday")
+    with pytest.raises(HTTPException):
+        governor.parse_cursor("1700000000000:x' OR '1'='1")
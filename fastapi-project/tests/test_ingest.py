@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+import mqtt_handler
+import rolling
+from ingest_policy import RAW, WINDOW
+from resilience import BackendUnavailable
+
+
+class FakeConn:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.sql = []
+
+    def execute(self, sql):
+        if self.fail:
+            raise ConnectionError("TDengine不可用")
+        self.sql.append(sql)
+
+
+@pytest.fixture
+def windows(monkeypatch):
+    windows = rolling.RollingWindows(1)
+    windows.start()
+    monkeypatch.setattr(rolling, "windows", windows)
+    monkeypatch.setattr(mqtt_handler.registry, "resolve", lambda conn, s, m: "t_s_temp")
+    return windows
+
+
+def test_stored_records_enter_rolling_windows(windows):
+    now_ms = int(time.time() * 1000)
+    conn = FakeConn()
+    mqtt_handler.write_output(conn, "s", "temp", (RAW, now_ms, 20.0))
+    mqtt_handler.write_output(conn, "s", "temp", (WINDOW, now_ms, 22.0, 21.0, 23.0, 4))
+    result = windows.aggregate("temp", 1)
+    # 窗口聚合按写入 sensor_data 的均值计一条，与原始数据源一致
+    assert result["samples"] == 2
+    assert result["avg"] == 21.0
+
+
+def test_failed_write_not_counted(windows):
+    with pytest.raises(ConnectionError):
+        mqtt_handler.write_output(
+            FakeConn(fail=True), "s", "temp", (RAW, int(time.time() * 1000), 20.0)
+        )
+    assert windows.aggregate("temp", 1) is None
+
+
+def test_raw_write_requires_integer_timestamp(windows):
+    conn = FakeConn()
+    with pytest.raises(ValueError):
+        mqtt_handler.write_output(conn, "s", "temp", (RAW, "1); DROP DATABASE farm_db; --", 1.0))
+    assert conn.sql == []
+    mqtt_handler.write_output(conn, "s", "temp", (RAW, None, 1.0))
+    assert conn.sql == ["INSERT INTO t_s_temp VALUES (NOW, 1.0)"]
+
+
+def test_startup_preload_survives_backend_outage(monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise BackendUnavailable("tdengine", "连接失败")
+
+    monkeypatch.setattr(mqtt_handler, "get_taos_conn", unavailable)
+    monkeypatch.setattr(mqtt_handler, "get_mysql_conn", unavailable)
+    monkeypatch.setattr(mqtt_handler, "load_report_intervals", unavailable)
+    # 启动时只记录警告并跳过预加载，不能让入库进程启动失败
+    mqtt_handler.preload_registry()
+    mqtt_handler.seed_liveness()
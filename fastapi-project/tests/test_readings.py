@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from governor import validate_identifier
+from readings import parse_reading, InvalidReading
+from sensor_import import check_identifiers
+
+
+def sensor(sensor_id):
+    return SimpleNamespace(id=sensor_id, thresholds=[])
+
+
+@pytest.mark.parametrize("sensor_id", ["dtu001", "大棚 1 号", "gh-01:soil.t", "x" * 50])
+def test_ids_accepted_everywhere(sensor_id):
+    assert parse_reading({"sensor_id": sensor_id, "metric_type": "temp", "value": 1})[0] == sensor_id
+    assert validate_identifier(sensor_id, "传感器ID") == sensor_id
+    assert check_identifiers(sensor(sensor_id)) is None
+
+
+@pytest.mark.parametrize("sensor_id", ["a'b", 'a"b', "a\\b", "a`b", "a\nb", "x" * 51])
+def test_ids_rejected_everywhere(sensor_id):
+    with pytest.raises(InvalidReading):
+        parse_reading({"sensor_id": sensor_id, "metric_type": "temp", "value": 1})
+    with pytest.raises(HTTPException):
+        validate_identifier(sensor_id, "传感器ID")
+    assert check_identifiers(sensor(sensor_id)) is not None
+
+
+def test_metric_type_limited_to_tag_length():
+    with pytest.raises(InvalidReading):
+        parse_reading({"sensor_id": "s", "metric_type": "m" * 21, "value": 1})
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-Infinity", float("nan")])
+def test_non_finite_values_rejected(value):
+    with pytest.raises(InvalidReading):
+        parse_reading({"sensor_id": "s", "metric_type": "temp", "value": value})
+
+
+@pytest.mark.parametrize(
+    "timestamp, expected",
+    [
+        (1700000000123, 1700000000123),
+        ("1700000000123", 1700000000123),
+        ("2024-05-01T00:00:00+00:00", 1714521600000),
+        (None, None),
+        ("", None),
+    ],
+)
+def test_timestamp_normalised(timestamp, expected):
+    data = {"sensor_id": "s", "metric_type": "temp", "value": 1, "timestamp": timestamp}
+    assert parse_reading(data)[3] == expected
+
+
+@pytest.mark.parametrize("timestamp", ["NOW); DROP DATABASE farm_db; --", "inf", "tomorrow", [1]])
+def test_invalid_timestamp_rejected(timestamp):
+    with pytest.raises(InvalidReading):
+        parse_reading({"sensor_id": "s", "metric_type": "temp", "value": 1, "timestamp": timestamp})
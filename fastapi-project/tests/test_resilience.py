@@ -0,0 +1,150 @@
+import time
+
+import pymysql
+import pytest
+
+from resilience import (
+    Backend,
+    BackendUnavailable,
+    GuardedMySQLConnection,
+    CLOSED,
+    OPEN,
+    is_backend_failure,
+)
+
+
+def taos_error(name, errno):
+    """构造与 taospy 同名、同模块的异常（测试环境没有TDengine客户端库）"""
+    cls = type(name, (Exception,), {"__module__": "taos.error"})
+    exc = cls(f"[0x{errno & 0xFFFF:04x}]")
+    exc.errno = errno
+    return exc
+
+
+@pytest.mark.parametrize(
+    "exc",
+    [
+        BackendUnavailable("tdengine", "open"),
+        ConnectionRefusedError(),
+        TimeoutError(),
+        taos_error("ConnectionError", 0xFFFF),
+        # taospy 把服务端返回的网络错误也报告为 ProgrammingError
+        taos_error("ProgrammingError", 0x0019),
+        taos_error("ProgrammingError", -0x7FFFFFFF - 1 + 0x000B),
+        pymysql.err.OperationalError(2003, "Can't connect to MySQL server"),
+        pymysql.err.OperationalError(2013, "Lost connection to MySQL server during query"),
+    ],
+)
+def test_backend_failures(exc):
+    assert is_backend_failure(exc)
+
+
+@pytest.mark.parametrize(
+    "exc",
+    [
+        ValueError("传感器ID或指标类型过长"),
+        KeyError("x"),
+        taos_error("ProgrammingError", 0x2600),  # 语法错误
+        pymysql.err.ProgrammingError(1064, "You have an error in your SQL syntax"),
+        pymysql.err.IntegrityError(1062, "Duplicate entry"),
+    ],
+)
+def test_client_errors(exc):
+    assert not is_backend_failure(exc)
+
+
+def test_breaker_opens_and_recovers():
+    backend = Backend("test-breaker", failure_threshold=2, reset_timeout=0.05)
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            with backend.call():
+                raise TimeoutError()
+    assert backend.breaker.state == OPEN
+    with pytest.raises(BackendUnavailable):
+        with backend.call():
+            pass
+
+    time.sleep(0.06)
+    with backend.call():
+        pass
+    assert backend.breaker.state == CLOSED
+
+
+def test_client_errors_do_not_open_breaker():
+    backend = Backend("test-client-errors", failure_threshold=2)
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            with backend.call():
+                raise ValueError()
+    assert backend.breaker.state == CLOSED
+
+
+def test_adaptive_limit_sheds_load():
+    backend = Backend("test-limit", min_concurrency=1, max_concurrency=2)
+    with backend.call():
+        with pytest.raises(BackendUnavailable) as info:
+            with backend.call():
+                pass
+    assert info.value.reason == "overload"
+
+
+class FakeCursor:
+    def __init__(self, error=None):
+        self.error = error
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+    def execute(self, sql, params=None):
+        if self.error:
+            raise self.error
+        return 1
+
+    def fetchone(self):
+        return {"id": "s1"}
+
+
+class FakeMySQL:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        pass
+
+
+def test_mysql_query_failures_open_breaker():
+    backend = Backend("mysql-test", failure_threshold=2, reset_timeout=60)
+    raw = FakeCursor(error=pymysql.err.OperationalError(2013, "Lost connection"))
+    conn = GuardedMySQLConnection(FakeMySQL(raw), backend)
+    for _ in range(2):
+        with pytest.raises(pymysql.err.OperationalError):
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+    assert raw.closed
+    with pytest.raises(BackendUnavailable):
+        conn.cursor().execute("SELECT 1")
+
+
+def test_mysql_cursor_passthrough():
+    backend = Backend("mysql-pass")
+    conn = GuardedMySQLConnection(FakeMySQL(FakeCursor()), backend)
+    with conn.cursor() as cursor:
+        assert cursor.execute("SELECT 1") == 1
+        assert cursor.fetchone() == {"id": "s1"}
+    conn.commit()
+    assert backend.limit.in_flight == 0
+    assert backend.breaker.state == CLOSED
+
+
+def test_slow_mysql_query_counts_as_failure():
+    backend = Backend("mysql-slow", failure_threshold=1, slow_call_ms=-1)
+    conn = GuardedMySQLConnection(FakeMySQL(FakeCursor()), backend)
+    conn.cursor().execute("SELECT SLEEP(10)")
+    assert backend.breaker.state == OPEN
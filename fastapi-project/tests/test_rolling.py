@@ -0,0 +1,40 @@
+from rolling import RollingWindows
+
+NOW = 1_700_000_000.0
+
+
+def make_windows():
+    windows = RollingWindows(1)
+    windows.start(now=NOW - 7200)
+    return windows
+
+
+def test_not_covered_until_window_elapsed():
+    windows = RollingWindows(1)
+    assert windows.covered_hours(now=NOW) == 0
+    windows.start(now=NOW - 1800)
+    assert windows.covered_hours(now=NOW) == 0
+    assert windows.covered_hours(now=NOW + 1800) == 1
+
+
+def test_aggregate_combined_and_breakdown():
+    windows = make_windows()
+    for i in range(10):
+        ts = int((NOW - i * 60) * 1000)
+        windows.add("s1", "temp", ts, float(i), now=NOW)
+        windows.add("s2", "temp", ts, 10.0, now=NOW)
+    windows.add("s3", "humidity", int(NOW * 1000), 50.0, now=NOW)
+
+    combined = windows.aggregate("temp", 1, now=NOW)
+    assert combined == {"avg": 7.25, "min": 0.0, "max": 10.0, "samples": 20}
+
+    rows = windows.aggregate("temp", 1, ["s2", "missing"], breakdown=True, now=NOW)
+    assert rows == [{"sensor_id": "s2", "avg": 10.0, "min": 10.0, "max": 10.0, "samples": 10}]
+
+
+def test_ignores_readings_outside_window():
+    windows = make_windows()
+    windows.add("s1", "temp", int((NOW - 2 * 3600) * 1000), 100.0, now=NOW)
+    windows.add("s1", "temp", int(NOW * 1000), 1.0, now=NOW)
+    assert windows.aggregate("temp", 1, now=NOW)["max"] == 1.0
+    assert windows.aggregate("other", 1, now=NOW) is None
@@ -0,0 +1,87 @@
+import pytest
+
+from spool import Spool
+
+
+class Outage(Exception):
+    pass
+
+
+def make_spool(tmp_path, **kwargs):
+    return Spool(
+        str(tmp_path / "spool" / "ingest-0.jsonl"),
+        1024 * 1024,
+        retryable=lambda e: isinstance(e, Outage),
+        **kwargs,
+    )
+
+
+def test_replay_in_order_and_resume_after_outage(tmp_path):
+    spool = make_spool(tmp_path)
+    for i in range(5):
+        spool.append("s1", "temp", ("raw", 1000 + i, float(i)))
+
+    written = []
+
+    def flaky(sensor_id, metric_type, record):
+        if len(written) == 2:
+            raise Outage()
+        written.append(record)
+
+    with pytest.raises(Outage):
+        spool.replay(flaky)
+    assert spool.pending()
+
+    # 回放期间追加的记录进入新文件，不影响当前回放
+    spool.append("s1", "temp", ("raw", 2000, 9.0))
+    spool.replay(lambda s, m, r: written.append(r))
+    assert [r[1] for r in written] == [1000, 1001, 1002, 1003, 1004]
+    assert spool.pending()
+    spool.replay(lambda s, m, r: written.append(r))
+    assert written[-1] == ("raw", 2000, 9.0)
+    assert not spool.pending()
+
+
+def test_failing_record_is_quarantined(tmp_path):
+    spool = make_spool(tmp_path, max_attempts=3)
+    spool.append("bad", "temp", ("raw", 1, 1.0))
+    spool.append("good", "temp", ("window", 2, 1.0, 0.5, 1.5, 4))
+
+    written = []
+
+    def write(sensor_id, metric_type, record):
+        if sensor_id == "bad":
+            raise ValueError("invalid")
+        written.append((sensor_id, record))
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            spool.replay(write)
+    assert written == []
+
+    assert spool.replay(write) == 1
+    assert written == [("good", ("window", 2, 1.0, 0.5, 1.5, 4))]
+    assert not spool.pending()
+    with open(spool.quarantine_path, encoding="utf-8") as f:
+        assert '"bad"' in f.read()
+
+
+def test_outage_does_not_count_towards_quarantine(tmp_path):
+    spool = make_spool(tmp_path, max_attempts=1)
+    spool.append("s1", "temp", ("raw", 1, 1.0))
+
+    def down(*args):
+        raise Outage()
+
+    for _ in range(3):
+        with pytest.raises(Outage):
+            spool.replay(down)
+    written = []
+    spool.replay(lambda s, m, r: written.append(r))
+    assert written == [("raw", 1, 1.0)]
+
+
+def test_append_rejects_when_full(tmp_path):
+    spool = Spool(str(tmp_path / "s.jsonl"), 40)
+    assert spool.append("s1", "temp", ("raw", 1, 1.0))
+    assert not spool.append("s1", "temp", ("raw", 2, 1.0))